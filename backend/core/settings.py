@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
@@ -78,6 +79,26 @@ DATABASES = {
     }
 }
 
+# Cache
+# С REDIS_URL используется Redis (вытеснение по LRU настраивается в самом Redis,
+# см. maxmemory-policy в docker-compose.yml), без него - память процесса.
+# Кэш ответов работает только с общим для всех процессов кэшем (см. wallet.cache)
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -120,8 +141,44 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # JSON через orjson (без установленного orjson - стандартные классы DRF)
+    'DEFAULT_RENDERER_CLASSES': (
+        'wallet.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'wallet.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+# Настройки кошелька
+# Размер пачки для bulk_create при импорте транзакций
+WALLET_IMPORT_CHUNK_SIZE = int(os.getenv('WALLET_IMPORT_CHUNK_SIZE', '1000'))
+# Асинхронное обновление итогов по периодам: запись только добавляет изменения
+# в очередь, а задача Celery применяет их пачками
+WALLET_ASYNC_SUMMARIES = os.getenv('WALLET_ASYNC_SUMMARIES', 'False').lower() in ('true', '1', 't')
+# Задержка (в секундах) перед применением очереди, за это время изменения пользователя накапливаются
+WALLET_SUMMARY_FLUSH_DELAY = int(os.getenv('WALLET_SUMMARY_FLUSH_DELAY', '2'))
+# Сколько записей очереди применяется за одну транзакцию
+WALLET_SUMMARY_FLUSH_BATCH_SIZE = int(os.getenv('WALLET_SUMMARY_FLUSH_BATCH_SIZE', '5000'))
+# Период (в секундах) задачи Celery beat, которая применяет очередь всех пользователей:
+# страховка на случай, если отложенная задача пользователя не была запланирована или потерялась
+WALLET_SUMMARY_SWEEP_INTERVAL = int(os.getenv('WALLET_SUMMARY_SWEEP_INTERVAL', '60'))
+# Кэш ответов дашборда, статистики и итогов по периодам (ключ содержит версию данных пользователя);
+# с кэшем в памяти процесса (без REDIS_URL) отключен независимо от этой настройки
+WALLET_RESPONSE_CACHE = os.getenv('WALLET_RESPONSE_CACHE', 'True').lower() in ('true', '1', 't')
+# Время жизни ответа в кэше (в секундах); устаревшие версии вытесняются по нему
+WALLET_RESPONSE_CACHE_TIMEOUT = int(os.getenv('WALLET_RESPONSE_CACHE_TIMEOUT', '3600'))
+# Размер страницы списка транзакций (?page_size= не больше максимума)
+WALLET_TRANSACTIONS_PAGE_SIZE = int(os.getenv('WALLET_TRANSACTIONS_PAGE_SIZE', '50'))
+WALLET_TRANSACTIONS_MAX_PAGE_SIZE = int(os.getenv('WALLET_TRANSACTIONS_MAX_PAGE_SIZE', '500'))
+# Сколько строк выгрузки читается из серверного курсора и отдается клиенту за раз
+WALLET_EXPORT_CHUNK_SIZE = int(os.getenv('WALLET_EXPORT_CHUNK_SIZE', '2000'))
+# Максимум точек временного ряда аналитики (дневной ряд за ~50 лет)
+WALLET_SERIES_MAX_POINTS = int(os.getenv('WALLET_SERIES_MAX_POINTS', '20000'))
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=600),
@@ -170,6 +227,13 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'flush-summary-deltas': {
+        'task': 'wallet.tasks.flush_summary_deltas',
+        'schedule': WALLET_SUMMARY_SWEEP_INTERVAL,
+        'args': (None,),
+    },
+}
 
 # Настройки Jazzmin для админ-панели
 JAZZMIN_SETTINGS = {
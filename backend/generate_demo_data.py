@@ -13,6 +13,7 @@ django.setup()
 from django.contrib.auth.models import User
 from django.db import transaction
 from wallet.models import Category, Account, Transaction
+from wallet.rebuild import rebuild_users
 from django.utils import timezone
 
 # Имя и пароль для демо-пользователя
@@ -162,6 +163,26 @@ def clean_transactions(user):
     Transaction.objects.filter(user=user).delete()
     print(f"Удалено {count} транзакций пользователя {user.username}")
 
+def get_opening_balances(accounts, transactions):
+    """
+    Начальные балансы счетов, при которых баланс на конец каждого дня
+    не уходит в минус (наименьший нужный для этого остаток)
+    """
+    daily_effects = {account.id: {} for account in accounts}
+    for transaction in transactions:
+        effect = transaction.amount if transaction.type == 'income' else -transaction.amount
+        account_effects = daily_effects[transaction.account_id]
+        account_effects[transaction.date] = account_effects.get(transaction.date, Decimal('0.00')) + effect
+
+    opening_balances = {}
+    for account_id, account_effects in daily_effects.items():
+        balance = lowest = Decimal('0.00')
+        for date in sorted(account_effects):
+            balance += account_effects[date]
+            lowest = min(lowest, balance)
+        opening_balances[account_id] = -lowest
+    return opening_balances
+
 def reset_account_balances(user):
     """Сбрасывает балансы счетов на ноль"""
     accounts = Account.objects.filter(user=user)
@@ -222,9 +243,6 @@ def create_demo_user():
     print(f'Генерирую {NUM_TRANSACTIONS} транзакций...')
     transactions_to_create = []
     
-    # Для поддержания реалистичных балансов
-    account_balances = {account.id: Decimal('0.00') for account in accounts}
-    
     for _ in range(NUM_TRANSACTIONS):
         # Определяем тип транзакции (с перевесом в сторону расходов)
         is_income = random.random() < 0.35  # 35% доходов, 65% расходов
@@ -257,25 +275,21 @@ def create_demo_user():
             user=user
         )
         
-        # Обновляем балансы вручную
-        if type_ == 'income':
-            account_balances[account.id] += amount
-        else:
-            account_balances[account.id] -= amount
-        
         transactions_to_create.append(transaction)
     
     # Создаем все транзакции массово без автоматического пересчета баланса
     Transaction.objects.bulk_create(transactions_to_create)
     print(f'Сгенерировано {len(transactions_to_create)} транзакций')
     
-    # Устанавливаем окончательные балансы счетов
-    for account in accounts:
-        # Не допускаем отрицательные балансы
-        balance = max(account_balances[account.id], Decimal('0.00'))
-        account.balance = balance
-        account.save()
-    print(f'Обновлены балансы {len(accounts)} счетов')
+    # Начальные балансы покрывают расходы до поступлений, поэтому балансы
+    # счетов не уходят в минус ни в один день
+    for account_id, opening_balance in get_opening_balances(accounts, transactions_to_create).items():
+        Account.objects.filter(pk=account_id).update(opening_balance=opening_balance)
+
+    # Пересчитываем балансы счетов и итоги по периодам из созданных транзакций
+    rebuild_users([user.pk])
+    accounts = list(Account.objects.filter(user=user))
+    print(f'Пересчитаны балансы {len(accounts)} счетов и итоги по периодам')
     
     # Выводим итоговую информацию
     print('\nИнформация о демо-пользователе:')
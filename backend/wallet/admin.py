@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Account, Transaction, PeriodSummary
+from .models import Category, Account, Transaction, PeriodSummary, Budget
 from django.utils.html import format_html
 from django.db.models import Sum
 from django.urls import reverse
@@ -9,6 +9,7 @@ from django.utils.safestring import mark_safe
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'type', 'icon', 'color_display', 'user', 'created_at')
     list_filter = ('type', 'user')
+    list_select_related = ('user',)
     search_fields = ('name', 'user__username')
     readonly_fields = ('created_at', 'updated_at')
     fieldsets = (
@@ -37,11 +38,12 @@ class CategoryAdmin(admin.ModelAdmin):
 class AccountAdmin(admin.ModelAdmin):
     list_display = ('name', 'balance_display', 'icon', 'color_display', 'user', 'created_at')
     list_filter = ('user',)
+    list_select_related = ('user',)
     search_fields = ('name', 'user__username')
     readonly_fields = ('created_at', 'updated_at')
     fieldsets = (
         ('Основная информация', {
-            'fields': ('name', 'balance', 'user')
+            'fields': ('name', 'balance', 'opening_balance', 'user')
         }),
         ('Визуальное оформление', {
             'fields': ('icon', 'color')
@@ -72,6 +74,7 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ('id', 'amount_display', 'type', 'category_link', 'account_link', 
                     'destination_account_link', 'date', 'user', 'created_at')
     list_filter = ('type', 'date', 'user', 'category')
+    list_select_related = ('category', 'account', 'destination_account', 'user')
     search_fields = ('comment', 'user__username', 'category__name', 'account__name')
     readonly_fields = ('created_at', 'updated_at')
     date_hierarchy = 'date'
@@ -124,6 +127,7 @@ class PeriodSummaryAdmin(admin.ModelAdmin):
     list_display = ('period_type', 'period_key', 'income_amount_display', 'expense_amount_display', 
                     'balance_display', 'user', 'updated_at')
     list_filter = ('period_type', 'user')
+    list_select_related = ('user',)
     search_fields = ('period_key', 'user__username')
     readonly_fields = ('created_at', 'updated_at')
     
@@ -155,6 +159,14 @@ class PeriodSummaryAdmin(admin.ModelAdmin):
         return format_html('<span style="color: red;">{} ₸</span>', balance)
     balance_display.short_description = "Баланс"
 
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ('category', 'amount', 'period_type', 'start_date', 'end_date', 'user', 'updated_at')
+    list_filter = ('period_type', 'user')
+    list_select_related = ('category', 'user')
+    search_fields = ('category__name', 'user__username')
+    readonly_fields = ('created_at', 'updated_at')
+
 # Настройка заголовка админ-панели
 admin.site.site_header = "Административная панель CoinCeeper"
 admin.site.site_title = "CoinCeeper Admin"
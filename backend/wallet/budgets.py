@@ -0,0 +1,102 @@
+"""
+Прогресс бюджетов: сколько потрачено из лимита в текущем периоде.
+
+Потраченная сумма берется из итогов по периодам, которые ledger обновляет
+при каждой записи транзакции (общих или категории). Период бюджета
+разбивается на целые годы, кварталы, месяцы, недели и оставшиеся дни
+(PeriodSummary.split_range): недельный или месячный бюджет - одна строка
+итогов, бюджет на произвольный диапазон - не больше ~40 строк, сколько бы
+дней в нем ни было. Статус строится двумя запросами: бюджеты пользователя
+и расходы всех бюджетов сразу по уникальным индексам итогов, поэтому его
+стоимость не зависит от количества транзакций.
+"""
+from datetime import date
+
+from django.db import connection
+
+from .models import Budget, CategoryPeriodSummary, PeriodSummary
+
+
+def get_budget_status(user, today=None):
+    """
+    Прогресс всех бюджетов пользователя
+
+    Args:
+        user: Пользователь
+        today: Дата, от которой отсчитываются текущие неделя и месяц
+
+    Returns:
+        list: {'id', 'category', 'category_name', 'period_type', 'start_date',
+               'end_date', 'amount', 'spent', 'remaining', 'percent', 'exceeded'}
+               в порядке создания бюджетов
+    """
+    today = today or date.today()
+    user_budgets = list(Budget.objects.filter(user=user).select_related('category').order_by('id'))
+    bounds = {budget.pk: budget.get_bounds(today) for budget in user_budgets}
+    spent = get_spent_amounts(user, [
+        (budget.pk, budget.category_id, *period_range)
+        for budget in user_budgets
+        for period_range in PeriodSummary.split_range(*bounds[budget.pk])
+    ])
+
+    statuses = []
+    for budget in user_budgets:
+        start_date, end_date = bounds[budget.pk]
+        budget_spent = spent.get(budget.pk, 0)
+        statuses.append({
+            'id': budget.pk,
+            'category': budget.category_id,
+            'category_name': budget.category.name if budget.category else None,
+            'period_type': budget.period_type,
+            'start_date': start_date,
+            'end_date': end_date,
+            'amount': float(budget.amount),
+            'spent': float(budget_spent),
+            'remaining': float(budget.amount - budget_spent),
+            'percent': round(float(budget_spent / budget.amount * 100), 2),
+            'exceeded': budget_spent > budget.amount,
+        })
+    return statuses
+
+
+def get_spent_amounts(user, ranges):
+    """
+    Расходы бюджетов по диапазонам ключей итогов одним запросом
+
+    Args:
+        user: Пользователь
+        ranges: [(budget_id, category_id или None, period_type, первый ключ, последний ключ)]
+
+    Returns:
+        dict: {budget_id: сумма расходов}; бюджетов без строк итогов в нем нет
+    """
+    if not ranges:
+        return {}
+
+    summary_table = connection.ops.quote_name(PeriodSummary._meta.db_table)
+    category_summary_table = connection.ops.quote_name(CategoryPeriodSummary._meta.db_table)
+    values = ', '.join(['(%s::bigint, %s::bigint, %s, %s, %s)'] * len(ranges))
+    params = [value for period_range in ranges for value in period_range]
+
+    with connection.cursor() as cursor:
+        # Бюджет на все расходы читает общие итоги, бюджет категории - итоги категории
+        cursor.execute(f"""
+            WITH ranges(budget_id, category_id, period_type, first_key, last_key) AS (VALUES {values})
+            SELECT ranges.budget_id, SUM(rows.expense_amount)
+            FROM ranges
+            CROSS JOIN LATERAL (
+                SELECT summary.expense_amount
+                FROM {summary_table} AS summary
+                WHERE ranges.category_id IS NULL AND summary.user_id = %s
+                    AND summary.period_type = ranges.period_type
+                    AND summary.period_key BETWEEN ranges.first_key AND ranges.last_key
+                UNION ALL
+                SELECT summary.expense_amount
+                FROM {category_summary_table} AS summary
+                WHERE summary.user_id = %s AND summary.category_id = ranges.category_id
+                    AND summary.period_type = ranges.period_type
+                    AND summary.period_key BETWEEN ranges.first_key AND ranges.last_key
+            ) AS rows
+            GROUP BY ranges.budget_id
+        """, [*params, user.pk, user.pk])
+        return dict(cursor.fetchall())
@@ -0,0 +1,264 @@
+"""
+Кэш ответов отчетных endpoint-ов (дашборд, статистика, итоги по периодам,
+ряды и сравнения аналитики, статус бюджетов) и условные GET-запросы
+(ETag / If-None-Match) для списков и дашборда.
+
+Ключ ответа содержит версию данных пользователя. Версия увеличивается после
+фиксации каждой записи (транзакции, счета, категории, применения очереди
+итогов), поэтому кэш никогда не очищается явно: ответы со старой версией
+просто перестают читаться и вытесняются по TTL (в Redis - политикой
+volatile-lru). Закрытые периоды меняются только задним числом, а такая
+запись тоже увеличивает версию.
+
+Та же версия дает ETag ответа, поэтому неизмененный ответ (304)
+возвращается без запросов к базе и без сериализации.
+
+Версия должна быть общей для всех процессов (Redis, Memcached, кэш в базе).
+В памяти процесса (LocMemCache) у каждого воркера своя версия, и запись в
+одном воркере не сделала бы устаревшими ответы и ETag остальных, поэтому с
+таким кэшем ответы не кэшируются, а ETag не выдается.
+"""
+import hashlib
+import logging
+import time
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'wallet:version:{user_id}'
+RESPONSE_KEY = 'wallet:response:{user_id}:{endpoint}:{version}:{params}'
+STATS_KEY = 'wallet:cache-stats:{endpoint}:{outcome}'
+HIT = 'hit'
+MISS = 'miss'
+
+# Endpoint-ы, ответы которых кэшируются
+CACHED_ENDPOINTS = (
+    'dashboard', 'statistics', 'period-summaries', 'analytics-series', 'analytics-comparison', 'budget-status',
+)
+
+# Параметры, которые не влияют на содержимое ответа
+IGNORED_PARAMS = ('consistent',)
+
+# Бэкенды, которые хранят данные в памяти процесса или не хранят вовсе
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache_available():
+    """Общий ли для всех процессов кэш, в котором хранится версия данных"""
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def get_data_version(user_id):
+    """
+    Текущая версия данных пользователя
+
+    Если ключа версии нет (еще не было записей или его вытеснили),
+    счетчик начинается с текущего времени в наносекундах, поэтому новая
+    версия не совпадет ни с одной из уже закэшированных.
+    """
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(*user_ids):
+    """
+    Увеличивает версию данных пользователей после фиксации текущей транзакции БД
+
+    До фиксации другие запросы еще видят старые данные и могли бы сохранить
+    их в кэш под новой версией, поэтому версия меняется в on_commit.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(lambda: _increment_versions(user_ids))
+
+
+def _increment_versions(user_ids):
+    for user_id in user_ids:
+        key = VERSION_KEY.format(user_id=user_id)
+        try:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Ключа нет: следующее чтение начнет новый счетчик
+                cache.add(key, time.time_ns(), timeout=None)
+        except Exception:
+            logger.exception("Не удалось обновить версию данных пользователя %s", user_id)
+
+
+def params_digest(query_params, *extra):
+    """
+    Хэш нормализованных параметров запроса
+
+    Параметры сортируются, поэтому их порядок в URL не влияет на хэш.
+    В хэш входит текущая дата: периоды "неделя", "месяц" и т.п.
+    отсчитываются от сегодняшнего дня.
+    """
+    params = sorted(
+        (name, value)
+        for name in query_params
+        if name not in IGNORED_PARAMS
+        for value in query_params.getlist(name)
+    )
+    params.append(('today', date.today().isoformat()))
+    params.extend(extra)
+    return hashlib.md5(repr(params).encode('utf-8')).hexdigest()
+
+
+def response_cache_key(user_id, endpoint, query_params):
+    """Ключ ответа: пользователь, endpoint, версия данных и нормализованные параметры"""
+    return RESPONSE_KEY.format(
+        user_id=user_id, endpoint=endpoint, version=get_data_version(user_id),
+        params=params_digest(query_params)
+    )
+
+
+def response_etag(request, endpoint):
+    """
+    Сильный ETag ответа: пользователь, endpoint, версия данных, параметры
+    и тип содержимого (JSON и HTML-представление API различаются)
+    """
+    user_id = request.user.pk
+    digest = params_digest(
+        request.query_params,
+        ('user', user_id), ('endpoint', endpoint), ('version', get_data_version(user_id)),
+        ('media_type', getattr(request, 'accepted_media_type', None)),
+    )
+    return f'"{digest}"'
+
+
+def conditional_response(endpoint):
+    """
+    Декоратор метода ViewSet: ETag и ответ 304 на If-None-Match
+
+    ETag считается до вызова метода, поэтому при совпадении не выполняются
+    ни запросы к базе, ни сериализация. Ответ помечается private, no-cache:
+    браузер хранит его и каждый раз переспрашивает сервер с If-None-Match.
+    Без общего кэша (shared_cache_available) ETag не выдается: другой воркер
+    посчитал бы его по своей, устаревшей версии и ответил бы 304 после записи.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not shared_cache_available():
+                return view_method(self, request, *args, **kwargs)
+
+            try:
+                etag = response_etag(request, endpoint)
+            except Exception:
+                logger.exception("Версия данных недоступна, ответ %s строится без ETag", endpoint)
+                return view_method(self, request, *args, **kwargs)
+
+            # If-None-Match сравнивается слабо: nginx при сжатии ответа делает ETag слабым (W/"...")
+            if_none_match = [
+                value.removeprefix('W/') for value in parse_etags(request.headers.get('If-None-Match', ''))
+            ]
+            if etag in if_none_match or '*' in if_none_match:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_response(endpoint):
+    """
+    Декоратор метода ViewSet: отдает ответ из кэша или сохраняет в кэш успешный ответ
+
+    Запросы с consistent=true сначала применяют очередь итогов, поэтому
+    всегда выполняются (их ответ все равно сохраняется). Заголовок
+    X-Cache показывает, был ли ответ взят из кэша. Без общего кэша
+    (shared_cache_available) ответ всегда строится заново.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not settings.WALLET_RESPONSE_CACHE or not shared_cache_available():
+                return view_method(self, request, *args, **kwargs)
+
+            try:
+                key = response_cache_key(request.user.pk, endpoint, request.query_params)
+                data = None
+                if request.query_params.get('consistent', '').lower() not in ('true', '1', 't'):
+                    data = cache.get(key)
+            except Exception:
+                logger.exception("Кэш ответов недоступен, ответ %s строится без кэша", endpoint)
+                return view_method(self, request, *args, **kwargs)
+
+            if data is not None:
+                _count(endpoint, HIT)
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _count(endpoint, MISS)
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                try:
+                    cache.set(key, response.data, timeout=settings.WALLET_RESPONSE_CACHE_TIMEOUT)
+                except Exception:
+                    logger.exception("Не удалось сохранить ответ %s в кэш", endpoint)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def _count(endpoint, outcome):
+    """Увеличивает счетчик попаданий или промахов endpoint-а"""
+    key = STATS_KEY.format(endpoint=endpoint, outcome=outcome)
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception:
+        pass
+
+
+def get_cache_stats(endpoints):
+    """
+    Счетчики попаданий и промахов по endpoint-ам
+
+    Returns:
+        dict: {endpoint: {'hit': int, 'miss': int}}
+    """
+    keys = {
+        (endpoint, outcome): STATS_KEY.format(endpoint=endpoint, outcome=outcome)
+        for endpoint in endpoints
+        for outcome in (HIT, MISS)
+    }
+    values = cache.get_many(list(keys.values()))
+    stats = {endpoint: {HIT: 0, MISS: 0} for endpoint in endpoints}
+    for (endpoint, outcome), key in keys.items():
+        stats[endpoint][outcome] = values.get(key, 0)
+    return stats
+
+
+def reset_cache_stats(endpoints):
+    """Обнуляет счетчики попаданий и промахов"""
+    cache.delete_many([
+        STATS_KEY.format(endpoint=endpoint, outcome=outcome)
+        for endpoint in endpoints
+        for outcome in (HIT, MISS)
+    ])
@@ -0,0 +1,169 @@
+"""
+Фильтры и сортировка списка транзакций.
+
+Параметры описаны декларативно в TransactionFilterSerializer и проверяются
+валидацией DRF (неверное значение - ответ 400, а не молча пустой или
+полный список). Принимаются и прежние имена параметров (start_date,
+end_date), и имена, которые отправляет клиент (date_from, date_to,
+amount_min, amount_max). Типы, категории и счета можно передать списком:
+повтором параметра (?category=1&category=2) или через запятую
+(?category=1,2).
+
+Каждое сочетание фильтров и каждая сортировка идут по индексам
+транзакций (см. Transaction.Meta.indexes и сценарий indexes команды
+benchmark_wallet).
+"""
+from functools import lru_cache
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Transaction
+
+# Сортировки списка: параметр ordering -> поля. Последнее поле - id,
+# поэтому порядок однозначен и по нему работает курсор страниц
+ORDERINGS = {
+    '-date': ('-date', '-created_at', '-id'),
+    'date': ('date', 'created_at', 'id'),
+    '-amount': ('-amount', '-id'),
+    'amount': ('amount', 'id'),
+}
+DEFAULT_ORDERING = '-date'
+# При поиске без ordering: сначала более релевантные, при равной релевантности - новые
+SEARCH_ORDERING = ('-search_rank', '-date', '-created_at', '-id')
+
+
+class MultipleValueField(serializers.ListField):
+    """Список значений: повторенный параметр, строка через запятую или одно значение"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, (str, int)):
+            data = [data]
+        values = []
+        for item in data if isinstance(data, (list, tuple)) else [data]:
+            if isinstance(item, str):
+                values.extend(value.strip() for value in item.split(',') if value.strip())
+            else:
+                values.append(item)
+        return super().to_internal_value(values)
+
+
+class TransactionFilterSerializer(serializers.Serializer):
+    """Параметры фильтрации, поиска и сортировки списка транзакций"""
+    # Прежнее имя параметра -> поле (если переданы оба, действует новое имя)
+    ALIASES = {'start_date': 'date_from', 'end_date': 'date_to'}
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    amount_min = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    amount_max = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    type = MultipleValueField(child=serializers.ChoiceField(choices=Transaction.TYPE_CHOICES), required=False)
+    category = MultipleValueField(child=serializers.IntegerField(min_value=1), required=False)
+    account = MultipleValueField(child=serializers.IntegerField(min_value=1), required=False)
+    search = serializers.CharField(required=False, allow_blank=True)
+    ordering = serializers.ChoiceField(choices=list(ORDERINGS), required=False)
+
+    def to_internal_value(self, data):
+        aliases = {legacy: name for legacy, name in self.ALIASES.items() if legacy in data and name not in data}
+        if aliases:
+            data = data.copy()
+            for legacy, name in aliases.items():
+                data[name] = data[legacy]
+        return super().to_internal_value(data)
+
+    def validate(self, data):
+        if 'date_from' in data and 'date_to' in data and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError({'date_to': "Дата окончания раньше даты начала"})
+        if 'amount_min' in data and 'amount_max' in data and data['amount_min'] > data['amount_max']:
+            raise serializers.ValidationError({'amount_max': "Максимальная сумма меньше минимальной"})
+        return data
+
+
+class TransactionFilterBackend(BaseFilterBackend):
+    """Фильтры, поиск и сортировка из параметров запроса (TransactionFilterSerializer)"""
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_transactions(queryset, request.query_params)
+
+
+def filter_transactions(queryset, params):
+    """
+    Применяет к транзакциям фильтры, поиск и сортировку из параметров
+
+    Args:
+        queryset: Транзакции пользователя
+        params: Параметры запроса или словарь с теми же ключами
+
+    Raises:
+        ValidationError: Неверные значения параметров
+    """
+    serializer = TransactionFilterSerializer(data=params)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    if 'date_from' in data:
+        queryset = queryset.filter(date__gte=data['date_from'])
+    if 'date_to' in data:
+        queryset = queryset.filter(date__lte=data['date_to'])
+    if 'amount_min' in data:
+        queryset = queryset.filter(amount__gte=data['amount_min'])
+    if 'amount_max' in data:
+        queryset = queryset.filter(amount__lte=data['amount_max'])
+    if data.get('type'):
+        queryset = queryset.filter(type__in=data['type'])
+    if data.get('category'):
+        queryset = queryset.filter(category_id__in=data['category'])
+    # Счет учитывает как исходящие, так и входящие переводы
+    if data.get('account'):
+        queryset = queryset.filter(
+            Q(account_id__in=data['account']) |
+            Q(destination_account_id__in=data['account'])
+        )
+
+    query = data.get('search', '').strip()
+    if query:
+        queryset = search_transactions(queryset, query)
+        if 'ordering' not in data:
+            return queryset.order_by(*SEARCH_ORDERING)
+    return queryset.order_by(*ORDERINGS[data.get('ordering', DEFAULT_ORDERING)])
+
+
+def search_transactions(queryset, query):
+    """
+    Полнотекстовый поиск транзакций по комментарию
+
+    Запрос разбирается как в поисковиках (websearch: "фраза", -исключение,
+    or) по русской и английской морфологии и сравнивается с сохраненным
+    вектором search_vector (GIN-индекс transaction_comment_search_idx).
+    Если в базе есть pg_trgm, находятся и комментарии с опечатками или
+    частью слова (индекс transaction_comment_trgm_idx). Релевантность -
+    аннотация search_rank.
+
+    Args:
+        queryset: Транзакции пользователя
+        query: Строка поиска
+    """
+    search_query = (
+        SearchQuery(query, config='russian', search_type='websearch') |
+        SearchQuery(query, config='english', search_type='websearch')
+    )
+    condition = Q(search_vector=search_query)
+    rank = SearchRank(F('search_vector'), search_query)
+    if trigram_search_available():
+        condition |= Q(comment__trigram_word_similar=query)
+        rank = rank + TrigramWordSimilarity(query, 'comment')
+
+    # real -> double precision: значение релевантности в курсоре должно сравниваться точно
+    return queryset.filter(condition).annotate(search_rank=Cast(rank, FloatField()))
+
+
+@lru_cache(maxsize=None)
+def trigram_search_available():
+    """Установлено ли расширение pg_trgm (проверяется один раз на процесс)"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
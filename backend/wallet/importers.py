@@ -0,0 +1,236 @@
+"""
+Импорт транзакций из файлов (CSV, OFX, JSON).
+
+Файл читается построчно, строки проверяются пачками и вставляются через
+bulk_create. Изменения балансов и итогов по периодам накапливаются по всем
+строкам и применяются в конце несколькими запросами через движок проводок.
+"""
+import csv
+import io
+import json
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_data_version
+from .ledger import apply_balance_deltas, apply_period_deltas, merge_deltas
+from .models import Account, Category, Transaction
+from .serializers import TransactionImportSerializer
+
+CSV = 'csv'
+OFX = 'ofx'
+JSON = 'json'
+FORMATS = (CSV, OFX, JSON)
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%Y%m%d', '%d/%m/%Y')
+
+OFX_TAG_RE = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+class ImportFormatError(ValueError):
+    """Файл не удалось разобрать в указанном формате"""
+
+
+def detect_format(filename):
+    """Определяет формат файла по расширению"""
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in ('qfx', OFX):
+        return OFX
+    if extension in ('ndjson', 'jsonl', JSON):
+        return JSON
+    return CSV
+
+
+def read_rows(upload, file_format, default_account=None):
+    """
+    Возвращает генератор строк файла в виде словарей с полями транзакции
+
+    Args:
+        upload: Загруженный файл (request.FILES)
+        file_format: csv, ofx или json
+        default_account: Счет для строк, в которых он не указан (обязателен для OFX)
+    """
+    if file_format not in FORMATS:
+        raise ImportFormatError(f"Неподдерживаемый формат файла: {file_format}")
+
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace')
+    parser = {CSV: _parse_csv, OFX: _parse_ofx, JSON: _parse_json}[file_format]
+    for row in parser(stream):
+        if default_account and not row.get('account'):
+            row['account'] = default_account
+        yield normalize_row(row)
+
+
+def normalize_row(row):
+    """
+    Приводит строку к виду, который принимает TransactionImportSerializer:
+    дата в ISO-формате, тип по знаку суммы, если он не указан
+    """
+    row = {key: value for key, value in row.items() if value not in (None, '')}
+
+    amount = row.get('amount')
+    if isinstance(amount, str):
+        amount = amount.replace(' ', '').replace(',', '.')
+    try:
+        amount = Decimal(str(amount)) if amount is not None else None
+    except InvalidOperation:
+        amount = row.get('amount')
+    if isinstance(amount, Decimal):
+        if not row.get('type'):
+            row['type'] = Transaction.EXPENSE if amount < 0 else Transaction.INCOME
+        amount = abs(amount)
+    row['amount'] = amount
+
+    value = row.get('date')
+    if isinstance(value, str):
+        row['date'] = _parse_date(value.strip())
+    return row
+
+
+def import_rows(user, rows, partial=False, chunk_size=None):
+    """
+    Импортирует строки транзакций для пользователя
+
+    Args:
+        user: Пользователь
+        rows: Итератор словарей с полями транзакции
+        partial: True - сохранить корректные строки и пропустить ошибочные,
+                 False - все или ничего
+        chunk_size: Размер пачки для bulk_create
+
+    Returns:
+        dict: {'created': int, 'failed': int, 'errors': [{'row': номер, 'errors': ...}]}
+    """
+    chunk_size = chunk_size or getattr(settings, 'WALLET_IMPORT_CHUNK_SIZE', 1000)
+    context = {
+        'accounts': {str(account.pk): account for account in Account.objects.filter(user=user)},
+        'categories': _category_lookup(user),
+    }
+
+    created = 0
+    errors = []
+    balance_deltas = {}
+    period_deltas = {}
+    chunk = []
+
+    def flush_chunk():
+        """Вставляет накопленную пачку и добавляет ее изменения к общим"""
+        nonlocal created, balance_deltas, period_deltas
+        if not chunk:
+            return
+        Transaction.objects.bulk_create(chunk)
+        balance_deltas = merge_deltas(balance_deltas, *(item._balance_effect() for item in chunk))
+        period_deltas = merge_deltas(period_deltas, *(item._period_effect() for item in chunk))
+        created += len(chunk)
+        chunk.clear()
+
+    with transaction.atomic():
+        for number, row in enumerate(rows, start=1):
+            serializer = TransactionImportSerializer(data=row, context=context)
+            if not serializer.is_valid():
+                errors.append({'row': number, 'errors': serializer.errors})
+                continue
+            # В режиме "все или ничего" после первой ошибки только проверяем оставшиеся строки
+            if errors and not partial:
+                continue
+            chunk.append(Transaction(user=user, **serializer.validated_data))
+            if len(chunk) >= chunk_size:
+                flush_chunk()
+
+        if errors and not partial:
+            transaction.set_rollback(True)
+            return {'created': 0, 'failed': len(errors), 'errors': errors}
+
+        flush_chunk()
+
+        # Итоговые изменения по всем строкам применяются один раз
+        apply_balance_deltas(balance_deltas)
+        apply_period_deltas(user.pk, period_deltas)
+        if created:
+            bump_data_version(user.pk)
+
+    return {'created': created, 'failed': len(errors), 'errors': errors}
+
+
+def _category_lookup(user):
+    """Словарь категорий пользователя по id и по паре (название, тип)"""
+    lookup = {}
+    for category in Category.objects.filter(user=user):
+        lookup[str(category.pk)] = category
+        lookup[(category.name.strip().lower(), category.type)] = category
+    return lookup
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+def _parse_csv(stream):
+    """CSV с заголовком: date, amount, type, category, account, destination_account, comment"""
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(stream, dialect=dialect)
+    if not reader.fieldnames:
+        raise ImportFormatError("CSV-файл должен начинаться со строки заголовка")
+    for row in reader:
+        yield {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+
+
+def _parse_json(stream):
+    """JSON-массив объектов или NDJSON (по одному объекту в строке)"""
+    first_line = stream.readline()
+    if first_line.lstrip().startswith('['):
+        try:
+            items = json.loads(first_line + stream.read())
+        except json.JSONDecodeError as exc:
+            raise ImportFormatError(f"Некорректный JSON: {exc}")
+        for item in items:
+            yield item if isinstance(item, dict) else {}
+        return
+
+    line = first_line
+    while line:
+        if line.strip():
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = {}
+            yield item if isinstance(item, dict) else {}
+        line = stream.readline()
+
+
+def _parse_ofx(stream):
+    """Банковская выписка OFX/QFX (SGML и XML варианты): блоки <STMTTRN>"""
+    current = None
+    for line in stream:
+        for closing, tag, value in OFX_TAG_RE.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    yield _ofx_transaction(current)
+                    current = None
+                elif not closing:
+                    current = {}
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+
+def _ofx_transaction(fields):
+    memo = ' '.join(filter(None, [fields.get('NAME'), fields.get('MEMO')]))
+    return {
+        'date': fields.get('DTPOSTED', '')[:8],
+        'amount': fields.get('TRNAMT'),
+        'comment': memo or None,
+    }
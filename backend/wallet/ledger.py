@@ -0,0 +1,503 @@
+"""
+Движок проводок кошелька.
+
+Все изменения балансов счетов выполняются на стороне базы данных
+(``balance = balance + delta``), а не через чтение баланса в Python и
+последующий ``save()``. Это исключает потерю обновлений при параллельных
+запросах и сокращает число обращений к базе.
+
+Порядок блокировок при записи транзакции всегда одинаковый:
+строка транзакции -> счета по возрастанию id -> балансы на конец дня ->
+итоги по периодам -> итоги по категориям.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .models import Account, AccountBalanceSnapshot, CategoryPeriodSummary, PendingSummaryDelta, PeriodSummary, Transaction
+
+logger = logging.getLogger(__name__)
+
+
+def balance_effect(transaction_type, amount, date, account_id, destination_account_id=None):
+    """
+    Возвращает изменения балансов, которые вносит транзакция, с датой изменения
+
+    Returns:
+        dict: {(account_id, date): delta}
+    """
+    if transaction_type == Transaction.INCOME:
+        return {(account_id, date): amount}
+    if transaction_type == Transaction.EXPENSE:
+        return {(account_id, date): -amount}
+    if transaction_type == Transaction.TRANSFER and destination_account_id:
+        return {(account_id, date): -amount, (destination_account_id, date): amount}
+    return {}
+
+
+def negate(effect):
+    """Возвращает обратные изменения (для отмены эффекта транзакции)"""
+    return {key: -delta for key, delta in effect.items()}
+
+
+def merge_deltas(*effects):
+    """Складывает несколько словарей изменений, отбрасывая нулевые итоги"""
+    merged = defaultdict(Decimal)
+    for effect in effects:
+        for key, delta in effect.items():
+            merged[key] += delta
+    return {key: delta for key, delta in merged.items() if delta}
+
+
+def apply_balance_deltas(deltas):
+    """
+    Применяет изменения балансов счетов и балансов на конец дня
+
+    Строки счетов блокируются в порядке возрастания id, поэтому две
+    параллельные записи, затрагивающие одни и те же счета, не могут
+    взаимно заблокироваться. Балансы на конец дня меняются уже под
+    блокировкой счетов.
+
+    Args:
+        deltas: {(account_id, date): delta}
+
+    Returns:
+        dict: {account_id: новый баланс}
+    """
+    dated_deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not dated_deltas:
+        return {}
+
+    # Счет блокируется и при нулевом итоговом изменении (смена даты транзакции),
+    # так как его балансы на конец дня все равно меняются
+    deltas = defaultdict(Decimal)
+    for (pk, _), delta in dated_deltas.items():
+        deltas[pk] += delta
+
+    table = connection.ops.quote_name(Account._meta.db_table)
+    ids = sorted(deltas)
+    values = ', '.join(['(%s::bigint, %s::numeric)'] * len(ids))
+    placeholders = ', '.join(['%s'] * len(ids))
+
+    params = [timezone.now()]
+    for pk in ids:
+        params.extend([pk, deltas[pk]])
+    params.extend(ids)
+
+    sql = f"""
+        UPDATE {table} AS account
+        SET balance = account.balance + delta.amount, updated_at = %s
+        FROM (VALUES {values}) AS delta(id, amount),
+             (SELECT id FROM {table} WHERE id IN ({placeholders})
+              ORDER BY id FOR UPDATE) AS locked
+        WHERE account.id = delta.id AND account.id = locked.id
+        RETURNING account.id, account.balance
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        balances = dict(cursor.fetchall())
+
+    _apply_snapshot_deltas(dated_deltas)
+    return balances
+
+
+def _apply_snapshot_deltas(deltas):
+    """
+    Применяет изменения к балансам на конец дня одним запросом
+
+    Изменение за дату D прибавляется к строке за D и ко всем более поздним
+    строкам счета (исправление для задним числом внесенных транзакций).
+    Если строки за D нет, она создается с балансом предыдущей строки
+    (или начальным балансом счета) плюс изменения не позже D.
+
+    Изменения по счету складываются нарастающим итогом (оконная функция)
+    в одном проходе по датам изменений и строкам счета не раньше первого
+    изменения, поэтому каждая строка обновляется один раз, сколько бы дат
+    ни затрагивала запись (импорт, массовое удаление).
+
+    Args:
+        deltas: {(account_id, date): delta}
+    """
+    table = connection.ops.quote_name(AccountBalanceSnapshot._meta.db_table)
+    account_table = connection.ops.quote_name(Account._meta.db_table)
+    keys = sorted(deltas)
+    values = ', '.join(['(%s::bigint, %s::date, %s::numeric)'] * len(keys))
+    params = []
+    for account_id, date in keys:
+        params.extend([account_id, date, deltas[(account_id, date)]])
+
+    # Новые строки вставляются в CTE и не видны UPDATE в том же запросе,
+    # поэтому UPDATE меняет только строки, которые уже были
+    sql = f"""
+        WITH delta(account_id, date, amount) AS (VALUES {values}),
+        inserted AS (
+            INSERT INTO {table} (account_id, date, balance)
+            SELECT running.account_id, running.date,
+                   COALESCE(
+                       (SELECT previous.balance FROM {table} AS previous
+                        WHERE previous.account_id = running.account_id AND previous.date < running.date
+                        ORDER BY previous.date DESC LIMIT 1),
+                       account.opening_balance
+                   ) + running.amount
+            FROM (
+                SELECT account_id, date, SUM(amount) OVER (PARTITION BY account_id ORDER BY date) AS amount
+                FROM delta
+            ) AS running
+            JOIN {account_table} AS account ON account.id = running.account_id
+            ON CONFLICT (account_id, date) DO NOTHING
+        ),
+        first AS (
+            SELECT account_id, MIN(date) AS date FROM delta GROUP BY account_id
+        ),
+        timeline AS (
+            -- Изменения и строки счета по датам; в одну дату изменение идет раньше строки
+            SELECT NULL::bigint AS id, account_id, date, amount FROM delta
+            UNION ALL
+            SELECT existing.id, existing.account_id, existing.date, 0
+            FROM {table} AS existing
+            JOIN first ON existing.account_id = first.account_id AND existing.date >= first.date
+        ),
+        change AS (
+            SELECT id, SUM(amount) OVER (PARTITION BY account_id ORDER BY date, id NULLS FIRST) AS amount
+            FROM timeline
+        )
+        UPDATE {table} AS snapshot
+        SET balance = snapshot.balance + change.amount
+        FROM first, change
+        -- Диапазон по first читает по индексу только строки, которые могут измениться
+        WHERE snapshot.account_id = first.account_id AND snapshot.date >= first.date
+            AND snapshot.id = change.id AND change.amount <> 0
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def period_effect(transaction_type, amount, date, category_id=None):
+    """
+    Возвращает изменения итогов по периодам, которые вносит транзакция
+
+    Для каждого периода есть изменение общих итогов (category_id = None)
+    и, если у транзакции есть категория, изменение итогов этой категории.
+    Переводы не влияют на доходы и расходы, поэтому для них изменений нет.
+
+    Returns:
+        dict: {(period_type, period_key, transaction_type, category_id): delta}
+    """
+    if transaction_type not in (Transaction.INCOME, Transaction.EXPENSE):
+        return {}
+    effect = {}
+    for period_type, _ in PeriodSummary.PERIOD_CHOICES:
+        period_key = PeriodSummary.get_period_key(date, period_type)
+        effect[(period_type, period_key, transaction_type, None)] = amount
+        if category_id:
+            effect[(period_type, period_key, transaction_type, category_id)] = amount
+    return effect
+
+
+def apply_period_deltas(user_id, deltas):
+    """
+    Применяет изменения итогов по периодам и по категориям
+
+    Все затронутые строки PeriodSummary (и CategoryPeriodSummary) обновляются одной командой
+    INSERT ... ON CONFLICT DO UPDATE, суммы увеличиваются на стороне базы,
+    поэтому параллельные записи не перезаписывают итоги друг друга.
+
+    При включенном WALLET_ASYNC_SUMMARIES изменения только добавляются
+    в очередь PendingSummaryDelta, а применяет их задача Celery.
+
+    Args:
+        user_id: id пользователя
+        deltas: {(period_type, period_key, transaction_type, category_id): delta}
+    """
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for (period_type, period_key, transaction_type, category_id), delta in deltas.items():
+        column = 0 if transaction_type == Transaction.INCOME else 1
+        totals[(category_id, period_type, period_key)][column] += delta
+    rows = [
+        (user_id, category_id, period_type, period_key, income, expense)
+        for (category_id, period_type, period_key), (income, expense) in totals.items()
+        if income or expense
+    ]
+    if not rows:
+        return
+
+    if settings.WALLET_ASYNC_SUMMARIES:
+        _enqueue_period_rows(user_id, rows)
+    else:
+        _upsert_period_rows(rows)
+
+
+def flush_pending_summaries(user_id=None, wait=True):
+    """
+    Применяет накопленные в очереди изменения итогов
+
+    Изменения забираются из очереди командой DELETE ... RETURNING,
+    суммируются по (user, category, period_type, period_key) и применяются
+    upsert-ами на пачку. Используется задачей Celery и путями чтения, которым нужно
+    увидеть собственные записи пользователя.
+
+    Args:
+        user_id: id пользователя, список id или None для всех пользователей
+        wait: Ждать строки, которые сейчас применяет другой процесс
+              (False - пропускать их, как делают воркеры)
+
+    Returns:
+        int: Количество примененных записей очереди
+    """
+    table = connection.ops.quote_name(PendingSummaryDelta._meta.db_table)
+    batch_size = settings.WALLET_SUMMARY_FLUSH_BATCH_SIZE
+    user_filter = 'WHERE user_id = ANY(%s)' if user_id is not None else ''
+    if user_id is not None and not isinstance(user_id, (list, tuple)):
+        user_id = [user_id]
+    lock = 'FOR UPDATE' if wait else 'FOR UPDATE SKIP LOCKED'
+    sql = f"""
+        WITH drained AS (
+            DELETE FROM {table} WHERE id IN (
+                SELECT id FROM {table} {user_filter} ORDER BY id LIMIT %s {lock}
+            )
+            RETURNING user_id, category_id, period_type, period_key, income_amount, expense_amount
+        )
+        SELECT user_id, category_id, period_type, period_key, SUM(income_amount), SUM(expense_amount), COUNT(*)
+        FROM drained
+        GROUP BY user_id, category_id, period_type, period_key
+    """
+    params = ([user_id] if user_id is not None else []) + [batch_size]
+
+    flushed = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                groups = cursor.fetchall()
+            _upsert_period_rows([group[:6] for group in groups if group[4] or group[5]])
+            bump_data_version(*{group[0] for group in groups})
+        drained = sum(group[-1] for group in groups)
+        flushed += drained
+        if drained < batch_size:
+            return flushed
+
+
+def _upsert_period_rows(rows):
+    """
+    Увеличивает итоги по периодам и по категориям
+
+    Строки без категории относятся к PeriodSummary, с категорией -
+    к CategoryPeriodSummary. На каждую таблицу один запрос.
+
+    Args:
+        rows: [(user_id, category_id, period_type, period_key, income_delta, expense_delta)]
+    """
+    _upsert_summary_rows(
+        PeriodSummary, ('user_id', 'period_type', 'period_key'),
+        [(user_id, *row) for user_id, category_id, *row in rows if category_id is None]
+    )
+    _upsert_summary_rows(
+        CategoryPeriodSummary, ('user_id', 'category_id', 'period_type', 'period_key'),
+        [row for row in rows if row[1] is not None]
+    )
+
+
+def _upsert_summary_rows(model, key_columns, rows):
+    """
+    Увеличивает суммы в таблице итогов одним INSERT ... ON CONFLICT DO UPDATE
+
+    Args:
+        model: PeriodSummary или CategoryPeriodSummary
+        key_columns: Колонки уникального ключа таблицы
+        rows: [(*ключ, income_delta, expense_delta)]
+    """
+    if not rows:
+        return
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(key_columns)
+    now = timezone.now()
+    params = []
+    # Сортировка ключей задает одинаковый порядок блокировки строк для всех запросов
+    for row in sorted(rows):
+        params.extend([*row, now, now])
+    placeholders = ', '.join(['%s'] * (len(key_columns) + 4))
+    values = ', '.join([f'({placeholders})'] * len(rows))
+
+    sql = f"""
+        INSERT INTO {table} AS summary
+            ({columns}, income_amount, expense_amount, created_at, updated_at)
+        VALUES {values}
+        ON CONFLICT ({columns}) DO UPDATE SET
+            income_amount = summary.income_amount + EXCLUDED.income_amount,
+            expense_amount = summary.expense_amount + EXCLUDED.expense_amount,
+            updated_at = EXCLUDED.updated_at
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _enqueue_period_rows(user_id, rows):
+    """Добавляет изменения итогов в очередь и планирует задачу, которая их применит"""
+    PendingSummaryDelta.objects.bulk_create([
+        PendingSummaryDelta(
+            user_id=row_user_id, category_id=category_id, period_type=period_type,
+            period_key=period_key, income_amount=income, expense_amount=expense
+        )
+        for row_user_id, category_id, period_type, period_key, income, expense in rows
+    ])
+    transaction.on_commit(lambda: _schedule_flush(user_id))
+
+
+def _schedule_flush(user_id):
+    """
+    Планирует применение очереди пользователя с задержкой
+
+    Пока задача уже запланирована, новые записи пользователя только
+    попадают в очередь, и задача применяет их все вместе. Если задача не
+    запланировалась или потерялась, очередь применит периодическая задача
+    для всех пользователей (WALLET_SUMMARY_SWEEP_INTERVAL).
+    """
+    from .tasks import flush_summary_deltas
+
+    delay = settings.WALLET_SUMMARY_FLUSH_DELAY
+    try:
+        if cache.add(f'wallet:summary-flush:{user_id}', 1, timeout=delay + 1):
+            flush_summary_deltas.apply_async(args=[user_id], countdown=delay)
+    except Exception:
+        # Изменения уже в очереди, их применит периодическая задача (CELERY_BEAT_SCHEDULE),
+        # следующая задача пользователя или чтение с consistent=true
+        logger.exception("Не удалось запланировать применение итогов для пользователя %s", user_id)
+
+
+def delete_transactions(queryset):
+    """
+    Удаляет выбранные транзакции одним запросом и откатывает их влияние
+    на балансы и итоги по периодам
+
+    Удаление и подсчет изменений выполняются одной командой
+    (DELETE ... RETURNING внутри WITH с группировкой), поэтому в Python
+    попадают только групповые суммы, а не сами строки.
+
+    Returns:
+        int: Количество удаленных транзакций
+    """
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    with transaction.atomic():
+        locked_sql, params = _locked_rows_sql(queryset, 'pk')
+        sql = f"""
+            WITH deleted AS (
+                DELETE FROM {table} WHERE id IN ({locked_sql})
+                RETURNING user_id, type, date, category_id, account_id, destination_account_id, amount
+            )
+            SELECT user_id, type, date, category_id, account_id, destination_account_id, SUM(amount), COUNT(*)
+            FROM deleted
+            GROUP BY user_id, type, date, category_id, account_id, destination_account_id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            groups = cursor.fetchall()
+
+        balance_deltas = []
+        period_deltas = defaultdict(list)
+        for user_id, transaction_type, date, category_id, account_id, destination_id, total, _ in groups:
+            balance_deltas.append(negate(balance_effect(transaction_type, total, date, account_id, destination_id)))
+            period_deltas[user_id].append(negate(period_effect(transaction_type, total, date, category_id)))
+
+        apply_balance_deltas(merge_deltas(*balance_deltas))
+        for user_id, deltas in period_deltas.items():
+            apply_period_deltas(user_id, merge_deltas(*deltas))
+        bump_data_version(*{group[0] for group in groups})
+
+    return sum(group[-1] for group in groups)
+
+
+def move_transactions(queryset, account):
+    """
+    Переносит выбранные транзакции на другой счет и пересчитывает балансы
+    старых и нового счетов по групповым суммам
+
+    Переводы, у которых счет назначения совпадает с новым счетом, пропускаются.
+
+    Returns:
+        int: Количество перенесенных транзакций
+    """
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    queryset = queryset.exclude(account=account).exclude(destination_account=account)
+    with transaction.atomic():
+        locked_sql, params = _locked_rows_sql(queryset, 'pk', 'account_id')
+        sql = f"""
+            WITH moved AS (
+                UPDATE {table} AS moved_transaction
+                SET account_id = %s, updated_at = %s
+                FROM ({locked_sql}) AS old
+                WHERE moved_transaction.id = old.id
+                RETURNING moved_transaction.type, moved_transaction.amount, moved_transaction.date,
+                          old.account_id AS old_account_id, moved_transaction.destination_account_id
+            )
+            SELECT type, date, old_account_id, destination_account_id, SUM(amount), COUNT(*)
+            FROM moved
+            GROUP BY type, date, old_account_id, destination_account_id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [account.pk, timezone.now(), *params])
+            groups = cursor.fetchall()
+
+        balance_deltas = []
+        for transaction_type, date, old_account_id, destination_id, total, _ in groups:
+            balance_deltas.append(negate(balance_effect(transaction_type, total, date, old_account_id, destination_id)))
+            balance_deltas.append(balance_effect(transaction_type, total, date, account.pk, destination_id))
+        apply_balance_deltas(merge_deltas(*balance_deltas))
+        if groups:
+            bump_data_version(account.user_id)
+
+    return sum(group[-1] for group in groups)
+
+
+def recategorize_transactions(queryset, category):
+    """
+    Меняет категорию выбранных транзакций одним запросом и переносит их
+    суммы в итогах по категориям со старых категорий на новую
+
+    Категория назначается только транзакциям того же типа, что и категория.
+    Балансы и общие итоги по периодам от категории не зависят.
+
+    Returns:
+        int: Количество измененных транзакций
+    """
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    queryset = queryset.filter(type=category.type).exclude(category=category)
+    with transaction.atomic():
+        locked_sql, params = _locked_rows_sql(queryset, 'pk', 'category_id')
+        sql = f"""
+            WITH changed AS (
+                UPDATE {table} AS changed_transaction
+                SET category_id = %s, updated_at = %s
+                FROM ({locked_sql}) AS old
+                WHERE changed_transaction.id = old.id
+                RETURNING changed_transaction.user_id, changed_transaction.type, changed_transaction.date,
+                          old.category_id AS old_category_id, changed_transaction.amount
+            )
+            SELECT user_id, type, date, old_category_id, SUM(amount), COUNT(*)
+            FROM changed
+            GROUP BY user_id, type, date, old_category_id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [category.pk, timezone.now(), *params])
+            groups = cursor.fetchall()
+
+        period_deltas = defaultdict(list)
+        for user_id, transaction_type, date, old_category_id, total, _ in groups:
+            period_deltas[user_id].append(negate(period_effect(transaction_type, total, date, old_category_id)))
+            period_deltas[user_id].append(period_effect(transaction_type, total, date, category.pk))
+        for user_id, deltas in period_deltas.items():
+            apply_period_deltas(user_id, merge_deltas(*deltas))
+        bump_data_version(*period_deltas)
+
+    return sum(group[-1] for group in groups)
+
+
+def _locked_rows_sql(queryset, *fields):
+    """SQL выборки полей транзакций с блокировкой строк в порядке возрастания id"""
+    return queryset.order_by('pk').select_for_update().values(*fields).query.sql_with_params()
@@ -0,0 +1,668 @@
+import contextlib
+import io
+import json
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from wallet.cache import _increment_versions, shared_cache_available
+from wallet.filters import filter_transactions
+from wallet.models import (
+    Account, AccountBalanceSnapshot, Budget, Category, CategoryPeriodSummary, PeriodSummary, Transaction
+)
+from wallet.parsers import ORJSONParser
+from wallet.rebuild import rebuild_users
+from wallet.renderers import ORJSONRenderer
+from wallet.serializers import SeriesParamsSerializer, TransactionListSerializer, TransactionSerializer
+from wallet.views import (
+    AnalyticsViewSet, BudgetViewSet, TransactionViewSet, get_period_conditions, get_period_totals
+)
+
+SCENARIOS = (
+    'period-totals', 'dashboard', 'response-cache', 'indexes', 'transaction-list', 'list-serializer', 'json',
+    'search', 'series', 'comparison', 'budgets',
+)
+
+DASHBOARD_PERIODS = ('today', 'week', 'month', 'quarter', 'year', 'all')
+
+TRANSACTION_LIST_PAGE_SIZES = (10, 100, 500)
+
+# Во сколько раз быстрое представление списка должно быть быстрее TransactionSerializer
+LIST_SERIALIZER_MIN_SPEEDUP = 5
+LIST_SERIALIZER_ROWS = 10000
+
+# Поиск по комментариям: 95-й перцентиль первой страницы, мс
+SEARCH_MAX_P95_MS = 50
+SEARCH_COMMENTS = (
+    'Продукты в магазине у дома', 'Кофе с коллегами', 'Такси до аэропорта', 'Обед в кафе',
+    'Аренда квартиры за месяц', 'Бензин на заправке', 'Подарок на день рождения',
+    'Coffee beans', 'Netflix subscription', 'Gym membership', 'Taxi to the airport', '',
+)
+SEARCH_QUERIES = ('кофе', 'продукт', 'такси аэропорт', '"обед в кафе"', 'subscription', 'airport -такси')
+
+# Ряд аналитики: запросов к базе на ряд любой длины и шага
+SERIES_MAX_QUERIES = 1
+SERIES_GRANULARITIES = ('day', 'week', 'month', 'year')
+
+# Сравнение с предыдущим периодом: запросов к базе на вызов (общие итоги и итоги
+# по категориям)
+COMPARISON_MAX_QUERIES = 2
+COMPARISON_PERIODS = ('week', 'month', 'quarter', 'year')
+
+# Статус бюджетов: запросов к базе на вызов (бюджеты пользователя и расходы всех
+# бюджетов по итогам); бюджет на диапазон - за столько дней
+BUDGET_STATUS_MAX_QUERIES = 2
+BUDGET_CUSTOM_DAYS = 90
+
+# Таблицы, которые горячие запросы не должны читать последовательным сканированием
+INDEXED_TABLES = (Transaction._meta.db_table, PeriodSummary._meta.db_table)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время запросов кошелька на синтетической истории транзакций. "
+        "Данные создаются в транзакции, которая в конце откатывается"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS,
+            help="Сценарий (можно указать несколько раз, по умолчанию все)"
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help="Количество повторов каждого замера"
+        )
+        parser.add_argument(
+            '--years', default='1,5,10,25',
+            help="Длины истории в годах через запятую"
+        )
+        parser.add_argument(
+            '--per-day', type=int, default=3,
+            help="Количество транзакций в день"
+        )
+        parser.add_argument(
+            '--rows', type=int, default=1000000,
+            help="Всего транзакций в таблице для сценария indexes"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            options['years'] = [int(value) for value in options['years'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError("Неверный формат --years. Используйте числа через запятую.")
+
+        for scenario in options['scenario'] or SCENARIOS:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Сценарий {scenario}"))
+            with transaction.atomic():
+                getattr(self, 'scenario_' + scenario.replace('-', '_'))(options)
+                transaction.set_rollback(True)
+
+    def scenario_period_totals(self, options):
+        """
+        Итоги за всю историю: разбиение диапазона на годы, кварталы, месяцы,
+        недели и дни против суммы всех дневных строк
+        """
+        end_date = date.today()
+        for years in options['years']:
+            start_date = end_date - timedelta(days=365 * years)
+            user, created = self._create_history(start_date, end_date, options['per_day'])
+
+            conditions_sql, params = get_period_conditions(start_date, end_date)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM {PeriodSummary._meta.db_table} WHERE user_id = %s AND {conditions_sql}",
+                    [user.pk, *params]
+                )
+                rows, = cursor.fetchone()
+            daily = PeriodSummary.objects.filter(
+                user=user,
+                period_type=PeriodSummary.DAILY,
+                period_key__gte=start_date.strftime('%Y-%m-%d'),
+                period_key__lte=end_date.strftime('%Y-%m-%d')
+            )
+            split_ms = self._measure(lambda: get_period_totals(user, start_date, end_date), options['repeat'])
+            daily_ms = self._measure(
+                lambda: daily.aggregate(income=Sum('income_amount'), expense=Sum('expense_amount')),
+                options['repeat']
+            )
+            self.stdout.write(
+                f"  {years:>3} лет, {created} транзакций: разбиение {rows} строк, {split_ms:.2f} мс; "
+                f"дневные строки {daily.count()}, {daily_ms:.2f} мс"
+            )
+
+    def scenario_dashboard(self, options):
+        """
+        Дашборд в полном формате для всех периодов: время ответа и число
+        запросов к базе (один запрос на вызов проверяет wallet.tests.DashboardQueryTests)
+        """
+        end_date = date.today()
+        years = max(options['years'])
+        user, created = self._create_history(end_date - timedelta(days=365 * years), end_date, options['per_day'])
+        self.stdout.write(f"  История {years} лет, {created} транзакций")
+
+        call = self._dashboard_client(user)
+        for period in DASHBOARD_PERIODS:
+            with CaptureQueriesContext(connection) as queries, override_settings(WALLET_RESPONSE_CACHE=False):
+                response = call(period)
+            if response.status_code != 200:
+                raise CommandError(f"Дашборд за период {period} вернул статус {response.status_code}")
+            with override_settings(WALLET_RESPONSE_CACHE=False):
+                elapsed_ms = self._measure(lambda: call(period), options['repeat'])
+            self.stdout.write(f"  {period:>8}: запросов {len(queries)}, {elapsed_ms:.2f} мс")
+
+    def scenario_response_cache(self, options):
+        """
+        Кэш ответов дашборда: время ответа после записи (промах, версия данных
+        увеличена) и при повторном запросе (попадание). Команда завершается
+        ошибкой, если после записи отдается старый ответ или повторный запрос
+        не попадает в кэш. Нужен общий кэш (REDIS_URL)
+        """
+        if not shared_cache_available():
+            self.stdout.write("  Пропущен: кэш ответов работает только с общим кэшем (задайте REDIS_URL)")
+            return
+
+        end_date = date.today()
+        years = max(options['years'])
+        user, created = self._create_history(end_date - timedelta(days=365 * years), end_date, options['per_day'])
+        self.stdout.write(f"  История {years} лет, {created} транзакций")
+
+        call = self._dashboard_client(user)
+        with override_settings(WALLET_RESPONSE_CACHE=True):
+            for period in DASHBOARD_PERIODS:
+                # Данные создаются в откатываемой транзакции, поэтому запись
+                # имитируется прямым увеличением версии (без on_commit)
+                _increment_versions([user.pk])
+                outcomes = [call(period)['X-Cache'], call(period)['X-Cache']]
+                if outcomes != ['MISS', 'HIT']:
+                    raise CommandError(
+                        f"Кэш дашборда за период {period}: ожидались MISS, HIT, получено {', '.join(outcomes)}"
+                    )
+
+                def miss():
+                    _increment_versions([user.pk])
+                    return call(period)
+
+                miss_ms = self._measure(miss, options['repeat'])
+                hit_ms = self._measure(lambda: call(period), options['repeat'])
+                self.stdout.write(f"  {period:>8}: промах {miss_ms:.2f} мс, попадание {hit_ms:.2f} мс")
+
+    def scenario_indexes(self, options):
+        """
+        Планы горячих запросов при --rows транзакций в таблице: у пользователя
+        история за --years лет, остальные строки принадлежат другому пользователю.
+        Команда завершается ошибкой, если план читает транзакции или итоги
+        последовательным сканированием, поэтому сценарий можно запускать в CI.
+        Какой индекс выбирает каждый запрос, проверяет
+        wallet.tests.TransactionIndexTests
+        """
+        end_date = date.today()
+        start_date = end_date - timedelta(days=365 * max(options['years']))
+        days = (end_date - start_date).days + 1
+        user, created = self._create_history(start_date, end_date, options['per_day'], rebuild=False)
+        filler_per_day = -(-max(options['rows'] - created, 0) // days)
+        if filler_per_day:
+            _, filler = self._create_history(start_date, end_date, filler_per_day, rebuild=False)
+            created += filler
+        rebuild_users([user.pk])
+        self._analyze()
+        self.stdout.write(f"  Транзакций в таблице: {created}")
+
+        account = Account.objects.filter(user=user).order_by('pk').first()
+        categories = list(Category.objects.filter(user=user, type=Category.EXPENSE).values_list('pk', flat=True)[:2])
+        month = {'date_from': end_date.replace(day=1), 'date_to': end_date}
+        transactions = Transaction.objects.filter(user=user)
+        querysets = {
+            'первая страница': filter_transactions(transactions, {})[:51],
+            'период': filter_transactions(transactions, month),
+            'тип и период': filter_transactions(transactions, {'type': Transaction.INCOME, **month}),
+            'счет': filter_transactions(transactions, {'account': account.pk})[:51],
+            'категории': filter_transactions(transactions, {'category': categories})[:51],
+            'сумма и период': filter_transactions(transactions, {'amount_min': 100, 'amount_max': 200, **month}),
+            'по сумме': filter_transactions(transactions, {'ordering': '-amount', 'amount_min': 400})[:51],
+        }
+        plans = {name: queryset.explain(format='json') for name, queryset in querysets.items()}
+        timings = {
+            name: self._measure(lambda queryset=queryset: list(queryset.all()), options['repeat'])
+            for name, queryset in querysets.items()
+        }
+
+        conditions_sql, params = get_period_conditions(start_date, end_date)
+        summary_sql = (
+            f"SELECT SUM(income_amount), SUM(expense_amount) FROM {PeriodSummary._meta.db_table} "
+            f"WHERE user_id = %s AND {conditions_sql}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {summary_sql}', [user.pk, *params])
+            plans['итоги за период'] = cursor.fetchone()[0]
+        timings['итоги за период'] = self._measure(lambda: get_period_totals(user, start_date, end_date), options['repeat'])
+
+        failed = []
+        for name, plan in plans.items():
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = self._scans(plan[0]['Plan'])
+            seq_scans = [table for node_type, table in scans if node_type == 'Seq Scan' and table in INDEXED_TABLES]
+            nodes = ', '.join(sorted(
+                {f'{node_type} {table}' for node_type, table in scans if table in INDEXED_TABLES}
+            ))
+            self.stdout.write(f"  {name:>16}: {timings[name]:.2f} мс, {nodes}")
+            if seq_scans:
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f"Последовательное сканирование в запросах: {', '.join(failed)}")
+
+    def scenario_transaction_list(self, options):
+        """
+        Список транзакций: время ответа и число запросов к базе при разных
+        размерах страницы (один запрос на страницу проверяет
+        wallet.tests.TransactionPaginationTests)
+        """
+        end_date = date.today()
+        user, created = self._create_history(end_date - timedelta(days=365), end_date, options['per_day'])
+        # Переводы, чтобы в ответе были и счета назначения
+        source, destination = Account.objects.filter(user=user).order_by('pk')[:2]
+        Transaction.objects.filter(user=user, type=Transaction.INCOME, date__day=1).update(
+            type=Transaction.TRANSFER, category=None, account=source, destination_account=destination
+        )
+        self.stdout.write(f"  История 1 год, {created} транзакций")
+
+        view = TransactionViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        def call(page_size):
+            request = factory.get('/api/transactions/', {'page_size': page_size})
+            force_authenticate(request, user=user)
+            response = view(request)
+            response.render()
+            return response
+
+        with override_settings(WALLET_TRANSACTIONS_MAX_PAGE_SIZE=max(TRANSACTION_LIST_PAGE_SIZES)):
+            for page_size in TRANSACTION_LIST_PAGE_SIZES:
+                with CaptureQueriesContext(connection) as queries:
+                    response = call(page_size)
+                if response.status_code != 200:
+                    raise CommandError(f"Список транзакций вернул статус {response.status_code}")
+                elapsed_ms = self._measure(lambda: call(page_size), options['repeat'])
+                self.stdout.write(f"  {page_size:>5} строк: запросов {len(queries)}, {elapsed_ms:.2f} мс")
+
+    def scenario_list_serializer(self, options):
+        """
+        Быстрое представление списка транзакций против TransactionSerializer
+        на LIST_SERIALIZER_ROWS строках (вместе с запросом к базе). Команда
+        завершается ошибкой, если ответы различаются или ускорение меньше
+        LIST_SERIALIZER_MIN_SPEEDUP
+        """
+        end_date = date.today()
+        days = -(-LIST_SERIALIZER_ROWS // options['per_day'])
+        user, created = self._create_history(end_date - timedelta(days=days - 1), end_date, options['per_day'])
+        source, destination = Account.objects.filter(user=user).order_by('pk')[:2]
+        Transaction.objects.filter(user=user, type=Transaction.INCOME, date__day=1).update(
+            type=Transaction.TRANSFER, category=None, account=source, destination_account=destination
+        )
+        Transaction.objects.filter(user=user, date__day=2).update(comment='Комментарий')
+
+        queryset = Transaction.objects.filter(user=user).order_by('-date', '-created_at', '-id')[:LIST_SERIALIZER_ROWS]
+        related = queryset.select_related('category', 'account', 'destination_account')
+
+        def serializer():
+            return TransactionSerializer(related.all(), many=True).data
+
+        def fast():
+            return TransactionListSerializer(TransactionListSerializer.prepare(queryset.all())).data
+
+        if json.dumps(serializer()) != json.dumps(fast()):
+            raise CommandError("Быстрое представление списка отличается от TransactionSerializer")
+
+        repeat = max(options['repeat'] // 10, 3)
+        serializer_ms = self._measure(serializer, repeat)
+        fast_ms = self._measure(fast, repeat)
+        speedup = serializer_ms / fast_ms
+        self.stdout.write(
+            f"  {min(created, LIST_SERIALIZER_ROWS)} строк: TransactionSerializer {serializer_ms:.1f} мс, "
+            f"values() {fast_ms:.1f} мс, ускорение {speedup:.1f}x"
+        )
+        if speedup < LIST_SERIALIZER_MIN_SPEEDUP:
+            raise CommandError(f"Ускорение {speedup:.1f}x меньше {LIST_SERIALIZER_MIN_SPEEDUP}x")
+
+    def scenario_json(self, options):
+        """
+        ORJSONRenderer/ORJSONParser против JSONRenderer/JSONParser DRF на ответе
+        дашборда и списке из LIST_SERIALIZER_ROWS транзакций. Команда завершается
+        ошибкой, если вывод рендереров отличается хотя бы одним байтом
+        """
+        end_date = date.today()
+        days = -(-LIST_SERIALIZER_ROWS // options['per_day'])
+        user, created = self._create_history(end_date - timedelta(days=days - 1), end_date, options['per_day'])
+        Transaction.objects.filter(user=user, date__day=2).update(comment='Комментарий \u2028 "в кавычках"')
+
+        with override_settings(WALLET_RESPONSE_CACHE=False):
+            dashboard = self._dashboard_client(user)('year').data
+        transactions = TransactionListSerializer(TransactionListSerializer.prepare(
+            Transaction.objects.filter(user=user).order_by('-date', '-created_at', '-id')[:LIST_SERIALIZER_ROWS]
+        )).data
+        payloads = {'дашборд': dashboard, f'{len(transactions)} транзакций': transactions}
+
+        repeat = max(options['repeat'] // 10, 3)
+        for name, data in payloads.items():
+            expected = JSONRenderer().render(data)
+            if ORJSONRenderer().render(data) != expected:
+                raise CommandError(f"ORJSONRenderer отличается от JSONRenderer: {name}")
+            if ORJSONParser().parse(io.BytesIO(expected)) != JSONParser().parse(io.BytesIO(expected)):
+                raise CommandError(f"ORJSONParser отличается от JSONParser: {name}")
+
+            timings = [
+                self._measure(lambda renderer=renderer: renderer.render(data), repeat)
+                for renderer in (JSONRenderer(), ORJSONRenderer())
+            ] + [
+                self._measure(lambda parser=parser: parser.parse(io.BytesIO(expected)), repeat)
+                for parser in (JSONParser(), ORJSONParser())
+            ]
+            self.stdout.write(
+                f"  {name} ({len(expected)} байт): рендер {timings[0]:.2f} -> {timings[1]:.2f} мс, "
+                f"разбор {timings[2]:.2f} -> {timings[3]:.2f} мс"
+            )
+
+    def scenario_search(self, options):
+        """
+        Поиск по комментариям при --rows транзакций в таблице (история
+        пользователя за --years лет, остальное - другой пользователь, у всех
+        строк комментарии из SEARCH_COMMENTS): первая страница API с поиском,
+        отдельно и вместе с фильтрами. Команда завершается ошибкой, если
+        95-й перцентиль больше SEARCH_MAX_P95_MS или поиск читает транзакции
+        последовательным сканированием
+        """
+        end_date = date.today()
+        start_date = end_date - timedelta(days=365 * max(options['years']))
+        days = (end_date - start_date).days + 1
+        user, created = self._create_history(start_date, end_date, options['per_day'], rebuild=False)
+        filler_per_day = -(-max(options['rows'] - created, 0) // days)
+        if filler_per_day:
+            _, filler = self._create_history(start_date, end_date, filler_per_day, rebuild=False)
+            created += filler
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {connection.ops.quote_name(Transaction._meta.db_table)} "
+                f"SET comment = (%s::text[])[1 + id %% %s] WHERE date >= %s",
+                [list(SEARCH_COMMENTS), len(SEARCH_COMMENTS), start_date]
+            )
+        self._analyze()
+        self.stdout.write(f"  Транзакций в таблице: {created}")
+
+        view = TransactionViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        month = {'start_date': (end_date - timedelta(days=90)).isoformat(), 'end_date': end_date.isoformat()}
+
+        def call(params):
+            request = factory.get('/api/transactions/', params)
+            force_authenticate(request, user=user)
+            response = view(request)
+            response.render()
+            return response
+
+        failed = []
+        for name, extra in (('поиск', {}), ('поиск и фильтры', {'type': Transaction.EXPENSE, **month})):
+            timings = []
+            for query in SEARCH_QUERIES:
+                params = {'search': query, **extra}
+                response = call(params)
+                if response.status_code != 200:
+                    raise CommandError(f"Поиск {query!r} вернул статус {response.status_code}")
+                for _ in range(max(options['repeat'], 1)):
+                    started = time.perf_counter()
+                    call(params)
+                    timings.append((time.perf_counter() - started) * 1000)
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            self.stdout.write(f"  {name:>16}: медиана {statistics.median(timings):.2f} мс, p95 {p95:.2f} мс")
+            if p95 > SEARCH_MAX_P95_MS:
+                failed.append(name)
+
+        transactions = filter_transactions(Transaction.objects.filter(user=user), {'search': SEARCH_QUERIES[0]})
+        plan = transactions[:51].explain(format='json')
+        scans = self._scans(json.loads(plan)[0]['Plan'])
+        self.stdout.write(f"  {'план':>16}: {', '.join(sorted({f'{node} {table}' for node, table in scans}))}")
+        if any(node == 'Seq Scan' and table in INDEXED_TABLES for node, table in scans):
+            failed.append('последовательное сканирование')
+
+        if failed:
+            raise CommandError(
+                f"Поиск медленнее {SEARCH_MAX_P95_MS} мс (p95) или без индекса: {', '.join(failed)}"
+            )
+
+    def scenario_series(self, options):
+        """
+        Ряд аналитики (/api/analytics/series/) за каждую длину истории --years
+        с каждым шагом из SERIES_GRANULARITIES. Время не должно расти вместе
+        с числом транзакций, только с числом точек. Команда завершается ошибкой,
+        если ряд строится больше чем SERIES_MAX_QUERIES запросами или в нем
+        есть пропуски
+        """
+        view = AnalyticsViewSet.as_view({'get': 'series'})
+        factory = APIRequestFactory()
+        end_date = date.today()
+
+        failed = []
+        for years in options['years']:
+            start_date = end_date - timedelta(days=365 * years)
+            user, created = self._create_history(start_date, end_date, options['per_day'])
+            self.stdout.write(f"  История {years} лет, {created} транзакций")
+
+            for granularity in SERIES_GRANULARITIES:
+                params = {'granularity': granularity, 'start': start_date, 'end': end_date}
+
+                def call():
+                    request = factory.get('/api/analytics/series/', params)
+                    force_authenticate(request, user=user)
+                    response = view(request)
+                    response.render()
+                    return response
+
+                with CaptureQueriesContext(connection) as queries, override_settings(WALLET_RESPONSE_CACHE=False):
+                    response = call()
+                    elapsed_ms = self._measure(call, options['repeat'])
+                if response.status_code != 200:
+                    raise CommandError(f"Ряд {granularity} вернул статус {response.status_code}")
+                points = response.data['points']
+                first, last = PeriodSummary.get_period_bounds(start_date, SeriesParamsSerializer.GRANULARITIES[granularity])
+                queries_per_call = len(queries) // (options['repeat'] + 2)
+                self.stdout.write(
+                    f"  {granularity:>8}: {len(points)} точек, запросов {queries_per_call}, {elapsed_ms:.2f} мс"
+                )
+                dense = points[0]['period'] == first and all(
+                    previous['key'] != current['key'] and previous['period'] < current['period']
+                    for previous, current in zip(points, points[1:])
+                )
+                if queries_per_call > SERIES_MAX_QUERIES or not dense:
+                    failed.append(f'{years} лет/{granularity}')
+
+        if failed:
+            raise CommandError(f"Ряд аналитики с пропусками или лишними запросами: {', '.join(failed)}")
+
+    def scenario_comparison(self, options):
+        """
+        Сравнение с предыдущим периодом (/api/analytics/comparison/) для каждой
+        длины истории --years. Команда завершается ошибкой, если сравнение
+        выполняет больше COMPARISON_MAX_QUERIES запросов
+        """
+        view = AnalyticsViewSet.as_view({'get': 'comparison'})
+        factory = APIRequestFactory()
+        end_date = date.today()
+
+        failed = []
+        for years in options['years']:
+            user, created = self._create_history(end_date - timedelta(days=365 * years), end_date, options['per_day'])
+            self.stdout.write(f"  История {years} лет, {created} транзакций")
+
+            for period in COMPARISON_PERIODS:
+                def call():
+                    request = factory.get('/api/analytics/comparison/', {'period': period})
+                    force_authenticate(request, user=user)
+                    response = view(request)
+                    response.render()
+                    return response
+
+                with override_settings(WALLET_RESPONSE_CACHE=False):
+                    with CaptureQueriesContext(connection) as queries:
+                        response = call()
+                    elapsed_ms = self._measure(call, options['repeat'])
+                if response.status_code != 200:
+                    raise CommandError(f"Сравнение {period} вернуло статус {response.status_code}")
+                self.stdout.write(f"  {period:>8}: запросов {len(queries)}, {elapsed_ms:.2f} мс")
+                if len(queries) > COMPARISON_MAX_QUERIES:
+                    failed.append(f'{years} лет/{period}')
+
+        if failed:
+            raise CommandError(
+                f"Сравнение выполняет больше {COMPARISON_MAX_QUERIES} запросов: {', '.join(failed)}"
+            )
+
+    def scenario_budgets(self, options):
+        """
+        Статус бюджетов (/api/budgets/status/) для каждой длины истории --years:
+        месячный бюджет на каждую категорию расходов, недельный на все расходы
+        и бюджет на последние BUDGET_CUSTOM_DAYS дней. Время не должно зависеть
+        от длины истории. Команда завершается ошибкой, если статус строится
+        больше чем BUDGET_STATUS_MAX_QUERIES запросами или потраченная сумма
+        не совпадает с суммой транзакций
+        """
+        view = BudgetViewSet.as_view({'get': 'status'})
+        factory = APIRequestFactory()
+        end_date = date.today()
+
+        def call(user):
+            request = factory.get('/api/budgets/status/')
+            force_authenticate(request, user=user)
+            response = view(request)
+            response.render()
+            return response
+
+        failed = []
+        for years in options['years']:
+            user, created = self._create_history(end_date - timedelta(days=365 * years), end_date, options['per_day'])
+            budgets = [
+                Budget(user=user, category=category, amount=1000)
+                for category in Category.objects.filter(user=user, type=Category.EXPENSE)
+            ]
+            budgets.append(Budget(user=user, amount=5000, period_type=Budget.WEEKLY))
+            budgets.append(Budget(
+                user=user, amount=20000, period_type=Budget.CUSTOM,
+                start_date=end_date - timedelta(days=BUDGET_CUSTOM_DAYS - 1), end_date=end_date
+            ))
+            Budget.objects.bulk_create(budgets)
+
+            with override_settings(WALLET_RESPONSE_CACHE=False):
+                with CaptureQueriesContext(connection) as queries:
+                    response = call(user)
+                elapsed_ms = self._measure(lambda: call(user), options['repeat'])
+            if response.status_code != 200:
+                raise CommandError(f"Статус бюджетов вернул статус {response.status_code}")
+
+            mismatched = 0
+            for status in response.data:
+                transactions = Transaction.objects.filter(
+                    user=user, type=Transaction.EXPENSE,
+                    date__gte=status['start_date'], date__lte=status['end_date']
+                )
+                if status['category']:
+                    transactions = transactions.filter(category_id=status['category'])
+                spent = transactions.aggregate(total=Sum('amount'))['total'] or 0
+                if abs(float(spent) - status['spent']) > 0.005:
+                    mismatched += 1
+
+            self.stdout.write(
+                f"  {years:>3} лет, {created} транзакций: бюджетов {len(response.data)}, "
+                f"запросов {len(queries)}, {elapsed_ms:.2f} мс"
+            )
+            if len(queries) > BUDGET_STATUS_MAX_QUERIES or mismatched:
+                failed.append(f'{years} лет')
+
+        if failed:
+            raise CommandError(
+                f"Статус бюджетов неверен или выполняет больше {BUDGET_STATUS_MAX_QUERIES} запросов: {', '.join(failed)}"
+            )
+
+    def _scans(self, node):
+        """Пары (тип узла, таблица) всех узлов чтения в плане EXPLAIN (FORMAT JSON)"""
+        scans = []
+        if node['Node Type'].endswith('Scan'):
+            scans.append((node['Node Type'], node.get('Relation Name')))
+        for child in node.get('Plans', []):
+            scans.extend(self._scans(child))
+        return scans
+
+    def _dashboard_client(self, user):
+        """Функция, которая выполняет запрос дашборда за период от имени пользователя"""
+        view = TransactionViewSet.as_view({'get': 'dashboard'})
+        factory = APIRequestFactory()
+
+        def call(period):
+            request = factory.get('/api/dashboard/', {'period': period})
+            force_authenticate(request, user=user)
+            response = view(request)
+            response.render()
+            return response
+        return call
+
+    def _create_history(self, start_date, end_date, per_day, rebuild=True):
+        """
+        Создает пользователя с транзакциями за каждый день диапазона
+        и пересчитывает итоги (rebuild=False - только транзакции)
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            user = User.objects.create_user(f'benchmark-{uuid.uuid4().hex[:12]}')
+        account = Account.objects.filter(user=user).order_by('pk').first()
+        income_ids = list(Category.objects.filter(user=user, type=Category.INCOME).values_list('pk', flat=True))
+        expense_ids = list(Category.objects.filter(user=user, type=Category.EXPENSE).values_list('pk', flat=True))
+
+        days = (end_date - start_date).days + 1
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {connection.ops.quote_name(Transaction._meta.db_table)}
+                    (amount, type, category_id, account_id, date, user_id, created_at, updated_at)
+                SELECT (1 + random() * 500)::numeric(12, 2),
+                       CASE WHEN g %% 4 = 0 THEN %s ELSE %s END,
+                       CASE WHEN g %% 4 = 0 THEN (%s::bigint[])[1 + g %% %s]
+                            ELSE (%s::bigint[])[1 + g %% %s] END,
+                       %s, %s::date + (g / %s), %s, NOW(), NOW()
+                FROM generate_series(0, %s - 1) AS g
+            """, [
+                Transaction.INCOME, Transaction.EXPENSE,
+                income_ids, len(income_ids), expense_ids, len(expense_ids),
+                account.pk, start_date, per_day, user.pk,
+                days * per_day,
+            ])
+            created = cursor.rowcount
+        if rebuild:
+            rebuild_users([user.pk])
+            self._analyze()
+        return user, created
+
+    def _analyze(self):
+        """Статистика для планировщика, иначе он не знает о только что созданных строках"""
+        tables = ', '.join(
+            connection.ops.quote_name(model._meta.db_table)
+            for model in (Transaction, PeriodSummary, CategoryPeriodSummary, AccountBalanceSnapshot)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {tables}')
+
+    def _measure(self, func, repeat):
+        """Медиана времени выполнения в миллисекундах (первый вызов - прогрев)"""
+        func()
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
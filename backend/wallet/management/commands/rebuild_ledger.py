@@ -0,0 +1,121 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from wallet.rebuild import rebuild_users
+
+COUNTERS = (
+    'users', 'transactions', 'summaries_missing', 'summaries_stale',
+    'summaries_changed', 'balances_changed', 'snapshots_changed',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает балансы счетов (текущие и на конец дня) и итоги "
+        "по периодам и категориям из таблицы транзакций"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            help="Список id или логинов пользователей через запятую (по умолчанию все)"
+        )
+        parser.add_argument(
+            '--since',
+            help="Пересчитать итоги только за периоды, начиная с даты YYYY-MM-DD"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Только показать расхождения, ничего не меняя"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Количество параллельных процессов"
+        )
+        parser.add_argument(
+            '--shard-size', type=int, default=100,
+            help="Количество пользователей, пересчитываемых в одной транзакции"
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Неверный формат --since. Используйте YYYY-MM-DD.")
+
+        user_ids = self._select_users(options['users'])
+        shard_size = max(options['shard_size'], 1)
+        shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+        dry_run = options['dry_run']
+
+        self.stdout.write(
+            f"{'Проверка' if dry_run else 'Пересчет'}: пользователей {len(user_ids)}, "
+            f"частей {len(shards)}, процессов {options['workers']}"
+        )
+
+        started = time.monotonic()
+        totals = dict.fromkeys(COUNTERS, 0)
+        for stats in self._run(shards, since, dry_run, options['workers']):
+            for counter in COUNTERS:
+                totals[counter] += stats[counter]
+            for diff in stats['balance_diffs']:
+                self.stdout.write(
+                    f"  Счет {diff['account']}: баланс {diff['stored']}, по транзакциям {diff['expected']}"
+                )
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            f"Итоги: не хватало {totals['summaries_missing']}, лишних {totals['summaries_stale']}, "
+            f"с неверными суммами {totals['summaries_changed']}"
+        )
+        self.stdout.write(f"Балансы с расхождениями: {totals['balances_changed']}")
+        self.stdout.write(f"Балансы на конец дня с расхождениями: {totals['snapshots_changed']}")
+        self.stdout.write(
+            f"Обработано транзакций: {totals['transactions']} за {elapsed:.2f} с "
+            f"({totals['transactions'] / elapsed if elapsed else 0:.0f} транзакций/с, "
+            f"{totals['users'] / elapsed if elapsed else 0:.1f} пользователей/с)"
+        )
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Режим --dry-run: изменения не сохранены"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Пересчет завершен"))
+
+    def _select_users(self, users_option):
+        queryset = User.objects.order_by('pk')
+        if users_option:
+            values = [value.strip() for value in users_option.split(',') if value.strip()]
+            ids = [int(value) for value in values if value.isdigit()]
+            usernames = [value for value in values if not value.isdigit()]
+            queryset = queryset.filter(pk__in=ids) | queryset.filter(username__in=usernames)
+            user_ids = list(queryset.values_list('pk', flat=True))
+            if len(user_ids) != len(values):
+                raise CommandError("Некоторые пользователи из --users не найдены")
+            return user_ids
+        return list(queryset.values_list('pk', flat=True))
+
+    def _run(self, shards, since, dry_run, workers):
+        if workers <= 1:
+            for shard in shards:
+                yield rebuild_users(shard, since=since, dry_run=dry_run)
+            return
+
+        # Дочерние процессы открывают собственные соединения с базой
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_rebuild_shard, shard, since, dry_run) for shard in shards]
+            for future in futures:
+                yield future.result()
+
+
+def _rebuild_shard(user_ids, since, dry_run):
+    try:
+        return rebuild_users(user_ids, since=since, dry_run=dry_run)
+    finally:
+        connections.close_all()
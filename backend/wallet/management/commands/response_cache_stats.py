@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from wallet.cache import CACHED_ENDPOINTS, HIT, MISS, get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает попадания и промахи кэша ответов дашборда, статистики, итогов по периодам, аналитики и бюджетов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help="Обнулить счетчики после вывода"
+        )
+
+    def handle(self, *args, **options):
+        for endpoint, counters in get_cache_stats(CACHED_ENDPOINTS).items():
+            total = counters[HIT] + counters[MISS]
+            ratio = counters[HIT] / total * 100 if total else 0
+            self.stdout.write(
+                f"{endpoint:>20}: попаданий {counters[HIT]}, промахов {counters[MISS]}, "
+                f"доля попаданий {ratio:.1f}%"
+            )
+
+        if options['reset']:
+            reset_cache_stats(CACHED_ENDPOINTS)
+            self.stdout.write(self.style.SUCCESS("Счетчики обнулены"))
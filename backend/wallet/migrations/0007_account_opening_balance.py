@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+# Текущие балансы считаем верными: начальный баланс = баланс - эффект всех транзакций счета
+BACKFILL_OPENING_BALANCE = """
+    UPDATE wallet_account AS account
+    SET opening_balance = account.balance - effects.delta
+    FROM (
+        SELECT id, SUM(delta) AS delta FROM (
+            SELECT account_id AS id,
+                   SUM(CASE
+                       WHEN type = 'income' THEN amount
+                       WHEN type = 'expense' THEN -amount
+                       WHEN type = 'transfer' AND destination_account_id IS NOT NULL THEN -amount
+                       ELSE 0
+                   END) AS delta
+            FROM wallet_transaction
+            GROUP BY account_id
+            UNION ALL
+            SELECT destination_account_id, SUM(amount)
+            FROM wallet_transaction
+            WHERE type = 'transfer' AND destination_account_id IS NOT NULL
+            GROUP BY destination_account_id
+        ) AS per_account
+        GROUP BY id
+    ) AS effects
+    WHERE account.id = effects.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0006_pendingsummarydelta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='opening_balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunSQL('UPDATE wallet_account SET opening_balance = balance', migrations.RunSQL.noop),
+        migrations.RunSQL(BACKFILL_OPENING_BALANCE, migrations.RunSQL.noop),
+    ]
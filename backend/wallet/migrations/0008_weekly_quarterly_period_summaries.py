@@ -0,0 +1,50 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+# Итоги по неделям ISO и кварталам из существующих транзакций (форматы ключей как в PeriodSummary.get_period_key)
+BACKFILL_SUMMARIES = """
+    INSERT INTO wallet_periodsummary
+        (user_id, period_type, period_key, income_amount, expense_amount, created_at, updated_at)
+    SELECT user_id, period_type, period_key,
+           COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0),
+           COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0),
+           NOW(), NOW()
+    FROM (
+        SELECT user_id, type, amount, 'weekly' AS period_type, to_char(date, 'IYYY-"W"IW') AS period_key
+        FROM wallet_transaction WHERE type IN ('income', 'expense')
+        UNION ALL
+        SELECT user_id, type, amount, 'quarterly', to_char(date, 'YYYY-"Q"Q')
+        FROM wallet_transaction WHERE type IN ('income', 'expense')
+    ) AS source
+    GROUP BY user_id, period_type, period_key
+    ON CONFLICT (user_id, period_type, period_key) DO UPDATE SET
+        income_amount = EXCLUDED.income_amount,
+        expense_amount = EXCLUDED.expense_amount,
+        updated_at = EXCLUDED.updated_at
+"""
+
+REMOVE_SUMMARIES = """
+    DELETE FROM wallet_periodsummary WHERE period_type IN ('weekly', 'quarterly')
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0007_account_opening_balance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pendingsummarydelta',
+            name='period_type',
+            field=models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='periodsummary',
+            name='period_type',
+            field=models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], max_length=10),
+        ),
+        migrations.RunSQL(BACKFILL_SUMMARIES, REMOVE_SUMMARIES),
+    ]
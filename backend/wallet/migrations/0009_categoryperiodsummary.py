@@ -0,0 +1,60 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Итоги по категориям из существующих транзакций за все типы периодов
+BACKFILL_CATEGORY_SUMMARIES = """
+    INSERT INTO wallet_categoryperiodsummary
+        (user_id, category_id, period_type, period_key, income_amount, expense_amount, created_at, updated_at)
+    SELECT user_id, category_id, periods.period_type, periods.period_key,
+           COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0),
+           COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0),
+           NOW(), NOW()
+    FROM wallet_transaction
+    CROSS JOIN LATERAL (VALUES
+        ('daily', to_char(date, 'YYYY-MM-DD')),
+        ('weekly', to_char(date, 'IYYY-"W"IW')),
+        ('monthly', to_char(date, 'YYYY-MM')),
+        ('quarterly', to_char(date, 'YYYY-"Q"Q')),
+        ('yearly', to_char(date, 'YYYY'))
+    ) AS periods(period_type, period_key)
+    WHERE type IN ('income', 'expense') AND category_id IS NOT NULL
+    GROUP BY user_id, category_id, periods.period_type, periods.period_key
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0008_weekly_quarterly_period_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingsummarydelta',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pending_summary_deltas', to='wallet.category'),
+        ),
+        migrations.CreateModel(
+            name='CategoryPeriodSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_type', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], max_length=10)),
+                ('period_key', models.CharField(max_length=10)),
+                ('income_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('expense_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_summaries', to='wallet.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_period_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Category Period Summaries',
+                'unique_together': {('user', 'category', 'period_type', 'period_key')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_CATEGORY_SUMMARIES, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Балансы на конец каждого дня с движением: начальный баланс + нарастающий итог изменений
+BACKFILL_SNAPSHOTS = """
+    INSERT INTO wallet_accountbalancesnapshot (account_id, date, balance)
+    SELECT daily.id, daily.date,
+           account.opening_balance + SUM(SUM(daily.delta)) OVER (PARTITION BY daily.id ORDER BY daily.date)
+    FROM (
+        SELECT account_id AS id, date,
+               SUM(CASE
+                   WHEN type = 'income' THEN amount
+                   WHEN type = 'expense' THEN -amount
+                   WHEN type = 'transfer' AND destination_account_id IS NOT NULL THEN -amount
+                   ELSE 0
+               END) AS delta
+        FROM wallet_transaction
+        GROUP BY account_id, date
+        UNION ALL
+        SELECT destination_account_id, date, SUM(amount)
+        FROM wallet_transaction
+        WHERE type = 'transfer' AND destination_account_id IS NOT NULL
+        GROUP BY destination_account_id, date
+    ) AS daily
+    JOIN wallet_account AS account ON account.id = daily.id
+    GROUP BY daily.id, daily.date, account.opening_balance
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0009_categoryperiodsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='wallet.account')),
+            ],
+            options={
+                'verbose_name_plural': 'Account Balance Snapshots',
+                'unique_together': {('account', 'date')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SNAPSHOTS, migrations.RunSQL.noop),
+    ]
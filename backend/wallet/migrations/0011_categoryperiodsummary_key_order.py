@@ -0,0 +1,19 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:59
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0010_accountbalancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='categoryperiodsummary',
+            unique_together={('user', 'period_type', 'period_key', 'category')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 04:07
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, без блокировки записи в таблицу транзакций
+    atomic = False
+
+    dependencies = [
+        ('wallet', '0012_transaction_cursor_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'type', '-date'], name='transaction_user_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'account', '-date'], name='transaction_user_account_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('destination_account__isnull', False)), fields=['user', 'destination_account', '-date'], name='transaction_user_dest_idx'),
+        ),
+    ]
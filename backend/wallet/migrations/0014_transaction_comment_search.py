@@ -0,0 +1,107 @@
+# Generated by Django 4.2.20 on 2026-10-18 04:14
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+# Триггер срабатывает только на вставку и на UPDATE, в котором есть колонка comment:
+# массовые изменения ledger (перенос на счет, смена категории) его не вызывают.
+# save() пишет все колонки, поэтому без изменения комментария вектор не пересчитывается
+SEARCH_VECTOR_SQL = """
+CREATE FUNCTION wallet_transaction_search_vector() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.comment IS NOT DISTINCT FROM OLD.comment AND NEW.search_vector IS NOT NULL THEN
+        RETURN NEW;
+    END IF;
+    NEW.search_vector := to_tsvector('russian', COALESCE(NEW.comment, ''))
+                      || to_tsvector('english', COALESCE(NEW.comment, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER wallet_transaction_search_vector
+    BEFORE INSERT OR UPDATE OF comment ON wallet_transaction
+    FOR EACH ROW EXECUTE FUNCTION wallet_transaction_search_vector();
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP TRIGGER IF EXISTS wallet_transaction_search_vector ON wallet_transaction;
+DROP FUNCTION IF EXISTS wallet_transaction_search_vector();
+"""
+
+# Строк транзакций в одной пачке заполнения вектора
+BACKFILL_BATCH_SIZE = 10000
+
+TRIGRAM_INDEX = django.contrib.postgres.indexes.GinIndex(
+    django.contrib.postgres.indexes.OpClass('comment', name='gin_trgm_ops'), name='transaction_comment_trgm_idx'
+)
+
+
+def backfill_search_vector(apps, schema_editor):
+    """
+    Заполняет вектор у существующих транзакций с комментарием пачками по
+    диапазонам id. Миграция не атомарная, поэтому каждая пачка фиксируется
+    сразу и держит блокировки только своих строк
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(id), MAX(id) FROM wallet_transaction')
+        first_id, last_id = cursor.fetchone()
+        if first_id is None:
+            return
+        for start in range(first_id, last_id + 1, BACKFILL_BATCH_SIZE):
+            # Вектор считает триггер: comment входит в SET
+            cursor.execute(
+                "UPDATE wallet_transaction SET comment = comment "
+                "WHERE id >= %s AND id < %s AND comment <> '' AND search_vector IS NULL",
+                [start, start + BACKFILL_BATCH_SIZE]
+            )
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    pg_trgm входит в contrib и есть в официальных образах PostgreSQL. Если на сервере
+    его нет, индекс не создается, а поиск обходится без нечеткого сравнения
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.add_index(apps.get_model('wallet', 'Transaction'), TRIGRAM_INDEX, concurrently=True)
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {TRIGRAM_INDEX.name}')
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, без блокировки записи в таблицу транзакций
+    atomic = False
+
+    dependencies = [
+        ('wallet', '0013_transaction_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Вектор считается в базе: его получают и строки, измененные через update() и сырой SQL
+        migrations.RunSQL(SEARCH_VECTOR_SQL, DROP_SEARCH_VECTOR_SQL),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='transaction_comment_search_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_trigram_index, drop_trigram_index),
+            ],
+            state_operations=[
+                migrations.AddIndex(model_name='transaction', index=TRIGRAM_INDEX),
+            ],
+        ),
+    ]
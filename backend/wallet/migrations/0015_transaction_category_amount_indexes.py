@@ -0,0 +1,24 @@
+# Generated by Django 4.2.20 on 2026-10-18 04:28
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, без блокировки записи в таблицу транзакций
+    atomic = False
+
+    dependencies = [
+        ('wallet', '0014_transaction_comment_search'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'category', '-date'], name='transaction_user_category_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-amount', '-id'], name='transaction_user_amount_idx'),
+        ),
+    ]
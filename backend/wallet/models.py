@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 import datetime
+from calendar import monthrange
 
 class Category(models.Model):
     INCOME = 'income'
@@ -35,6 +38,8 @@ class Account(models.Model):
         default=0,
         validators=[MinValueValidator(Decimal('0.00'))]
     )
+    # Баланс до первой транзакции: текущий баланс = opening_balance + эффект всех транзакций
+    opening_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     icon = models.CharField(max_length=50, blank=True, null=True)
     color = models.CharField(max_length=7, blank=True, null=True)  # Hex color code
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='accounts')
@@ -44,6 +49,12 @@ class Account(models.Model):
     def __str__(self):
         return f"{self.name} - {self.balance}"
 
+    def save(self, *args, **kwargs):
+        # Начальный баланс нового счета - баланс, с которым он создан
+        if self._state.adding and not self.opening_balance:
+            self.opening_balance = self.balance
+        super().save(*args, **kwargs)
+
 class Transaction(models.Model):
     INCOME = 'income'
     EXPENSE = 'expense'
@@ -72,10 +83,32 @@ class Transaction(models.Model):
     )
     date = models.DateField()
     comment = models.TextField(blank=True, null=True)
+    # Поисковый вектор комментария (русская и английская морфология).
+    # Заполняет триггер БД при вставке строки и при изменении комментария (миграция 0014)
+    search_vector = SearchVectorField(null=True, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Постраничный вывод по курсору (wallet.pagination): порядок списка транзакций
+            models.Index(fields=['user', '-date', '-created_at', '-id'], name='transaction_user_cursor_idx'),
+            # Фильтры списка и отчетов: по типу, по счету, по категории и по счету назначения переводов
+            models.Index(fields=['user', 'type', '-date'], name='transaction_user_type_idx'),
+            models.Index(fields=['user', 'account', '-date'], name='transaction_user_account_idx'),
+            models.Index(fields=['user', 'category', '-date'], name='transaction_user_category_idx'),
+            # Сортировка и диапазон по сумме (wallet.filters)
+            models.Index(fields=['user', '-amount', '-id'], name='transaction_user_amount_idx'),
+            models.Index(
+                fields=['user', 'destination_account', '-date'], name='transaction_user_dest_idx',
+                condition=models.Q(destination_account__isnull=False)
+            ),
+            # Поиск по комментарию: полнотекстовый и нечеткий по триграммам (pg_trgm)
+            GinIndex(fields=['search_vector'], name='transaction_comment_search_idx'),
+            GinIndex(OpClass('comment', name='gin_trgm_ops'), name='transaction_comment_trgm_idx'),
+        ]
+
     def __str__(self):
         if self.type == self.TRANSFER:
             dest_account_name = self.destination_account.name if self.destination_account else 'Неизвестно'
@@ -85,95 +118,108 @@ class Transaction(models.Model):
             return f"{self.type} - {self.amount} ({category_name})"
 
     def save(self, *args, **kwargs):
-        is_new = not self.pk
-        
-        if is_new:  # Новая транзакция
-            self._handle_new_transaction()
-        else:  # Обновление существующей транзакции
-            self._handle_update_transaction()
-        
-        super().save(*args, **kwargs)
+        from .cache import bump_data_version
+        from .ledger import apply_balance_deltas, apply_period_deltas, merge_deltas, negate
 
-        # Обновляем периодические итоги (только для доходов и расходов)
-        if self.type != self.TRANSFER:
-            update_period_summary(self.user, self.date, self.type, self.amount, is_new=is_new)
-
-    def _handle_new_transaction(self):
-        """Обрабатывает логику баланса для новой транзакции"""
-        if self.type == self.INCOME:
-            self.account.balance += self.amount
-            self.account.save()
-        elif self.type == self.EXPENSE:
-            self.account.balance -= self.amount
-            self.account.save()
-        elif self.type == self.TRANSFER and self.destination_account:
-            # Для переводов уменьшаем баланс исходного счета
-            self.account.balance -= self.amount
-            self.account.save()
-            
-            # И увеличиваем баланс счета назначения
-            self.destination_account.balance += self.amount
-            self.destination_account.save()
-
-    def _handle_update_transaction(self):
-        """Обрабатывает логику изменения существующей транзакции"""
-        old_transaction = Transaction.objects.get(pk=self.pk)
-        
-        # Отменяем эффект старой транзакции
-        if old_transaction.type == self.INCOME:
-            old_transaction.account.balance -= old_transaction.amount
-            old_transaction.account.save()
-        elif old_transaction.type == self.EXPENSE:
-            old_transaction.account.balance += old_transaction.amount
-            old_transaction.account.save()
-        elif old_transaction.type == self.TRANSFER and old_transaction.destination_account:
-            # Возвращаем деньги на исходный счет
-            old_transaction.account.balance += old_transaction.amount
-            old_transaction.account.save()
-            
-            # И снимаем со счета назначения
-            old_transaction.destination_account.balance -= old_transaction.amount
-            old_transaction.destination_account.save()
-        
-        # Применяем новую транзакцию
-        self._handle_new_transaction()
+        with transaction.atomic():
+            old_transaction = self._lock_stored_version() if self.pk else None
+
+            # Отменяем эффект старой версии транзакции и применяем новый одним запросом
+            balance_deltas = [self._balance_effect()]
+            period_deltas = [self._period_effect()]
+            if old_transaction is not None:
+                balance_deltas.append(negate(old_transaction._balance_effect()))
+                period_deltas.append(negate(old_transaction._period_effect()))
+
+            self._sync_cached_balances(apply_balance_deltas(merge_deltas(*balance_deltas)))
+
+            super().save(*args, **kwargs)
+
+            # Обновляем итоги по разнице между старой и новой версией: изменение суммы,
+            # перенос между периодами при смене даты и смена типа транзакции
+            apply_period_deltas(self.user_id, merge_deltas(*period_deltas))
+            bump_data_version(self.user_id)
 
     def delete(self, *args, **kwargs):
-        if self.type == self.INCOME:
-            self.account.balance -= self.amount
-            self.account.save()
-        elif self.type == self.EXPENSE:
-            self.account.balance += self.amount
-            self.account.save()
-        elif self.type == self.TRANSFER and self.destination_account:
-            # Возврат средств при удалении перевода
-            self.account.balance += self.amount
-            self.account.save()
-            
-            self.destination_account.balance -= self.amount
-            self.destination_account.save()
-        
-        # Обновляем периодические итоги при удалении (только для доходов и расходов)
-        if self.type != self.TRANSFER:
-            update_period_summary(self.user, self.date, self.type, self.amount, is_delete=True)
-        
-        super().delete(*args, **kwargs)
+        from .cache import bump_data_version
+        from .ledger import apply_balance_deltas, apply_period_deltas, negate
+
+        with transaction.atomic():
+            # Берем сохраненную версию из базы, а не возможно устаревший объект в памяти
+            stored = self._lock_stored_version()
+            if stored is not None:
+                self._sync_cached_balances(apply_balance_deltas(negate(stored._balance_effect())))
+                apply_period_deltas(self.user_id, negate(stored._period_effect()))
+            bump_data_version(self.user_id)
+
+            return super().delete(*args, **kwargs)
+
+    def _balance_effect(self):
+        """Изменения балансов счетов (по дням), которые вносит транзакция"""
+        from .ledger import balance_effect
+
+        return balance_effect(self.type, self.amount, self.date, self.account_id, self.destination_account_id)
+
+    def _period_effect(self):
+        """Изменения итогов по периодам, которые вносит транзакция"""
+        from .ledger import period_effect
+
+        return period_effect(self.type, self.amount, self.date, self.category_id)
+
+    def _lock_stored_version(self):
+        """
+        Блокирует строку транзакции (SELECT ... FOR UPDATE) и возвращает ее
+        сохраненную версию с полями, влияющими на балансы и итоги
+        """
+        return Transaction.objects.select_for_update().only(
+            'type', 'amount', 'date', 'category_id', 'account_id', 'destination_account_id'
+        ).filter(pk=self.pk).first()
+
+    def _sync_cached_balances(self, balances):
+        """Обновляет балансы уже загруженных связанных счетов значениями из базы"""
+        for field in ('account', 'destination_account'):
+            if getattr(Transaction, field).is_cached(self):
+                related = getattr(self, field)
+                if related is not None and related.pk in balances:
+                    related.balance = balances[related.pk]
+
+class AccountBalanceSnapshot(models.Model):
+    """
+    Баланс счета на конец дня. Строки есть только для дней, в которые
+    баланс менялся: баланс на любую дату - последняя строка не позже этой
+    даты, а если ее нет - начальный баланс счета.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_snapshots')
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        unique_together = ['account', 'date']
+        verbose_name_plural = "Account Balance Snapshots"
+
+    def __str__(self):
+        return f"{self.account_id} on {self.date}: {self.balance}"
 
 class PeriodSummary(models.Model):
     """Модель для хранения суммарных данных по периодам"""
     DAILY = 'daily'
+    WEEKLY = 'weekly'
     MONTHLY = 'monthly'
+    QUARTERLY = 'quarterly'
     YEARLY = 'yearly'
     PERIOD_CHOICES = [
         (DAILY, 'Daily'),
+        (WEEKLY, 'Weekly'),
         (MONTHLY, 'Monthly'),
+        (QUARTERLY, 'Quarterly'),
         (YEARLY, 'Yearly'),
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='period_summaries')
     period_type = models.CharField(max_length=10, choices=PERIOD_CHOICES)
     
-    # Для daily: 2023-05-15, для monthly: 2023-05, для yearly: 2023
+    # Для daily: 2023-05-15, для weekly (неделя ISO): 2023-W20, для monthly: 2023-05,
+    # для quarterly: 2023-Q2, для yearly: 2023
     period_key = models.CharField(max_length=10)
     
     # Суммы доходов и расходов за период
@@ -187,59 +233,194 @@ class PeriodSummary(models.Model):
     class Meta:
         unique_together = ['user', 'period_type', 'period_key']
         verbose_name_plural = "Period Summaries"
-    
+
+    # Форматы ключей периодов для to_char() в PostgreSQL, совпадают с get_period_key
+    SQL_KEY_FORMATS = {
+        DAILY: 'YYYY-MM-DD',
+        WEEKLY: 'IYYY-"W"IW',
+        MONTHLY: 'YYYY-MM',
+        QUARTERLY: 'YYYY-"Q"Q',
+        YEARLY: 'YYYY',
+    }
+
     @staticmethod
     def get_period_key(date, period_type):
         """Получить ключ периода для указанной даты и типа периода"""
         if period_type == PeriodSummary.DAILY:
             return date.strftime('%Y-%m-%d')
+        elif period_type == PeriodSummary.WEEKLY:
+            iso_year, iso_week, _ = date.isocalendar()
+            return f"{iso_year}-W{iso_week:02d}"
         elif period_type == PeriodSummary.MONTHLY:
             return date.strftime('%Y-%m')
+        elif period_type == PeriodSummary.QUARTERLY:
+            return f"{date.year}-Q{(date.month - 1) // 3 + 1}"
         elif period_type == PeriodSummary.YEARLY:
             return date.strftime('%Y')
         return None
+
+    @staticmethod
+    def get_period_bounds(date, period_type):
+        """Получить первый и последний день периода, в который входит дата"""
+        if period_type == PeriodSummary.DAILY:
+            return date, date
+        elif period_type == PeriodSummary.WEEKLY:
+            start_date = date - datetime.timedelta(days=date.weekday())
+            return start_date, start_date + datetime.timedelta(days=6)
+        elif period_type == PeriodSummary.MONTHLY:
+            return date.replace(day=1), date.replace(day=monthrange(date.year, date.month)[1])
+        elif period_type == PeriodSummary.QUARTERLY:
+            start_month = (date.month - 1) // 3 * 3 + 1
+            end_month = start_month + 2
+            return (
+                datetime.date(date.year, start_month, 1),
+                datetime.date(date.year, end_month, monthrange(date.year, end_month)[1]),
+            )
+        elif period_type == PeriodSummary.YEARLY:
+            return datetime.date(date.year, 1, 1), datetime.date(date.year, 12, 31)
+        return None
+
+    @staticmethod
+    def split_range(start_date, end_date):
+        """
+        Разбить диапазон дат на целые годы, кварталы, месяцы, недели ISO и оставшиеся дни
+
+        Каждый край диапазона дает не больше 3 кварталов, 2 месяцев, 5 недель
+        и 12 дней, поэтому любой диапазон покрывается числом целых лет плюс
+        не более чем ~40 строками итогов.
+
+        Returns:
+            list: [(period_type, первый ключ, последний ключ)]
+        """
+        ranges = []
+
+        def split(start, end, period_types):
+            if start > end:
+                return
+            if not period_types:
+                ranges.append((PeriodSummary.DAILY, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+                return
+            period_type = period_types[0]
+            # Первый целый период, начинающийся не раньше start, и последний, заканчивающийся не позже end
+            first_start, first_end = PeriodSummary.get_period_bounds(start, period_type)
+            if first_start != start:
+                first_start = first_end + datetime.timedelta(days=1)
+            last_start, last_end = PeriodSummary.get_period_bounds(end, period_type)
+            if last_end != end:
+                last_end = last_start - datetime.timedelta(days=1)
+            if first_start > last_end:
+                split(start, end, period_types[1:])
+                return
+            split(start, first_start - datetime.timedelta(days=1), period_types[1:])
+            ranges.append((
+                period_type,
+                PeriodSummary.get_period_key(first_start, period_type),
+                PeriodSummary.get_period_key(last_end, period_type),
+            ))
+            split(last_end + datetime.timedelta(days=1), end, period_types[1:])
+
+        # Ключи всех типов периодов (и недель ISO) при сравнении строк идут в порядке дат,
+        # поэтому каждый диапазон задается первым и последним ключом
+        split(start_date, end_date, (
+            PeriodSummary.YEARLY, PeriodSummary.QUARTERLY, PeriodSummary.MONTHLY, PeriodSummary.WEEKLY
+        ))
+        return ranges
     
     def __str__(self):
         return f"{self.period_type} summary for {self.period_key}: Income {self.income_amount}, Expense {self.expense_amount}"
 
-def update_period_summary(user, date, transaction_type, amount, is_new=True, is_delete=False):
+class CategoryPeriodSummary(models.Model):
+    """Модель для хранения суммарных данных по категориям за периоды"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_period_summaries')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='period_summaries')
+    period_type = models.CharField(max_length=10, choices=PeriodSummary.PERIOD_CHOICES)
+    # Ключи периодов те же, что и в PeriodSummary
+    period_key = models.CharField(max_length=10)
+
+    # Суммы доходов и расходов категории за период
+    income_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expense_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Категория в конце ключа: по этому же индексу выбираются строки всех категорий за диапазон периодов
+        unique_together = ['user', 'period_type', 'period_key', 'category']
+        verbose_name_plural = "Category Period Summaries"
+
+    def __str__(self):
+        return f"{self.category_id} {self.period_type} summary for {self.period_key}: Income {self.income_amount}, Expense {self.expense_amount}"
+
+class PendingSummaryDelta(models.Model):
     """
-    Обновляет суммарные данные по периодам при добавлении/изменении/удалении транзакции
-    
-    Args:
-        user: Пользователь, которому принадлежит транзакция
-        date: Дата транзакции
-        transaction_type: Тип транзакции (income/expense)
-        amount: Сумма транзакции
-        is_new: Флаг, указывающий, что транзакция новая (не обновление)
-        is_delete: Флаг, указывающий на удаление транзакции
+    Очередь изменений итогов по периодам для асинхронного режима
+    (WALLET_ASYNC_SUMMARIES). Записи применяются и удаляются задачей Celery.
+    Записи с категорией относятся к CategoryPeriodSummary, без нее - к PeriodSummary.
     """
-    # Обновляем все типы периодов (день, месяц, год)
-    for period_type in [PeriodSummary.DAILY, PeriodSummary.MONTHLY, PeriodSummary.YEARLY]:
-        period_key = PeriodSummary.get_period_key(date, period_type)
-        
-        # Получаем или создаем запись итогов для периода
-        summary, created = PeriodSummary.objects.get_or_create(
-            user=user,
-            period_type=period_type,
-            period_key=period_key,
-            defaults={
-                'income_amount': Decimal('0'),
-                'expense_amount': Decimal('0')
-            }
-        )
-        
-        # Обновляем суммы в зависимости от типа операции
-        if transaction_type == Transaction.INCOME:
-            if is_delete:
-                summary.income_amount -= amount
-            else:
-                summary.income_amount += amount
-        else:  # EXPENSE
-            if is_delete:
-                summary.expense_amount -= amount
-            else:
-                summary.expense_amount += amount
-        
-        # Сохраняем изменения
-        summary.save()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_summary_deltas')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='pending_summary_deltas', null=True, blank=True)
+    period_type = models.CharField(max_length=10, choices=PeriodSummary.PERIOD_CHOICES)
+    period_key = models.CharField(max_length=10)
+    income_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expense_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Pending Summary Deltas"
+
+    def __str__(self):
+        return f"{self.period_type} delta for {self.period_key}: Income {self.income_amount}, Expense {self.expense_amount}"
+
+class Budget(models.Model):
+    """
+    Лимит расходов по категории или по всем расходам (category = None)
+    на неделю, месяц или произвольный диапазон дат
+
+    Потраченная сумма не хранится в бюджете: она читается из итогов
+    PeriodSummary / CategoryPeriodSummary, которые обновляются при каждой
+    записи транзакции (см. wallet.budgets).
+    """
+    WEEKLY = PeriodSummary.WEEKLY
+    MONTHLY = PeriodSummary.MONTHLY
+    CUSTOM = 'custom'
+    PERIOD_CHOICES = [
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+        (CUSTOM, 'Custom'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets', null=True, blank=True)
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+    period_type = models.CharField(max_length=10, choices=PERIOD_CHOICES, default=MONTHLY)
+    # Диапазон только для CUSTOM, у недельных и месячных бюджетов - текущий период
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    ~models.Q(period_type='custom') |
+                    models.Q(start_date__isnull=False, end_date__isnull=False, start_date__lte=models.F('end_date'))
+                ),
+                name='budget_custom_range',
+            ),
+        ]
+
+    def __str__(self):
+        category_name = self.category.name if self.category else 'Все расходы'
+        return f"{category_name} {self.period_type}: {self.amount}"
+
+    def get_bounds(self, today):
+        """Первый и последний день текущего периода бюджета"""
+        if self.period_type == self.CUSTOM:
+            return self.start_date, self.end_date
+        return PeriodSummary.get_period_bounds(today, self.period_type)
@@ -0,0 +1,182 @@
+"""
+Постраничный вывод транзакций по ключу (keyset pagination).
+
+Страница выбирается условием ``(date, created_at, id) < (курсор)`` по
+индексу (user, -date, -created_at, -id), а не через OFFSET, поэтому любая
+страница стоит столько же, сколько первая. Курсор - непрозрачная строка
+base64 с позицией последней (или первой) строки страницы.
+
+Если queryset отсортирован иначе (по сумме, по возрастанию даты, поиск -
+по релевантности), позицией служат поля его сортировки.
+"""
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TransactionCursorPagination(BasePagination):
+    """
+    Курсорная пагинация транзакций в порядке (-date, -created_at, -id)
+    или в порядке сортировки queryset, если все ее поля в одном направлении
+
+    ?paginate=false возвращает весь список без пагинации (для старых клиентов).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    paginate_query_param = 'paginate'
+    position_fields = ('date', 'created_at', 'id')
+    # Разбор значений позиции из курсора (числа хранятся в JSON как есть, суммы - строкой)
+    position_parsers = {'date': date.fromisoformat, 'created_at': datetime.fromisoformat, 'amount': Decimal}
+    invalid_cursor_message = "Некорректный курсор"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.paginate_query_param, '').lower() in ('false', '0', 'f'):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields, self.descending = self.get_position_fields(queryset)
+        position, self.reverse = self.decode_cursor(request)
+
+        if position is not None:
+            queryset = self.filter_after(queryset, position)
+        prefix = '-' if self.descending != self.reverse else ''
+        ordering = tuple(f'{prefix}{field}' for field in self.fields)
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+        self.page = rows
+        return rows
+
+    def get_position_fields(self, queryset):
+        """
+        Поля позиции и направление (True - по убыванию): сортировка queryset,
+        если все ее поля в одном направлении, иначе (-date, -created_at, -id)
+        """
+        ordering = queryset.query.order_by
+        if ordering and all(isinstance(field, str) for field in ordering):
+            descending = {field.startswith('-') for field in ordering}
+            if len(descending) == 1:
+                return tuple(field.lstrip('-') for field in ordering), descending.pop()
+        return self.position_fields, True
+
+    def filter_after(self, queryset, position):
+        """Строки после позиции курсора (перед ней для обратного направления)"""
+        after = self.descending != self.reverse
+        try:
+            columns = [queryset.model._meta.get_field(field).column for field in self.fields]
+        except FieldDoesNotExist:
+            columns = None
+        if columns:
+            # Сравнение кортежей в ORM не выражается, а с OR по полям Postgres не идет по индексу
+            table = connection.ops.quote_name(queryset.model._meta.db_table)
+            columns = ', '.join(f'{table}.{connection.ops.quote_name(column)}' for column in columns)
+            placeholders = ', '.join(['%s'] * len(self.fields))
+            operator = '<' if after else '>'
+            return queryset.extra(where=[f'({columns}) {operator} ({placeholders})'], params=list(position))
+
+        # Поля-аннотации (релевантность) в extra недоступны: то же условие через Q
+        lookup = 'lt' if after else 'gt'
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            equal = dict(zip(self.fields[:index], position[:index]))
+            condition |= Q(**equal, **{f'{field}__{lookup}': position[index]})
+        return queryset.filter(condition)
+
+    def get_page_size(self, request):
+        page_size = settings.WALLET_TRANSACTIONS_PAGE_SIZE
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        if requested > 0:
+            return min(requested, settings.WALLET_TRANSACTIONS_MAX_PAGE_SIZE)
+        return page_size
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        """Ссылка на страницу после (или перед) строкой row (модель или словарь из values())"""
+        values = (row[field] for field in self.fields) if isinstance(row, dict) else (
+            getattr(row, field) for field in self.fields
+        )
+        payload = {
+            'p': [self.encode_value(value) for value in values],
+            'r': int(reverse),
+        }
+        cursor = b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii'), altchars=b'-_').decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def encode_value(self, value):
+        """Значение позиции для JSON: даты в ISO 8601, суммы строкой без потери точности"""
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def decode_cursor(self, request):
+        """Позиция (значения полей позиции) и направление из параметра cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_', validate=True))
+            values = payload['p']
+            if len(values) != len(self.fields):
+                raise ValueError(values)
+            position = tuple(
+                self.position_parsers.get(field, lambda value: value)(value)
+                for field, value in zip(self.fields, values)
+            )
+            if not all(isinstance(value, (int, float, Decimal, date)) for value in position):
+                raise ValueError(values)
+            if any(isinstance(value, Decimal) and not value.is_finite() for value in position):
+                raise ValueError(values)
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,326 @@
+"""
+Пересчет балансов счетов (текущих и на конец дня), итогов по периодам и
+итогов по категориям из таблицы транзакций.
+
+Итоги считаются одним проходом по транзакциям с GROUPING SETS по всем
+типам периодов, сравниваются с сохраненными и исправляются в том же
+запросе. Используется командой rebuild_ledger и скриптом демо-данных.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .ledger import flush_pending_summaries
+from .models import Account, AccountBalanceSnapshot, CategoryPeriodSummary, PeriodSummary, Transaction
+
+
+def rebuild_users(user_ids, since=None, dry_run=False):
+    """
+    Пересчитывает балансы и итоги по периодам для группы пользователей
+
+    Счета пользователей блокируются на время пересчета, поэтому
+    параллельные записи тех же пользователей дождутся его окончания.
+
+    Args:
+        user_ids: Список id пользователей
+        since: Дата, начиная с которой пересчитываются итоги (None - вся история)
+        dry_run: Только посчитать расхождения, ничего не меняя
+
+    Returns:
+        dict: Статистика пересчета и расхождения балансов
+    """
+    with transaction.atomic():
+        list(Account.objects.select_for_update().filter(user_id__in=user_ids).order_by('pk').values_list('pk'))
+        # Изменения из очереди уже учтены в транзакциях, пересчет их заменит
+        flush_pending_summaries(list(user_ids))
+
+        stats = _rebuild_summaries(PeriodSummary, user_ids, since)
+        for key, value in _rebuild_summaries(CategoryPeriodSummary, user_ids, since).items():
+            stats[key] += value
+        stats.update(_rebuild_balances(user_ids))
+        stats.update(_rebuild_balance_history(user_ids))
+        stats['users'] = len(user_ids)
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            bump_data_version(*user_ids)
+    return stats
+
+
+def _rebuild_summaries(model, user_ids, since):
+    """Пересчитывает PeriodSummary или CategoryPeriodSummary и возвращает количество расхождений"""
+    summary_table = connection.ops.quote_name(model._meta.db_table)
+    # Итоги по категориям группируются еще и по категории, транзакции без категории в них не входят
+    by_category = model is CategoryPeriodSummary
+    group_columns = 'user_id, category_id' if by_category else 'user_id'
+    category_filter = 'AND category_id IS NOT NULL' if by_category else ''
+    transaction_table = connection.ops.quote_name(Transaction._meta.db_table)
+    period_types = [period_type for period_type, _ in PeriodSummary.PERIOD_CHOICES]
+
+    key_columns = ', '.join(
+        f"to_char(date, '{PeriodSummary.SQL_KEY_FORMATS[period_type]}') AS key_{period_type}"
+        for period_type in period_types
+    )
+    grouping_sets = ', '.join(f'({group_columns}, key_{period_type})' for period_type in period_types)
+    period_type_case = ' '.join(
+        f"WHEN GROUPING(key_{period_type}) = 0 THEN '{period_type}'" for period_type in period_types
+    )
+    period_key = 'COALESCE({})'.format(', '.join(f'key_{period_type}' for period_type in period_types))
+
+    # С --since пересчитываются только периоды, которые начинаются не раньше периода даты since
+    if since:
+        since_filter = ' OR '.join(['(period_type = %s AND period_key >= %s)'] * len(period_types))
+        since_params = []
+        for period_type in period_types:
+            since_params.extend([period_type, PeriodSummary.get_period_key(since, period_type)])
+        # Транзакции берутся с начала самого раннего из этих периодов (неделя ISO может начаться в декабре)
+        date_filter = 'AND date >= %s'
+        date_params = [min(PeriodSummary.get_period_bounds(since, period_type)[0] for period_type in period_types)]
+    else:
+        since_filter, since_params = 'TRUE', []
+        date_filter, date_params = '', []
+
+    sql = f"""
+        WITH grouped AS (
+            SELECT {group_columns},
+                   CASE {period_type_case} END AS period_type,
+                   {period_key} AS period_key,
+                   COALESCE(SUM(amount) FILTER (WHERE type = %s), 0) AS income_amount,
+                   COALESCE(SUM(amount) FILTER (WHERE type = %s), 0) AS expense_amount
+            FROM (
+                SELECT {group_columns}, type, amount, {key_columns}
+                FROM {transaction_table}
+                WHERE user_id = ANY(%s) AND type IN (%s, %s) {category_filter} {date_filter}
+            ) AS source
+            GROUP BY GROUPING SETS ({grouping_sets})
+        ),
+        expected AS (
+            SELECT * FROM grouped WHERE {since_filter}
+        ),
+        stored AS (
+            SELECT id, {group_columns}, period_type, period_key, income_amount, expense_amount
+            FROM {summary_table}
+            WHERE user_id = ANY(%s) AND ({since_filter})
+        ),
+        diff AS (
+            SELECT COALESCE(expected.user_id, stored.user_id) AS user_id,
+                   {'COALESCE(expected.category_id, stored.category_id) AS category_id,' if by_category else ''}
+                   COALESCE(expected.period_type, stored.period_type) AS period_type,
+                   COALESCE(expected.period_key, stored.period_key) AS period_key,
+                   expected.income_amount, expected.expense_amount, stored.id AS stored_id
+            FROM expected
+            FULL OUTER JOIN stored
+                ON stored.user_id = expected.user_id
+                {'AND stored.category_id = expected.category_id' if by_category else ''}
+                AND stored.period_type = expected.period_type
+                AND stored.period_key = expected.period_key
+            WHERE (expected.income_amount IS DISTINCT FROM stored.income_amount
+                   OR expected.expense_amount IS DISTINCT FROM stored.expense_amount)
+              -- Нулевая строка итогов (остается после удаления транзакций периода) равна отсутствующей
+              AND (expected.income_amount IS NOT NULL OR stored.income_amount <> 0 OR stored.expense_amount <> 0)
+        ),
+        upserted AS (
+            INSERT INTO {summary_table} AS summary
+                ({group_columns}, period_type, period_key, income_amount, expense_amount, created_at, updated_at)
+            SELECT {group_columns}, period_type, period_key, income_amount, expense_amount, %s, %s
+            FROM diff WHERE income_amount IS NOT NULL
+            ON CONFLICT ({group_columns}, period_type, period_key) DO UPDATE SET
+                income_amount = EXCLUDED.income_amount,
+                expense_amount = EXCLUDED.expense_amount,
+                updated_at = EXCLUDED.updated_at
+        ),
+        deleted AS (
+            DELETE FROM {summary_table} WHERE id IN (
+                SELECT stored_id FROM diff WHERE income_amount IS NULL
+            )
+        )
+        SELECT COUNT(*) FILTER (WHERE stored_id IS NULL),
+               COUNT(*) FILTER (WHERE income_amount IS NULL),
+               COUNT(*) FILTER (WHERE stored_id IS NOT NULL AND income_amount IS NOT NULL)
+        FROM diff
+    """
+    now = timezone.now()
+    params = [
+        Transaction.INCOME, Transaction.EXPENSE,
+        list(user_ids), Transaction.INCOME, Transaction.EXPENSE, *date_params,
+        *since_params,
+        list(user_ids), *since_params,
+        now, now,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        missing, stale, changed = cursor.fetchone()
+    return {'summaries_missing': missing, 'summaries_stale': stale, 'summaries_changed': changed}
+
+
+def _rebuild_balances(user_ids):
+    """Пересчитывает балансы счетов как начальный баланс плюс эффект всех транзакций"""
+    account_table = connection.ops.quote_name(Account._meta.db_table)
+    transaction_table = connection.ops.quote_name(Transaction._meta.db_table)
+
+    sql = f"""
+        WITH accounts AS (
+            SELECT id, opening_balance FROM {account_table} WHERE user_id = ANY(%s)
+        ),
+        effects AS (
+            SELECT account_id AS id,
+                   SUM(CASE
+                       WHEN type = %s THEN amount
+                       WHEN type = %s THEN -amount
+                       WHEN type = %s AND destination_account_id IS NOT NULL THEN -amount
+                       ELSE 0
+                   END) AS delta,
+                   COUNT(*) AS transactions
+            FROM {transaction_table}
+            WHERE account_id IN (SELECT id FROM accounts)
+            GROUP BY account_id
+            UNION ALL
+            SELECT destination_account_id, SUM(amount), 0
+            FROM {transaction_table}
+            WHERE type = %s AND destination_account_id IN (SELECT id FROM accounts)
+            GROUP BY destination_account_id
+        ),
+        expected AS (
+            SELECT accounts.id,
+                   accounts.opening_balance + COALESCE(SUM(effects.delta), 0) AS balance,
+                   COALESCE(SUM(effects.transactions), 0)::bigint AS transactions
+            FROM accounts
+            LEFT JOIN effects ON effects.id = accounts.id
+            GROUP BY accounts.id, accounts.opening_balance
+        ),
+        updated AS (
+            UPDATE {account_table} AS account
+            SET balance = expected.balance, updated_at = %s
+            FROM expected
+            WHERE account.id = expected.id AND account.balance <> expected.balance
+        )
+        SELECT expected.id, account.balance, expected.balance, expected.transactions
+        FROM expected
+        JOIN {account_table} AS account ON account.id = expected.id
+        ORDER BY expected.id
+    """
+    params = [
+        list(user_ids),
+        Transaction.INCOME, Transaction.EXPENSE, Transaction.TRANSFER,
+        Transaction.TRANSFER,
+        timezone.now(),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    diffs = [
+        {'account': account_id, 'stored': stored, 'expected': expected}
+        for account_id, stored, expected, _ in rows
+        if stored != expected
+    ]
+    return {
+        'transactions': sum(row[3] for row in rows),
+        'balances_changed': len(diffs),
+        'balance_diffs': diffs,
+    }
+
+
+def _rebuild_balance_history(user_ids):
+    """
+    Пересчитывает балансы счетов на конец дня: начальный баланс плюс
+    нарастающий итог изменений по дням (оконная функция)
+
+    Строки сравниваются как балансы на каждую дату, а не построчно: строка
+    за день без транзакций (остается после удаления) или отсутствие строки
+    за день с нулевым итогом изменений баланс на эту дату не меняют.
+    """
+    snapshot_table = connection.ops.quote_name(AccountBalanceSnapshot._meta.db_table)
+    account_table = connection.ops.quote_name(Account._meta.db_table)
+    transaction_table = connection.ops.quote_name(Transaction._meta.db_table)
+
+    sql = f"""
+        WITH accounts AS (
+            SELECT id, opening_balance FROM {account_table} WHERE user_id = ANY(%s)
+        ),
+        daily AS (
+            SELECT account_id AS id, date,
+                   SUM(CASE
+                       WHEN type = %s THEN amount
+                       WHEN type = %s THEN -amount
+                       WHEN type = %s AND destination_account_id IS NOT NULL THEN -amount
+                       ELSE 0
+                   END) AS delta
+            FROM {transaction_table}
+            WHERE account_id IN (SELECT id FROM accounts)
+            GROUP BY account_id, date
+            UNION ALL
+            SELECT destination_account_id, date, SUM(amount)
+            FROM {transaction_table}
+            WHERE type = %s AND destination_account_id IN (SELECT id FROM accounts)
+            GROUP BY destination_account_id, date
+        ),
+        expected AS (
+            SELECT daily.id AS account_id, daily.date,
+                   accounts.opening_balance + SUM(SUM(daily.delta)) OVER (
+                       PARTITION BY daily.id ORDER BY daily.date
+                   ) AS balance
+            FROM daily
+            JOIN accounts ON accounts.id = daily.id
+            GROUP BY daily.id, daily.date, accounts.opening_balance
+        ),
+        stored AS (
+            SELECT id, account_id, date, balance FROM {snapshot_table}
+            WHERE account_id IN (SELECT id FROM accounts)
+        ),
+        joined AS (
+            SELECT COALESCE(expected.account_id, stored.account_id) AS account_id,
+                   COALESCE(expected.date, stored.date) AS date,
+                   expected.balance, stored.id AS stored_id, stored.balance AS stored_balance,
+                   COUNT(expected.balance) OVER timeline AS expected_group,
+                   COUNT(stored.balance) OVER timeline AS stored_group
+            FROM expected
+            FULL OUTER JOIN stored
+                ON stored.account_id = expected.account_id AND stored.date = expected.date
+            WINDOW timeline AS (
+                PARTITION BY COALESCE(expected.account_id, stored.account_id)
+                ORDER BY COALESCE(expected.date, stored.date)
+            )
+        ),
+        carried AS (
+            -- Баланс на конец дня по каждой стороне: строка за день или последняя более ранняя
+            SELECT joined.*,
+                   COALESCE(
+                       FIRST_VALUE(balance) OVER (PARTITION BY account_id, expected_group ORDER BY date),
+                       accounts.opening_balance
+                   ) AS expected_on_date,
+                   COALESCE(
+                       FIRST_VALUE(stored_balance) OVER (PARTITION BY account_id, stored_group ORDER BY date),
+                       accounts.opening_balance
+                   ) AS stored_on_date
+            FROM joined
+            JOIN accounts ON accounts.id = joined.account_id
+        ),
+        diff AS (
+            -- Лишняя или недостающая строка с тем же балансом, что и у предыдущей, расхождением не считается
+            SELECT account_id, date, balance, stored_id
+            FROM carried
+            WHERE balance IS DISTINCT FROM stored_balance AND expected_on_date <> stored_on_date
+        ),
+        upserted AS (
+            INSERT INTO {snapshot_table} (account_id, date, balance)
+            SELECT account_id, date, balance FROM diff WHERE balance IS NOT NULL
+            ON CONFLICT (account_id, date) DO UPDATE SET balance = EXCLUDED.balance
+        ),
+        deleted AS (
+            DELETE FROM {snapshot_table} WHERE id IN (
+                SELECT stored_id FROM diff WHERE balance IS NULL
+            )
+        )
+        SELECT COUNT(*) FROM diff
+    """
+    params = [
+        list(user_ids),
+        Transaction.INCOME, Transaction.EXPENSE, Transaction.TRANSFER,
+        Transaction.TRANSFER,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        changed, = cursor.fetchone()
+    return {'snapshots_changed': changed}
@@ -0,0 +1,51 @@
+"""
+Быстрый JSON-рендерер API на orjson.
+
+Даты и время передаются в кодировщик DRF (Z вместо +00:00 и т.п.),
+Decimal - тоже (float), U+2028/U+2029 экранируются, поэтому на данных
+ответов API (суммы numeric(12, 2), даты, строки, целые) вывод совпадает
+с rest_framework.renderers.JSONRenderer байт в байт.
+
+В общем случае совпадают значения, а не запись: float меньше 1e-4 и от
+1e16 по модулю orjson записывает без экспоненты Python (0.00001 вместо
+1e-05, 1e16 вместо 1e+16), а NaN и бесконечность - как null, тогда как
+JSONRenderer отказывается их выводить. Целые вне 64 бит orjson не
+сериализует, такие ответы строит JSONRenderer.
+
+Без установленного orjson, при отступах (?indent, browsable API)
+и при нестандартных настройках JSON в DRF используется JSONRenderer.
+"""
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer, сериализующий через orjson"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None
+            or self.ensure_ascii or not self.compact or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=encoders.JSONEncoder().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как и JSONRenderer, экранируем U+2028 и U+2029 (строгое подмножество JavaScript)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
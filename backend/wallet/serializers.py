@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Category, Account, Transaction, PeriodSummary
+from django.utils import timezone
+from .models import Category, Account, AccountBalanceSnapshot, Transaction, PeriodSummary, Budget
+from .filters import TransactionFilterSerializer
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -32,6 +34,81 @@ class TransactionSerializer(serializers.ModelSerializer):
                  'date', 'comment', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+class TransactionListSerializer:
+    """
+    Быстрое представление списка транзакций в том же формате, что и
+    TransactionSerializer, без создания моделей и полей DRF на каждую строку
+
+    Строки берутся из values() (см. prepare), значения форматируются
+    функциями, подготовленными один раз на весь список:
+    сумма - строка с двумя знаками, даты - ISO 8601, время - в текущем
+    часовом поясе с Z вместо +00:00. category_name, как и у
+    TransactionSerializer, отсутствует у транзакций без категории.
+    """
+    # Поле ответа -> поле values()
+    sources = {
+        'id': 'id',
+        'amount': 'amount',
+        'type': 'type',
+        'category': 'category_id',
+        'category_name': 'category__name',
+        'account': 'account_id',
+        'account_name': 'account__name',
+        'destination_account': 'destination_account_id',
+        'destination_account_name': 'destination_account__name',
+        'date': 'date',
+        'comment': 'comment',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def prepare(cls, queryset):
+        """
+        Выборка только нужных полей, названия категории и счетов - тем же запросом
+
+        Аннотации queryset (например, релевантность поиска) тоже выбираются:
+        по ним строится курсор страницы.
+        """
+        return queryset.values(*cls.sources.values(), *queryset.query.annotation_select)
+
+    @property
+    def data(self):
+        return list(self.iter_data())
+
+    def iter_data(self):
+        """Генератор представлений строк (для потоковой выгрузки без списка в памяти)"""
+        current_timezone = timezone.get_current_timezone()
+
+        def format_datetime(value):
+            value = value.astimezone(current_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+        converters = {
+            'amount': lambda value: format(value, 'f'),
+            'date': lambda value: value.isoformat(),
+            'created_at': format_datetime,
+            'updated_at': format_datetime,
+        }
+        fields = [
+            (field, source, converters.get(field))
+            for field, source in self.sources.items()
+        ]
+
+        for row in self.rows:
+            item = {}
+            for field, source, convert in fields:
+                value = row[source]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[field] = value
+            if row['category_id'] is None:
+                del item['category_name']
+            yield item
+
 class TransactionCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
@@ -73,12 +150,141 @@ class TransactionCreateSerializer(serializers.ModelSerializer):
         # Создаем транзакцию
         return Transaction.objects.create(**validated_data)
 
+class LookupRelatedField(serializers.Field):
+    """
+    Связанное поле, которое ищет объект в словаре из контекста сериализатора,
+    а не отдельным запросом к базе для каждой строки
+    """
+    default_error_messages = {
+        'does_not_exist': 'Объект "{value}" не найден.',
+    }
+
+    def __init__(self, lookup_name, **kwargs):
+        self.lookup_name = lookup_name
+        super().__init__(**kwargs)
+
+    def get_lookup_keys(self, data):
+        return [str(data).strip()]
+
+    def to_internal_value(self, data):
+        lookup = self.context[self.lookup_name]
+        for key in self.get_lookup_keys(data):
+            if key in lookup:
+                return lookup[key]
+        self.fail('does_not_exist', value=data)
+
+    def to_representation(self, value):
+        return value.pk
+
+
+class CategoryLookupField(LookupRelatedField):
+    """Категория по id или по названию с учетом типа транзакции в строке"""
+
+    def get_lookup_keys(self, data):
+        transaction_type = self.parent.initial_data.get('type')
+        return super().get_lookup_keys(data) + [(str(data).strip().lower(), transaction_type)]
+
+
+class TransactionImportSerializer(TransactionCreateSerializer):
+    """Проверка одной строки импорта. Счета и категории ищутся в заранее загруженных словарях"""
+    account = LookupRelatedField('accounts')
+    destination_account = LookupRelatedField('accounts', required=False, allow_null=True)
+    category = CategoryLookupField('categories', required=False, allow_null=True)
+
+class TransactionBulkSerializer(serializers.Serializer):
+    """
+    Выбор транзакций для массовых операций: список id или фильтр
+    с теми же параметрами, что и у списка транзакций
+    """
+    FILTER_KEYS = (
+        'start_date', 'end_date', 'date_from', 'date_to', 'amount_min', 'amount_max',
+        'type', 'category', 'account', 'search',
+    )
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = serializers.DictField(required=False)
+
+    def validate_filter(self, value):
+        unknown = set(value) - set(self.FILTER_KEYS)
+        if unknown:
+            raise serializers.ValidationError(f"Неизвестные параметры фильтра: {', '.join(sorted(unknown))}")
+        if not value:
+            raise serializers.ValidationError("Фильтр должен содержать хотя бы один параметр")
+        # Значения проверяются так же, как параметры списка транзакций
+        filter_serializer = TransactionFilterSerializer(data=value)
+        if not filter_serializer.is_valid():
+            raise serializers.ValidationError(filter_serializer.errors)
+        return value
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError("Необходимо указать либо ids, либо filter")
+        return data
+
+
+class TransactionBulkUpdateSerializer(TransactionBulkSerializer):
+    """Массовое изменение: новая категория или перенос на другой счет"""
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
+    account = serializers.PrimaryKeyRelatedField(queryset=Account.objects.all(), required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Менять можно только на свои счета и категории
+        user = self.context['request'].user
+        self.fields['category'].queryset = Category.objects.filter(user=user)
+        self.fields['account'].queryset = Account.objects.filter(user=user)
+
+    def validate(self, data):
+        data = super().validate(data)
+        if ('category' in data) == ('account' in data):
+            raise serializers.ValidationError("Необходимо указать либо category, либо account")
+        return data
+
+class BudgetSerializer(serializers.ModelSerializer):
+    """Бюджет: лимит расходов категории (или всех расходов) на неделю, месяц или диапазон дат"""
+    category_name = serializers.CharField(source='category.name', read_only=True, default=None)
+
+    class Meta:
+        model = Budget
+        fields = ('id', 'category', 'category_name', 'amount', 'period_type', 'start_date', 'end_date',
+                  'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Лимит ставится только на свои категории расходов
+        request = self.context.get('request')
+        if request is not None:
+            self.fields['category'].queryset = Category.objects.filter(user=request.user, type=Category.EXPENSE)
+
+    def validate(self, data):
+        period_type = data.get('period_type', getattr(self.instance, 'period_type', Budget.MONTHLY))
+        if period_type != Budget.CUSTOM:
+            # У недельного и месячного бюджета период всегда текущий
+            data['start_date'] = data['end_date'] = None
+            return data
+
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if not start_date or not end_date:
+            raise serializers.ValidationError("Для бюджета на диапазон необходимо указать start_date и end_date")
+        if start_date > end_date:
+            raise serializers.ValidationError({'end_date': "Дата окончания раньше даты начала"})
+        return data
+
 class PeriodSummarySerializer(serializers.ModelSerializer):
     class Meta:
         model = PeriodSummary
         fields = ('id', 'period_type', 'period_key', 'income_amount', 'expense_amount')
         read_only_fields = ('id', 'period_type', 'period_key', 'income_amount', 'expense_amount')
 
+class AccountBalanceSnapshotSerializer(serializers.ModelSerializer):
+    """Баланс счета на конец дня"""
+    class Meta:
+        model = AccountBalanceSnapshot
+        fields = ('date', 'balance')
+        read_only_fields = ('date', 'balance')
+
 class DashboardSerializer(serializers.Serializer):
     """Сериализатор для отображения данных на дашборде."""
     period = serializers.CharField()
@@ -138,4 +344,40 @@ class DashboardSerializer(serializers.Serializer):
             return total
             
         # В противном случае возвращаем значение expense или 0
-        return obj.get('expense_total', 0) 
\ No newline at end of file
+        return obj.get('expense_total', 0) 
+
+class PeriodParamsSerializer(serializers.Serializer):
+    """
+    Диапазон дат отчета: start и end или period, как у дашборда
+    (start и end заменяют соответствующую границу периода)
+    """
+    PERIODS = ('today', 'week', 'month', 'quarter', 'year', 'all')
+
+    period = serializers.ChoiceField(choices=PERIODS, default='month')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError({'end': "Дата окончания раньше даты начала"})
+        return data
+
+
+class SeriesParamsSerializer(PeriodParamsSerializer):
+    """Параметры временного ряда аналитики: шаг ряда и диапазон дат"""
+    # Шаг ряда -> тип итогов PeriodSummary
+    GRANULARITIES = {
+        'day': PeriodSummary.DAILY,
+        'week': PeriodSummary.WEEKLY,
+        'month': PeriodSummary.MONTHLY,
+        'quarter': PeriodSummary.QUARTERLY,
+        'year': PeriodSummary.YEARLY,
+    }
+
+    granularity = serializers.ChoiceField(choices=list(GRANULARITIES), default='month')
+    period = serializers.ChoiceField(choices=PeriodParamsSerializer.PERIODS, default='year')
+
+
+class ComparisonParamsSerializer(PeriodParamsSerializer):
+    """Параметры сравнения с предыдущим периодом (у "всего времени" предыдущего периода нет)"""
+    period = serializers.ChoiceField(choices=('today', 'week', 'month', 'quarter', 'year'), default='month')
@@ -1,8 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 from decimal import Decimal
-from .models import Account, Category
+from .cache import bump_data_version
+from .models import Account, Budget, Category
 
 @receiver(post_save, sender=User)
 def create_default_user_data(sender, instance, created, **kwargs):
@@ -13,7 +14,21 @@ def create_default_user_data(sender, instance, created, **kwargs):
         print(f"Создаем базовые данные для пользователя: {instance.username}")
         create_default_accounts(instance)
         create_default_categories(instance)
-        
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def bump_user_data_version(sender, instance, **kwargs):
+    """
+    Изменение счета, категории или бюджета меняет ответы отчетов (названия,
+    балансы, лимиты), поэтому увеличиваем версию данных пользователя для кэша ответов
+    """
+    bump_data_version(instance.user_id)
+
 def create_default_accounts(user):
     """
     Создает стандартные счета для пользователя
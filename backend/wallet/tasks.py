@@ -0,0 +1,19 @@
+from celery import shared_task
+from django.core.cache import cache
+
+from .ledger import flush_pending_summaries
+
+
+@shared_task(ignore_result=True)
+def flush_summary_deltas(user_id=None):
+    """
+    Применяет очередь изменений итогов по периодам
+
+    Args:
+        user_id: id пользователя или None, чтобы применить очередь всех пользователей
+    """
+    if user_id is not None:
+        # Снимаем отметку о запланированной задаче до чтения очереди, чтобы
+        # записи, пришедшие во время применения, запланировали новую задачу
+        cache.delete(f'wallet:summary-flush:{user_id}')
+    return flush_pending_summaries(user_id, wait=False)
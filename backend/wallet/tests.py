@@ -1,3 +1,1386 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import override as override_timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import budgets, ledger
+from .filters import filter_transactions, trigram_search_available
+from .models import (
+    Account, AccountBalanceSnapshot, Budget, Category, CategoryPeriodSummary, PendingSummaryDelta, PeriodSummary,
+    Transaction
+)
+from .rebuild import rebuild_users
+from .renderers import ORJSONRenderer
+from .serializers import TransactionListSerializer, TransactionSerializer
+from .tasks import flush_summary_deltas
+from .views import get_comparison
+
+# Счетчики расхождений rebuild_users
+DRIFT_COUNTERS = (
+    'summaries_missing', 'summaries_stale', 'summaries_changed', 'balances_changed', 'snapshots_changed',
+)
+
+
+class WalletTestCase(TestCase):
+    """Пользователь с двумя счетами и категориями доходов и расходов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='password')
+        cls.cash = Account.objects.create(user=cls.user, name='Наличные', balance=Decimal('1000.00'))
+        cls.card = Account.objects.create(user=cls.user, name='Карта', balance=Decimal('500.00'))
+        # Категории по умолчанию создает сигнал при регистрации пользователя
+        cls.salary, _ = Category.objects.get_or_create(user=cls.user, name='Зарплата', type=Category.INCOME)
+        cls.food, _ = Category.objects.get_or_create(user=cls.user, name='Продукты', type=Category.EXPENSE)
+        cls.cafe, _ = Category.objects.get_or_create(user=cls.user, name='Кафе', type=Category.EXPENSE)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_transaction(self, type, amount, day, account=None, **kwargs):
+        transaction = Transaction(
+            user=self.user, type=type, amount=Decimal(amount), date=day, account=account or self.cash, **kwargs
+        )
+        transaction.save()
+        return transaction
+
+    def get_dashboard(self, **headers):
+        return self.client.get(reverse('dashboard'), {'period': 'all'}, **headers)
+
+    def balance(self, account):
+        return Account.objects.get(pk=account.pk).balance
+
+    def summary(self, period_type, period_key):
+        """(доход, расход) из PeriodSummary, нули при отсутствии строки"""
+        row = PeriodSummary.objects.filter(
+            user=self.user, period_type=period_type, period_key=period_key
+        ).values_list('income_amount', 'expense_amount').first()
+        return row or (Decimal('0'), Decimal('0'))
+
+    def category_summary(self, category, period_type, period_key):
+        """(доход, расход) категории из CategoryPeriodSummary, нули при отсутствии строки"""
+        row = CategoryPeriodSummary.objects.filter(
+            user=self.user, category=category, period_type=period_type, period_key=period_key
+        ).values_list('income_amount', 'expense_amount').first()
+        return row or (Decimal('0'), Decimal('0'))
+
+    def assertLedgerMatchesRebuild(self):
+        """Балансы и итоги совпадают с пересчетом из транзакций (rebuild_ledger --dry-run)"""
+        stats = rebuild_users([self.user.pk], dry_run=True)
+        self.assertEqual({counter: stats[counter] for counter in DRIFT_COUNTERS}, dict.fromkeys(DRIFT_COUNTERS, 0))
+
+
+class PeriodBoundsTests(SimpleTestCase):
+    """Границы и ключи периодов итогов: недели ISO и кварталы"""
+    PERIOD_TYPES = (
+        PeriodSummary.DAILY, PeriodSummary.WEEKLY, PeriodSummary.MONTHLY, PeriodSummary.QUARTERLY, PeriodSummary.YEARLY,
+    )
+
+    def test_iso_weeks_across_years(self):
+        for day, key, bounds in (
+            (date(2024, 12, 30), '2025-W01', (date(2024, 12, 30), date(2025, 1, 5))),
+            (date(2025, 1, 5), '2025-W01', (date(2024, 12, 30), date(2025, 1, 5))),
+            (date(2021, 1, 3), '2020-W53', (date(2020, 12, 28), date(2021, 1, 3))),
+            (date(2021, 1, 4), '2021-W01', (date(2021, 1, 4), date(2021, 1, 10))),
+        ):
+            with self.subTest(day=day):
+                self.assertEqual(PeriodSummary.get_period_key(day, PeriodSummary.WEEKLY), key)
+                self.assertEqual(PeriodSummary.get_period_bounds(day, PeriodSummary.WEEKLY), bounds)
+
+    def test_quarter_edges(self):
+        for day, key, bounds in (
+            (date(2024, 1, 1), '2024-Q1', (date(2024, 1, 1), date(2024, 3, 31))),
+            (date(2024, 2, 29), '2024-Q1', (date(2024, 1, 1), date(2024, 3, 31))),
+            (date(2024, 3, 31), '2024-Q1', (date(2024, 1, 1), date(2024, 3, 31))),
+            (date(2024, 4, 1), '2024-Q2', (date(2024, 4, 1), date(2024, 6, 30))),
+            (date(2024, 9, 30), '2024-Q3', (date(2024, 7, 1), date(2024, 9, 30))),
+            (date(2024, 12, 31), '2024-Q4', (date(2024, 10, 1), date(2024, 12, 31))),
+        ):
+            with self.subTest(day=day):
+                self.assertEqual(PeriodSummary.get_period_key(day, PeriodSummary.QUARTERLY), key)
+                self.assertEqual(PeriodSummary.get_period_bounds(day, PeriodSummary.QUARTERLY), bounds)
+
+    def test_periods_tile_the_calendar(self):
+        # Каждый день входит ровно в один период: у дней одного периода общий ключ,
+        # следующий день после конца периода начинает новый период с большим ключом
+        for period_type in self.PERIOD_TYPES:
+            day = date(2019, 12, 1)
+            while day < date(2026, 2, 1):
+                with self.subTest(period_type=period_type, day=day):
+                    start, end = PeriodSummary.get_period_bounds(day, period_type)
+                    key = PeriodSummary.get_period_key(day, period_type)
+                    self.assertLessEqual(start, day)
+                    self.assertLessEqual(day, end)
+                    self.assertEqual(PeriodSummary.get_period_key(start, period_type), key)
+                    self.assertEqual(PeriodSummary.get_period_key(end, period_type), key)
+                    self.assertLess(PeriodSummary.get_period_key(start - timedelta(days=1), period_type), key)
+                    self.assertLess(key, PeriodSummary.get_period_key(end + timedelta(days=1), period_type))
+                day = end + timedelta(days=1)
+
+
+class SplitRangeTests(SimpleTestCase):
+    """Разбиение диапазона дат на строки итогов (PeriodSummary.split_range)"""
+
+    def covering_rows(self, ranges, day):
+        return [
+            (period_type, PeriodSummary.get_period_key(day, period_type))
+            for period_type, first_key, last_key in ranges
+            if first_key <= PeriodSummary.get_period_key(day, period_type) <= last_key
+        ]
+
+    def test_example(self):
+        self.assertEqual(PeriodSummary.split_range(date(2024, 1, 15), date(2024, 4, 10)), [
+            (PeriodSummary.WEEKLY, '2024-W03', '2024-W04'),
+            (PeriodSummary.DAILY, '2024-01-29', '2024-01-31'),
+            (PeriodSummary.MONTHLY, '2024-02', '2024-03'),
+            (PeriodSummary.WEEKLY, '2024-W14', '2024-W14'),
+            (PeriodSummary.DAILY, '2024-04-08', '2024-04-10'),
+        ])
+        self.assertEqual(PeriodSummary.split_range(date(2023, 1, 1), date(2024, 12, 31)), [
+            (PeriodSummary.YEARLY, '2023', '2024'),
+        ])
+        self.assertEqual(PeriodSummary.split_range(date(2024, 3, 5), date(2024, 3, 5)), [
+            (PeriodSummary.DAILY, '2024-03-05', '2024-03-05'),
+        ])
+        self.assertEqual(PeriodSummary.split_range(date(2024, 3, 6), date(2024, 3, 5)), [])
+
+    def test_exact_cover(self):
+        # Каждый день диапазона покрыт ровно одной строкой итогов, дни вне диапазона не покрыты
+        for start in (date(2019, 12, 30), date(2020, 2, 29), date(2021, 1, 3), date(2022, 6, 15),
+                      date(2023, 10, 1), date(2024, 12, 28), date(2025, 3, 31)):
+            for length in (1, 6, 7, 30, 95, 400, 1000):
+                end = start + timedelta(days=length - 1)
+                with self.subTest(start=start, end=end):
+                    ranges = PeriodSummary.split_range(start, end)
+                    rows = set()
+                    day = start
+                    while day <= end:
+                        covering = self.covering_rows(ranges, day)
+                        self.assertEqual(len(covering), 1, day)
+                        rows.update(covering)
+                        day += timedelta(days=1)
+                    for day in (start - timedelta(days=1), end + timedelta(days=1)):
+                        self.assertEqual(self.covering_rows(ranges, day), [], day)
+                    # Кроме целых лет, диапазон читает не больше ~40 строк итогов
+                    self.assertLessEqual(
+                        len([row for row in rows if row[0] != PeriodSummary.YEARLY]), 40
+                    )
+
+
+class RebuildLedgerTests(WalletTestCase):
+    def test_rows_left_by_deletes_are_not_drift(self):
+        transaction = self.create_transaction(Transaction.EXPENSE, '30.00', date(2024, 3, 5), category=self.food)
+        transaction.delete()
+
+        # Ledger оставляет нулевые итоги и баланс на конец дня без транзакций
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('0'), Decimal('0')))
+        self.assertTrue(AccountBalanceSnapshot.objects.filter(account=self.cash, date=date(2024, 3, 5)).exists())
+        self.assertLedgerMatchesRebuild()
+
+    def test_drift_is_reported_and_fixed(self):
+        self.create_transaction(Transaction.INCOME, '100.00', date(2024, 3, 1), category=self.salary)
+        self.create_transaction(Transaction.EXPENSE, '40.00', date(2024, 3, 2), category=self.food)
+        PeriodSummary.objects.filter(user=self.user, period_type=PeriodSummary.MONTHLY).update(expense_amount=0)
+        AccountBalanceSnapshot.objects.filter(account=self.cash, date=date(2024, 3, 2)).delete()
+        Account.objects.filter(pk=self.card.pk).update(balance=Decimal('1.00'))
+
+        stats = rebuild_users([self.user.pk], dry_run=True)
+        self.assertEqual(stats['summaries_changed'], 1)
+        self.assertEqual(stats['snapshots_changed'], 1)
+        self.assertEqual(stats['balances_changed'], 1)
+
+        rebuild_users([self.user.pk])
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('100.00'), Decimal('40.00')))
+        self.assertEqual(self.balance(self.card), Decimal('500.00'))
+        self.assertLedgerMatchesRebuild()
+
+
+class LedgerTests(WalletTestCase):
+    """Балансы, балансы на конец дня и итоги по периодам после записи транзакций"""
+
+    def snapshot(self, account, day):
+        return AccountBalanceSnapshot.objects.get(account=account, date=day).balance
+
+    def test_create_income_expense_and_transfer(self):
+        self.create_transaction(Transaction.INCOME, '200.00', date(2024, 3, 1), category=self.salary)
+        self.create_transaction(Transaction.EXPENSE, '50.25', date(2024, 3, 2), category=self.food)
+        self.create_transaction(
+            Transaction.TRANSFER, '100.00', date(2024, 3, 3), destination_account=self.card
+        )
+
+        self.assertEqual(self.balance(self.cash), Decimal('1049.75'))
+        self.assertEqual(self.balance(self.card), Decimal('600.00'))
+        self.assertEqual(self.snapshot(self.cash, date(2024, 3, 1)), Decimal('1200.00'))
+        self.assertEqual(self.snapshot(self.cash, date(2024, 3, 3)), Decimal('1049.75'))
+        self.assertEqual(self.snapshot(self.card, date(2024, 3, 3)), Decimal('600.00'))
+        # Переводы не входят в доходы и расходы
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('200.00'), Decimal('50.25')))
+        self.assertEqual(self.summary(PeriodSummary.DAILY, '2024-03-02'), (Decimal('0'), Decimal('50.25')))
+        self.assertEqual(self.summary(PeriodSummary.WEEKLY, '2024-W09'), (Decimal('200.00'), Decimal('50.25')))
+        self.assertEqual(self.summary(PeriodSummary.QUARTERLY, '2024-Q1'), (Decimal('200.00'), Decimal('50.25')))
+        self.assertEqual(self.summary(PeriodSummary.YEARLY, '2024'), (Decimal('200.00'), Decimal('50.25')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_weekly_and_quarterly_rows_across_year_end(self):
+        # 2024-12-30 и 2025-01-01 - одна неделя ISO (2025-W01), но разные кварталы и годы
+        self.create_transaction(Transaction.EXPENSE, '10.00', date(2024, 12, 29), category=self.food)
+        self.create_transaction(Transaction.EXPENSE, '20.00', date(2024, 12, 30), category=self.food)
+        self.create_transaction(Transaction.INCOME, '300.00', date(2025, 1, 1), category=self.salary)
+
+        self.assertEqual(self.summary(PeriodSummary.WEEKLY, '2024-W52'), (Decimal('0'), Decimal('10.00')))
+        self.assertEqual(self.summary(PeriodSummary.WEEKLY, '2025-W01'), (Decimal('300.00'), Decimal('20.00')))
+        self.assertEqual(self.summary(PeriodSummary.QUARTERLY, '2024-Q4'), (Decimal('0'), Decimal('30.00')))
+        self.assertEqual(self.summary(PeriodSummary.QUARTERLY, '2025-Q1'), (Decimal('300.00'), Decimal('0')))
+        self.assertEqual(self.summary(PeriodSummary.YEARLY, '2024'), (Decimal('0'), Decimal('30.00')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_backdated_transaction_updates_later_snapshots(self):
+        self.create_transaction(Transaction.EXPENSE, '10.00', date(2024, 3, 10), category=self.food)
+        self.create_transaction(Transaction.EXPENSE, '5.00', date(2024, 3, 1), category=self.food)
+
+        self.assertEqual(self.snapshot(self.cash, date(2024, 3, 1)), Decimal('995.00'))
+        self.assertEqual(self.snapshot(self.cash, date(2024, 3, 10)), Decimal('985.00'))
+        self.assertLedgerMatchesRebuild()
+
+    def test_edit_amount_type_and_category(self):
+        transaction = self.create_transaction(Transaction.EXPENSE, '30.00', date(2024, 3, 5), category=self.food)
+
+        transaction.amount = Decimal('45.00')
+        transaction.category = self.cafe
+        transaction.save()
+        self.assertEqual(self.balance(self.cash), Decimal('955.00'))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('0'), Decimal('45.00')))
+        self.assertLedgerMatchesRebuild()
+
+        transaction.type = Transaction.INCOME
+        transaction.category = self.salary
+        transaction.save()
+        self.assertEqual(self.balance(self.cash), Decimal('1045.00'))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('45.00'), Decimal('0')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_edit_moves_between_accounts_and_dates(self):
+        transaction = self.create_transaction(Transaction.EXPENSE, '70.00', date(2024, 3, 31), category=self.food)
+
+        transaction.account = self.card
+        transaction.date = date(2024, 4, 2)
+        transaction.save()
+
+        self.assertEqual(self.balance(self.cash), Decimal('1000.00'))
+        self.assertEqual(self.balance(self.card), Decimal('430.00'))
+        self.assertEqual(self.snapshot(self.card, date(2024, 4, 2)), Decimal('430.00'))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('0'), Decimal('0')))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-04'), (Decimal('0'), Decimal('70.00')))
+        self.assertEqual(self.summary(PeriodSummary.QUARTERLY, '2024-Q1'), (Decimal('0'), Decimal('0')))
+        self.assertEqual(self.summary(PeriodSummary.QUARTERLY, '2024-Q2'), (Decimal('0'), Decimal('70.00')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_edit_transfer_accounts(self):
+        savings = Account.objects.create(user=self.user, name='Накопления', balance=Decimal('0.00'))
+        transfer = self.create_transaction(
+            Transaction.TRANSFER, '250.00', date(2024, 3, 5), destination_account=self.card
+        )
+
+        transfer.account = self.card
+        transfer.destination_account = savings
+        transfer.amount = Decimal('300.00')
+        transfer.save()
+
+        self.assertEqual(self.balance(self.cash), Decimal('1000.00'))
+        self.assertEqual(self.balance(self.card), Decimal('200.00'))
+        self.assertEqual(self.balance(savings), Decimal('300.00'))
+        self.assertLedgerMatchesRebuild()
+
+    def test_delete_reverts_each_type(self):
+        transactions = [
+            self.create_transaction(Transaction.INCOME, '200.00', date(2024, 3, 1), category=self.salary),
+            self.create_transaction(Transaction.EXPENSE, '50.00', date(2024, 3, 2), category=self.food),
+            self.create_transaction(Transaction.TRANSFER, '100.00', date(2024, 3, 3), destination_account=self.card),
+        ]
+        for transaction in transactions:
+            transaction.delete()
+
+        self.assertEqual(self.balance(self.cash), Decimal('1000.00'))
+        self.assertEqual(self.balance(self.card), Decimal('500.00'))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('0'), Decimal('0')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_delete_uses_stored_version(self):
+        transaction = self.create_transaction(Transaction.EXPENSE, '20.00', date(2024, 3, 1), category=self.food)
+        stale = Transaction.objects.get(pk=transaction.pk)
+        transaction.amount = Decimal('80.00')
+        transaction.save()
+
+        # Объект в памяти устарел: откатывается сохраненная сумма 80, а не 20
+        stale.delete()
+        self.assertEqual(self.balance(self.cash), Decimal('1000.00'))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('0'), Decimal('0')))
+        self.assertLedgerMatchesRebuild()
+
+
+class CategorySummaryTests(WalletTestCase):
+    """Итоги категорий по периодам (CategoryPeriodSummary) после записи транзакций"""
+    PERIODS = (
+        (PeriodSummary.DAILY, '2024-03-05'), (PeriodSummary.WEEKLY, '2024-W10'), (PeriodSummary.MONTHLY, '2024-03'),
+        (PeriodSummary.QUARTERLY, '2024-Q1'), (PeriodSummary.YEARLY, '2024'),
+    )
+
+    def assertCategoryTotals(self, category, totals, periods=PERIODS):
+        for period_type, period_key in periods:
+            with self.subTest(category=category.name, period_key=period_key):
+                self.assertEqual(self.category_summary(category, period_type, period_key), totals)
+
+    def test_create(self):
+        self.create_transaction(Transaction.EXPENSE, '30.00', date(2024, 3, 5), category=self.food)
+        self.create_transaction(Transaction.EXPENSE, '12.00', date(2024, 3, 5), category=self.food)
+        self.create_transaction(Transaction.INCOME, '200.00', date(2024, 3, 5), category=self.salary)
+        # Переводы и транзакции без категории строк категорий не создают
+        self.create_transaction(Transaction.TRANSFER, '100.00', date(2024, 3, 5), destination_account=self.card)
+        self.create_transaction(Transaction.EXPENSE, '5.00', date(2024, 3, 5))
+
+        self.assertCategoryTotals(self.food, (Decimal('0'), Decimal('42.00')))
+        self.assertCategoryTotals(self.salary, (Decimal('200.00'), Decimal('0')))
+        self.assertEqual(
+            set(CategoryPeriodSummary.objects.filter(user=self.user).values_list('category', flat=True)),
+            {self.food.pk, self.salary.pk}
+        )
+        self.assertLedgerMatchesRebuild()
+
+    def test_edit_changes_category(self):
+        transaction = self.create_transaction(Transaction.EXPENSE, '30.00', date(2024, 3, 5), category=self.food)
+
+        transaction.category = self.cafe
+        transaction.amount = Decimal('45.00')
+        transaction.save()
+
+        self.assertCategoryTotals(self.food, (Decimal('0'), Decimal('0')))
+        self.assertCategoryTotals(self.cafe, (Decimal('0'), Decimal('45.00')))
+        self.assertLedgerMatchesRebuild()
+
+        # Смена типа и даты: расход кафе за март уходит, доход зарплаты появляется в апреле
+        transaction.type = Transaction.INCOME
+        transaction.category = self.salary
+        transaction.date = date(2024, 4, 1)
+        transaction.save()
+
+        self.assertCategoryTotals(self.cafe, (Decimal('0'), Decimal('0')))
+        self.assertCategoryTotals(self.salary, (Decimal('0'), Decimal('0')), periods=self.PERIODS[:4])
+        self.assertCategoryTotals(self.salary, (Decimal('45.00'), Decimal('0')), periods=(
+            (PeriodSummary.DAILY, '2024-04-01'), (PeriodSummary.WEEKLY, '2024-W14'),
+            (PeriodSummary.MONTHLY, '2024-04'), (PeriodSummary.QUARTERLY, '2024-Q2'), (PeriodSummary.YEARLY, '2024'),
+        ))
+        self.assertLedgerMatchesRebuild()
+
+        transaction.category = None
+        transaction.save()
+        self.assertCategoryTotals(self.salary, (Decimal('0'), Decimal('0')), periods=((PeriodSummary.YEARLY, '2024'),))
+        self.assertLedgerMatchesRebuild()
+
+    def test_delete(self):
+        kept = self.create_transaction(Transaction.EXPENSE, '8.00', date(2024, 3, 5), category=self.cafe)
+        deleted = self.create_transaction(Transaction.EXPENSE, '30.00', date(2024, 3, 5), category=self.cafe)
+
+        deleted.delete()
+
+        self.assertCategoryTotals(self.cafe, (Decimal('0'), Decimal('8.00')))
+        kept.delete()
+        self.assertCategoryTotals(self.cafe, (Decimal('0'), Decimal('0')))
+        self.assertLedgerMatchesRebuild()
+
+
+class AccountHistoryTests(WalletTestCase):
+    """История баланса счета и баланс на дату: из балансов на конец дня и начального баланса"""
+
+    def setUp(self):
+        super().setUp()
+        # Начальный баланс наличных - 1000.00, карты - 500.00
+        self.create_transaction(Transaction.INCOME, '200.00', date(2024, 3, 5), category=self.salary)
+        self.expense = self.create_transaction(Transaction.EXPENSE, '50.00', date(2024, 3, 10), category=self.food)
+        self.create_transaction(Transaction.TRANSFER, '100.00', date(2024, 3, 20), destination_account=self.card)
+
+    def history(self, account, **params):
+        response = self.client.get(reverse('account-history', args=[account.pk]), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def balance_on(self, account, day):
+        return Decimal(self.history(account, date=day.isoformat())['balance'])
+
+    def snapshots(self, account):
+        return [
+            (day.isoformat(), f'{balance:.2f}')
+            for day, balance in AccountBalanceSnapshot.objects.filter(account=account).order_by('date').values_list(
+                'date', 'balance'
+            )
+        ]
+
+    def test_range(self):
+        data = self.history(self.cash, start_date='2024-03-01', end_date='2024-03-31')
+
+        self.assertEqual((data['start_date'], data['end_date']), (date(2024, 3, 1), date(2024, 3, 31)))
+        entries = [(entry['date'], entry['balance']) for entry in data['history']]
+        # Начало диапазона без балансов до него - начальный баланс, конец - последний баланс
+        self.assertEqual(entries[0], ('2024-03-01', '1000.00'))
+        self.assertEqual(entries[1:-1], self.snapshots(self.cash))
+        self.assertEqual(entries[1:-1], [('2024-03-05', '1200.00'), ('2024-03-10', '1150.00'), ('2024-03-20', '1050.00')])
+        self.assertEqual(entries[-1], ('2024-03-31', '1050.00'))
+
+        data = self.history(self.card, start_date='2024-03-07', end_date='2024-03-20')
+        self.assertEqual([(entry['date'], entry['balance']) for entry in data['history']], [
+            ('2024-03-07', '500.00'), ('2024-03-20', '600.00'),
+        ])
+
+    def test_range_starting_between_snapshots(self):
+        data = self.history(self.cash, start_date='2024-03-07', end_date='2024-03-10')
+
+        self.assertEqual([(entry['date'], entry['balance']) for entry in data['history']], [
+            ('2024-03-07', '1200.00'), ('2024-03-10', '1150.00'),
+        ])
+
+    def test_balance_on_date(self):
+        self.assertEqual(self.balance_on(self.cash, date(2024, 3, 4)), Decimal('1000.00'))
+        self.assertEqual(self.balance_on(self.cash, date(2024, 3, 5)), Decimal('1200.00'))
+        self.assertEqual(self.balance_on(self.cash, date(2024, 3, 15)), Decimal('1150.00'))
+        self.assertEqual(self.balance_on(self.cash, date(2030, 1, 1)), self.balance(self.cash))
+        self.assertEqual(self.balance_on(self.card, date(2024, 3, 19)), Decimal('500.00'))
+
+    def test_edit_moving_transaction_back(self):
+        self.expense.date = date(2024, 3, 1)
+        self.expense.save()
+
+        self.assertEqual(self.snapshots(self.cash), [
+            ('2024-03-01', '950.00'), ('2024-03-05', '1150.00'), ('2024-03-10', '1150.00'), ('2024-03-20', '1050.00'),
+        ])
+        for day, balance in self.snapshots(self.cash):
+            self.assertEqual(self.balance_on(self.cash, date.fromisoformat(day)), Decimal(balance))
+        self.assertEqual(self.balance_on(self.cash, date(2024, 2, 29)), Decimal('1000.00'))
+        self.assertEqual(self.balance_on(self.cash, date(2024, 3, 4)), Decimal('950.00'))
+        data = self.history(self.cash, start_date='2024-02-01', end_date='2024-03-31')
+        self.assertEqual([(entry['date'], entry['balance']) for entry in data['history']][1:-1], self.snapshots(self.cash))
+        self.assertLedgerMatchesRebuild()
+
+    def test_invalid_requests(self):
+        url = reverse('account-history', args=[self.cash.pk])
+        self.assertEqual(self.client.get(url, {'date': '10.03.2024'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start_date': '2024-03-10', 'end_date': '2024-03-01'}).status_code, 400)
+        other = User.objects.create_user('other', password='password')
+        other_account = Account.objects.filter(user=other).first()
+        self.assertEqual(self.client.get(reverse('account-history', args=[other_account.pk])).status_code, 404)
+
+
+class BulkLedgerTests(WalletTestCase):
+    """Массовые операции ledger: удаление, перенос на счет и смена категории одним запросом"""
+
+    def setUp(self):
+        self.income = self.create_transaction(Transaction.INCOME, '300.00', date(2024, 3, 1), category=self.salary)
+        self.groceries = self.create_transaction(Transaction.EXPENSE, '40.00', date(2024, 3, 2), category=self.food)
+        self.lunch = self.create_transaction(Transaction.EXPENSE, '15.50', date(2024, 4, 3), category=self.food)
+        self.transfer = self.create_transaction(
+            Transaction.TRANSFER, '100.00', date(2024, 3, 4), destination_account=self.card
+        )
+
+    def test_delete_transactions(self):
+        deleted = ledger.delete_transactions(Transaction.objects.filter(
+            pk__in=[self.groceries.pk, self.lunch.pk, self.transfer.pk]
+        ))
+
+        self.assertEqual(deleted, 3)
+        self.assertEqual(self.balance(self.cash), Decimal('1300.00'))
+        self.assertEqual(self.balance(self.card), Decimal('500.00'))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('300.00'), Decimal('0')))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-04'), (Decimal('0'), Decimal('0')))
+        self.assertEqual(self.category_summary(self.food, PeriodSummary.YEARLY, '2024'), (Decimal('0'), Decimal('0')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_delete_across_many_dates(self):
+        expenses = [
+            self.create_transaction(Transaction.EXPENSE, '1.00', date(2024, 5, day), category=self.food)
+            for day in range(1, 31)
+        ]
+        ledger.delete_transactions(Transaction.objects.filter(pk__in=[expense.pk for expense in expenses[::2]]))
+
+        self.assertEqual(self.balance(self.cash), Decimal('1129.50'))
+        self.assertEqual(
+            AccountBalanceSnapshot.objects.get(account=self.cash, date=date(2024, 5, 30)).balance, Decimal('1129.50')
+        )
+        self.assertEqual(
+            AccountBalanceSnapshot.objects.get(account=self.cash, date=date(2024, 5, 2)).balance, Decimal('1143.50')
+        )
+        self.assertLedgerMatchesRebuild()
+
+    def test_move_transactions(self):
+        # Перевод на саму карту пропускается: счет и счет назначения совпали бы
+        moved = ledger.move_transactions(Transaction.objects.filter(user=self.user), self.card)
+
+        self.assertEqual(moved, 3)
+        self.assertEqual(Transaction.objects.get(pk=self.transfer.pk).account_id, self.cash.pk)
+        self.assertEqual(self.balance(self.cash), Decimal('900.00'))
+        self.assertEqual(self.balance(self.card), Decimal('844.50'))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('300.00'), Decimal('40.00')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_recategorize_transactions(self):
+        # Категория расходов назначается только расходам
+        updated = ledger.recategorize_transactions(Transaction.objects.filter(user=self.user), self.cafe)
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(Transaction.objects.get(pk=self.income.pk).category_id, self.salary.pk)
+        self.assertEqual(self.category_summary(self.food, PeriodSummary.YEARLY, '2024'), (Decimal('0'), Decimal('0')))
+        self.assertEqual(
+            self.category_summary(self.cafe, PeriodSummary.YEARLY, '2024'), (Decimal('0'), Decimal('55.50'))
+        )
+        self.assertEqual(
+            self.category_summary(self.cafe, PeriodSummary.MONTHLY, '2024-04'), (Decimal('0'), Decimal('15.50'))
+        )
+        self.assertEqual(self.summary(PeriodSummary.YEARLY, '2024'), (Decimal('300.00'), Decimal('55.50')))
+        self.assertEqual(self.balance(self.cash), Decimal('1144.50'))
+        self.assertLedgerMatchesRebuild()
+
+
+@override_settings(WALLET_ASYNC_SUMMARIES=True)
+class PendingSummaryTests(WalletTestCase):
+    def test_periodic_sweep_applies_queue_of_all_users(self):
+        self.create_transaction(Transaction.EXPENSE, '25.00', date(2024, 3, 1), category=self.food)
+        # Отложенная задача пользователя не запланирована: on_commit в тесте не выполняется
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('0'), Decimal('0')))
+
+        schedule = settings.CELERY_BEAT_SCHEDULE['flush-summary-deltas']
+        self.assertEqual(schedule['task'], flush_summary_deltas.name)
+        flush_summary_deltas(*schedule['args'])
+
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('0'), Decimal('25.00')))
+        self.assertFalse(PendingSummaryDelta.objects.exists())
+
+
+class TransactionImportTests(WalletTestCase):
+    """Импорт транзакций из файлов: разбор форматов, ошибки строк и проводки ledger"""
+
+    def upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post(reverse('transaction-import-transactions'), {'file': upload, **data}, format='multipart')
+
+    def test_csv(self):
+        response = self.upload('bank.csv', (
+            'Date;Amount;Type;Category;Account;Destination_account;Comment\n'
+            f'05.03.2024;1 000,50;;Зарплата;{self.cash.pk};;Аванс\n'
+            f'2024-03-06;-40,25;;продукты;{self.cash.pk};;\n'
+            f'07/03/2024;100;transfer;;{self.cash.pk};{self.card.pk};На карту\n'
+        ))
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 0))
+        self.assertEqual(
+            list(Transaction.objects.filter(user=self.user).order_by('date').values_list(
+                'type', 'amount', 'category', 'destination_account', 'comment'
+            )),
+            [
+                (Transaction.INCOME, Decimal('1000.50'), self.salary.pk, None, 'Аванс'),
+                (Transaction.EXPENSE, Decimal('40.25'), self.food.pk, None, None),
+                (Transaction.TRANSFER, Decimal('100.00'), None, self.card.pk, 'На карту'),
+            ]
+        )
+        self.assertEqual(self.balance(self.cash), Decimal('1860.25'))
+        self.assertEqual(self.balance(self.card), Decimal('600.00'))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('1000.50'), Decimal('40.25')))
+        self.assertEqual(self.category_summary(self.food, PeriodSummary.DAILY, '2024-03-06'), (0, Decimal('40.25')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_ofx_uses_default_account(self):
+        response = self.upload('statement.qfx', (
+            'OFXHEADER:100\nDATA:OFXSGML\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+            '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20240310120000\n<TRNAMT>-12.30\n<NAME>Coffee\n<MEMO>Card 1234\n</STMTTRN>\n'
+            '<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20240311</DTPOSTED><TRNAMT>250.00</TRNAMT></STMTTRN>\n'
+            '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+        ), account=self.card.pk)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(
+            list(Transaction.objects.filter(user=self.user).order_by('date').values_list(
+                'date', 'type', 'amount', 'account', 'comment'
+            )),
+            [
+                (date(2024, 3, 10), Transaction.EXPENSE, Decimal('12.30'), self.card.pk, 'Coffee Card 1234'),
+                (date(2024, 3, 11), Transaction.INCOME, Decimal('250.00'), self.card.pk, None),
+            ]
+        )
+        self.assertEqual(self.balance(self.card), Decimal('737.70'))
+        self.assertLedgerMatchesRebuild()
+
+    def test_json_array_and_ndjson(self):
+        rows = [
+            {'date': '2024-03-01', 'amount': '15.00', 'type': 'expense', 'category': self.cafe.pk, 'account': self.cash.pk},
+            {'date': '2024-03-02', 'amount': 20, 'type': 'expense', 'category': 'Кафе', 'account': self.card.pk},
+        ]
+        array = self.upload('rows.json', json.dumps(rows))
+        ndjson = self.upload('rows.ndjson', '\n'.join(json.dumps(row) for row in rows) + '\n\n')
+
+        self.assertEqual((array.status_code, array.data['created']), (201, 2))
+        self.assertEqual((ndjson.status_code, ndjson.data['created']), (201, 2))
+        self.assertEqual(self.category_summary(self.cafe, PeriodSummary.MONTHLY, '2024-03'), (0, Decimal('70.00')))
+        self.assertEqual(self.balance(self.cash), Decimal('970.00'))
+        self.assertLedgerMatchesRebuild()
+
+    def test_row_errors(self):
+        content = (
+            'date,amount,type,category,account\n'
+            f'2024-03-01,10,expense,Кафе,{self.cash.pk}\n'
+            f'01-03-2024,10,expense,Кафе,{self.cash.pk}\n'
+            f'2024-03-02,5,expense,Кафе,{self.card.pk}\n'
+            f'2024-03-03,7,expense,Нет такой,{self.cash.pk}\n'
+            f'2024-03-04,abc,expense,Кафе,{self.cash.pk}\n'
+        )
+
+        atomic = self.upload('rows.csv', content)
+
+        self.assertEqual(atomic.status_code, 400)
+        self.assertEqual((atomic.data['mode'], atomic.data['created'], atomic.data['failed']), ('atomic', 0, 3))
+        # Номера строк данных (без заголовка) и поля с ошибками
+        self.assertEqual(
+            [(error['row'], sorted(error['errors'])) for error in atomic.data['errors']],
+            [(2, ['date']), (4, ['category']), (5, ['amount'])]
+        )
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+        self.assertEqual((self.balance(self.cash), self.balance(self.card)), (Decimal('1000.00'), Decimal('500.00')))
+        self.assertFalse(PeriodSummary.objects.filter(user=self.user).exists())
+
+        partial = self.upload('rows.csv', content, mode='partial')
+
+        self.assertEqual(partial.status_code, 201)
+        self.assertEqual((partial.data['created'], partial.data['failed']), (2, 3))
+        self.assertEqual([error['row'] for error in partial.data['errors']], [2, 4, 5])
+        self.assertEqual((self.balance(self.cash), self.balance(self.card)), (Decimal('990.00'), Decimal('495.00')))
+        self.assertEqual(self.summary(PeriodSummary.MONTHLY, '2024-03'), (Decimal('0'), Decimal('15.00')))
+        self.assertLedgerMatchesRebuild()
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.post(reverse('transaction-import-transactions'), {}, format='multipart').status_code, 400)
+        self.assertEqual(self.upload('rows.csv', 'date,amount\n', mode='all').status_code, 400)
+        response = self.upload('rows.json', '[{"date": ', file_format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON', response.data['error'])
+
+
+@override_settings(WALLET_EXPORT_CHUNK_SIZE=2)
+class TransactionExportTests(WalletTestCase):
+    """Потоковая выгрузка: те же строки и фильтры, что и у списка транзакций"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_transaction(Transaction.INCOME, '1000.00', date(2024, 3, 1), category=self.salary)
+        self.create_transaction(Transaction.EXPENSE, '40.50', date(2024, 3, 2), category=self.food, comment='Хлеб, "молоко"')
+        self.create_transaction(Transaction.TRANSFER, '100.00', date(2024, 3, 3), destination_account=self.card)
+        self.create_transaction(Transaction.EXPENSE, '7.00', date(2024, 4, 1), account=self.card, category=self.cafe)
+
+    def export(self, **params):
+        response = self.client.get(reverse('transaction-export'), params)
+        self.assertEqual(response.status_code, 200)
+        chunks = list(response.streaming_content)
+        return response, chunks, b''.join(chunks)
+
+    def list_results(self, **params):
+        response = self.client.get(reverse('transaction-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_csv(self):
+        response, chunks, content = self.export()
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.csv"')
+        # По два ряда в куске: заголовок с первой строкой, затем остальные
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(content.startswith('\ufeff'.encode()))
+        reader = csv.reader(io.StringIO(content.decode('utf-8-sig')))
+        header = next(reader)
+        self.assertEqual(header, list(TransactionListSerializer.sources))
+        expected = [
+            [str(item.get(field) if item.get(field) is not None else '') for field in header]
+            for item in self.list_results()
+        ]
+        self.assertEqual(list(reader), expected)
+        self.assertEqual(expected[2][header.index('comment')], 'Хлеб, "молоко"')
+
+    def test_ndjson(self):
+        response, _, content = self.export(file_format='ndjson')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertTrue(content.endswith(b'\n'))
+        self.assertEqual([json.loads(line) for line in content.splitlines()], self.list_results())
+
+    def test_gzip(self):
+        _, _, plain = self.export(file_format='ndjson')
+        response, _, compressed = self.export(file_format='ndjson', gzip='true')
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.ndjson.gz"')
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+    def test_filters_match_list(self):
+        for params in (
+            {'type': 'expense'},
+            {'date_from': '2024-03-02', 'date_to': '2024-03-31', 'ordering': 'amount'},
+            {'account': self.card.pk},
+            {'category': f'{self.food.pk},{self.cafe.pk}', 'amount_min': '10'},
+        ):
+            with self.subTest(params=params):
+                _, _, content = self.export(file_format='ndjson', **params)
+                self.assertEqual(
+                    [json.loads(line)['id'] for line in content.splitlines()],
+                    [item['id'] for item in self.list_results(**params)]
+                )
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(reverse('transaction-export'), {'file_format': 'xlsx'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('transaction-export'), {'amount_min': 'abc'}).status_code, 400)
+
+    def test_csv_can_be_imported_back(self):
+        _, _, content = self.export()
+
+        response = self.client.post(
+            reverse('transaction-import-transactions'),
+            {'file': SimpleUploadedFile('transactions.csv', content)}, format='multipart'
+        )
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(Transaction.objects.filter(user=self.user, comment='Хлеб, "молоко"').count(), 2)
+        self.assertLedgerMatchesRebuild()
+
+
+@override_settings(WALLET_RESPONSE_CACHE=False)
+class DashboardQueryTests(WalletTestCase):
+    """Полный дашборд (итоги и категории) строится одним запросом за любой период"""
+
+    def setUp(self):
+        super().setUp()
+        today = date.today()
+        self.create_transaction(Transaction.INCOME, '500.00', today, category=self.salary)
+        self.create_transaction(Transaction.EXPENSE, '120.00', today, category=self.food)
+        self.create_transaction(Transaction.EXPENSE, '30.00', today, category=self.cafe)
+        self.create_transaction(Transaction.EXPENSE, '7.00', today)
+        self.create_transaction(Transaction.EXPENSE, '1000.00', date(today.year - 3, 1, 1), category=self.food)
+
+    def test_full_dashboard_is_one_query(self):
+        for period in ('today', 'week', 'month', 'quarter', 'year', 'all'):
+            with self.subTest(period=period), self.assertNumQueries(1):
+                response = self.client.get(reverse('dashboard'), {'period': period})
+            self.assertEqual(response.status_code, 200)
+
+    def test_full_dashboard_payload(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dashboard'), {'period': 'today'})
+
+        data = response.json()
+        self.assertEqual(data['income_total'], '500.00')
+        # Расход без категории входит в общий итог, но не в разбивку по категориям
+        self.assertEqual(data['expense_total'], '157.00')
+        self.assertEqual(data['income_categories'], [{'category': self.salary.name, 'total': 500.0}])
+        self.assertEqual(data['expense_categories'], [
+            {'category': self.food.name, 'total': 120.0},
+            {'category': self.cafe.name, 'total': 30.0},
+        ])
+
+    def test_custom_period_is_one_query(self):
+        today = date.today()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dashboard'), {
+                'period': 'custom',
+                'start_date': date(today.year - 5, 1, 1).isoformat(),
+                'end_date': today.isoformat(),
+            })
+        self.assertEqual(response.json()['expense_total'], '1157.00')
+
+
+class SharedCacheMixin:
+    """Общий для процессов кэш (файловый, во временном каталоге) вместо кэша в памяти процесса"""
+
+    def setUp(self):
+        super().setUp()
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }))
+
+
+@override_settings(WALLET_RESPONSE_CACHE=True)
+class ResponseCacheTests(WalletTestCase):
+    def test_local_memory_cache_is_not_used(self):
+        # В памяти процесса версия данных не общая для воркеров: ответ строится каждый раз
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                response = self.get_dashboard()
+            self.assertNotIn('X-Cache', response)
+
+
+@override_settings(WALLET_RESPONSE_CACHE=True)
+class SharedResponseCacheTests(SharedCacheMixin, WalletTestCase):
+    def test_write_invalidates_cached_response(self):
+        self.assertEqual(self.get_dashboard()['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get_dashboard()
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_transaction(Transaction.EXPENSE, '12.00', date.today(), category=self.food)
+
+        response = self.get_dashboard()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['expense_total'], '12.00')
+
+
+class ConditionalResponseTests(WalletTestCase):
+    def test_no_etag_without_shared_cache(self):
+        self.assertNotIn('ETag', self.get_dashboard())
+        self.assertNotIn('ETag', self.client.get(reverse('transaction-list')))
+
+
+class SharedConditionalResponseTests(SharedCacheMixin, WalletTestCase):
+    def test_not_modified(self):
+        etag = self.get_dashboard()['ETag']
+        with self.assertNumQueries(0):
+            response = self.get_dashboard(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # nginx делает ETag сжатого ответа слабым
+        self.assertEqual(self.get_dashboard(HTTP_IF_NONE_MATCH=f'W/{etag}').status_code, 304)
+
+    def test_etag_changes_after_transaction_write(self):
+        url = reverse('transaction-list')
+        list_etag = self.client.get(url)['ETag']
+        dashboard_etag = self.get_dashboard()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_transaction(Transaction.EXPENSE, '12.00', date.today(), category=self.food)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], list_etag)
+        self.assertEqual(len(response.json()['results']), 1)
+        response = self.get_dashboard(HTTP_IF_NONE_MATCH=dashboard_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], dashboard_etag)
+
+
+class TransactionPaginationTests(WalletTestCase):
+    """Курсорная пагинация списка транзакций: один запрос на страницу любого размера"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Строки без проводок ledger: для списка важны только поля транзакций.
+        # По 3 транзакции в день, чтобы порядок внутри дня решали created_at и id
+        start = date(2024, 1, 1)
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=cls.user, amount=Decimal(index % 97 + 1), date=start + timedelta(days=index // 3),
+                **[
+                    {'type': Transaction.EXPENSE, 'category': cls.food, 'account': cls.cash},
+                    {'type': Transaction.INCOME, 'category': cls.salary, 'account': cls.card},
+                    {'type': Transaction.TRANSFER, 'account': cls.cash, 'destination_account': cls.card},
+                ][index % 3]
+            )
+            for index in range(1200)
+        ])
+        other = User.objects.create_user('other', password='password')
+        Transaction.objects.create(
+            user=other, type=Transaction.EXPENSE, amount=Decimal('1.00'), date=start,
+            account=Account.objects.filter(user=other).first()
+        )
+        cls.ordered_ids = list(
+            Transaction.objects.filter(user=cls.user).order_by('-date', '-created_at', '-id').values_list('pk', flat=True)
+        )
+
+    def get_page(self, url=None, **params):
+        response = self.client.get(url or reverse('transaction-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for page_size in (10, 100, 500):
+            with self.subTest(page_size=page_size), self.assertNumQueries(1):
+                page = self.get_page(page_size=page_size)
+            self.assertEqual([row['id'] for row in page['results']], self.ordered_ids[:page_size])
+            # Названия категории и счетов берутся тем же запросом
+            transfer = next(row for row in page['results'] if row['type'] == Transaction.TRANSFER)
+            self.assertEqual(transfer['account_name'], self.cash.name)
+            self.assertEqual(transfer['destination_account_name'], self.card.name)
+
+    def test_cursor_continues_through_all_rows(self):
+        ids = []
+        page = self.get_page(page_size=500)
+        pages = 1
+        while True:
+            ids.extend(row['id'] for row in page['results'])
+            if page['next'] is None:
+                break
+            with self.assertNumQueries(1):
+                page = self.get_page(page['next'])
+            pages += 1
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, self.ordered_ids)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.get_page(page_size=100)
+        second = self.get_page(first['next'])
+        self.assertIsNone(first['previous'])
+
+        previous = self.get_page(second['previous'])
+        self.assertEqual(previous['results'], first['results'])
+        self.assertEqual(
+            [row['id'] for row in self.get_page(previous['next'])['results']], self.ordered_ids[100:200]
+        )
+
+    def test_deleted_rows_are_excluded(self):
+        first = self.get_page(page_size=10)
+        # Удаляем и строку, на которой стоит курсор, и строку следующей страницы
+        Transaction.objects.filter(pk__in=[self.ordered_ids[9], self.ordered_ids[12]]).delete()
+
+        second = self.get_page(first['next'])
+        expected = [pk for pk in self.ordered_ids[10:21] if pk != self.ordered_ids[12]]
+        self.assertEqual([row['id'] for row in second['results']], expected)
+
+
+class TransactionFilterTests(WalletTestCase):
+    """Параметры фильтрации и сортировки списка транзакций (TransactionFilterSerializer)"""
+
+    def setUp(self):
+        super().setUp()
+        self.salary_march = self.create_transaction(Transaction.INCOME, '1000.00', date(2024, 3, 1), category=self.salary)
+        self.bread = self.create_transaction(Transaction.EXPENSE, '40.00', date(2024, 3, 10), category=self.food)
+        self.coffee = self.create_transaction(Transaction.EXPENSE, '5.50', date(2024, 3, 31), category=self.cafe)
+        self.transfer = self.create_transaction(
+            Transaction.TRANSFER, '100.00', date(2024, 4, 1), destination_account=self.card
+        )
+        self.dinner = self.create_transaction(
+            Transaction.EXPENSE, '40.00', date(2024, 4, 2), account=self.card, category=self.cafe
+        )
+
+    def ids(self, params):
+        response = self.client.get(reverse('transaction-list'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.json()['results']]
+
+    def assertFilters(self, params, *transactions):
+        self.assertEqual(self.ids(params), [transaction.pk for transaction in transactions])
+
+    def test_date_range_is_inclusive(self):
+        self.assertFilters({'date_from': '2024-03-10'}, self.dinner, self.transfer, self.coffee, self.bread)
+        self.assertFilters({'date_to': '2024-03-31'}, self.coffee, self.bread, self.salary_march)
+        self.assertFilters({'date_from': '2024-03-10', 'date_to': '2024-03-31'}, self.coffee, self.bread)
+
+    def test_legacy_date_aliases(self):
+        self.assertFilters({'start_date': '2024-03-10', 'end_date': '2024-03-31'}, self.coffee, self.bread)
+        # Если переданы оба имени, действует новое
+        self.assertFilters({'start_date': '2024-01-01', 'date_from': '2024-04-01'}, self.dinner, self.transfer)
+
+    def test_amount_range_is_inclusive(self):
+        self.assertFilters({'amount_min': '40'}, self.dinner, self.transfer, self.bread, self.salary_march)
+        self.assertFilters({'amount_max': '40.00'}, self.dinner, self.coffee, self.bread)
+        self.assertFilters({'amount_min': '5.50', 'amount_max': '40'}, self.dinner, self.coffee, self.bread)
+
+    def test_multiple_values(self):
+        self.assertFilters({'type': 'income,transfer'}, self.transfer, self.salary_march)
+        self.assertFilters({'type': ['income', 'transfer']}, self.transfer, self.salary_march)
+        self.assertFilters({'category': [self.cafe.pk, self.salary.pk]}, self.dinner, self.coffee, self.salary_march)
+        self.assertFilters({'category': f'{self.food.pk}, {self.cafe.pk}', 'type': 'expense', 'date_to': '2024-03-31'},
+                           self.coffee, self.bread)
+
+    def test_account_includes_incoming_transfers(self):
+        self.assertFilters({'account': self.card.pk}, self.dinner, self.transfer)
+
+    def test_ordering(self):
+        self.assertFilters({'ordering': 'date'}, self.salary_march, self.bread, self.coffee, self.transfer, self.dinner)
+        # Равные суммы упорядочены по id
+        self.assertFilters({'ordering': 'amount'}, self.coffee, self.bread, self.dinner, self.transfer, self.salary_march)
+        self.assertFilters({'ordering': '-amount', 'type': 'expense'}, self.dinner, self.bread, self.coffee)
+
+    def test_invalid_values_are_rejected(self):
+        # Параметры -> поле, о котором сообщает ответ 400 (прежние имена - под новыми)
+        for params, field in (
+            ({'date_from': '2024-13-01'}, 'date_from'),
+            ({'end_date': 'вчера'}, 'date_to'),
+            ({'date_from': '2024-04-01', 'date_to': '2024-03-01'}, 'date_to'),
+            ({'amount_min': 'abc'}, 'amount_min'),
+            ({'amount_min': '50', 'amount_max': '10'}, 'amount_max'),
+            ({'type': 'income,refund'}, 'type'),
+            ({'category': 'food'}, 'category'),
+            ({'account': '0'}, 'account'),
+            ({'ordering': 'comment'}, 'ordering'),
+            ({'ordering': '-created_at'}, 'ordering'),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('transaction-list'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.json()), [field])
+
+
+class TransactionIndexTests(WalletTestCase):
+    """
+    Горячие запросы списка транзакций читают свои индексы (миграции 0012-0015).
+    Последовательное сканирование выключено: на маленькой тестовой таблице
+    оно дешевле любого индекса, а проверяется, что подходящий индекс есть
+    и планировщик его выбирает
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Искомое слово встречается редко, как и в настоящих поисковых запросах. На истории
+        # короче нескольких тысяч строк поиску дешевле прочитать все строки пользователя
+        comments = ('Кофе с коллегами', 'Продукты в магазине', '')
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=cls.user, amount=Decimal(index % 997 + 1), date=date(2020, 1, 1) + timedelta(days=index // 2),
+                comment='Такси до аэропорта' if index % 100 == 5 else comments[index % len(comments)],
+                **(
+                    {'type': Transaction.TRANSFER, 'account': cls.cash, 'destination_account': cls.card}
+                    if index % 50 == 0 else
+                    {'type': Transaction.INCOME, 'category': cls.salary, 'account': cls.cash}
+                    if index % 20 == 1 else
+                    {'type': Transaction.EXPENSE, 'category': cls.cafe if index % 30 == 2 else cls.food,
+                     'account': cls.card if index % 40 == 3 else cls.cash}
+                )
+            )
+            for index in range(10000)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        with connection.cursor() as cursor:
+            # Строки вставлены после создания индексов: в рабочей базе список ожидающих
+            # строк GIN-индекса разбирает autovacuum, без этого планировщик завышает его стоимость
+            cursor.execute(
+                "SELECT gin_clean_pending_list(indexrelid) FROM pg_index "
+                "WHERE indexrelid IN ('transaction_comment_search_idx'::regclass, "
+                "to_regclass('transaction_comment_trgm_idx'))"
+            )
+            cursor.execute(f'ANALYZE {Transaction._meta.db_table}')
+            # До конца транзакции теста
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def index_names(self, queryset):
+        """Имена индексов во всех узлах плана запроса"""
+        def walk(node):
+            names = {node['Index Name']} if 'Index Name' in node else set()
+            for child in node.get('Plans', []):
+                names |= walk(child)
+            return names
+        return walk(json.loads(queryset.explain(format='json'))[0]['Plan'])
+
+    def assertUsesIndexes(self, params, *indexes, limit=51):
+        queryset = filter_transactions(Transaction.objects.filter(user=self.user), params)
+        if limit:
+            queryset = queryset[:limit]
+        names = self.index_names(queryset)
+        for index in indexes:
+            self.assertIn(index, names, f'{params}: {names}')
+
+    def test_cursor_list(self):
+        self.assertUsesIndexes({}, 'transaction_user_cursor_idx')
+        self.assertUsesIndexes({'date_from': date(2023, 1, 1)}, 'transaction_user_cursor_idx')
+
+    def test_type_filter(self):
+        self.assertUsesIndexes(
+            {'type': Transaction.TRANSFER, 'date_from': date(2021, 1, 1), 'date_to': date(2021, 12, 31)},
+            'transaction_user_type_idx', limit=None
+        )
+
+    def test_account_filter_reads_both_sides_of_transfers(self):
+        # Выписка по счету за период: обе стороны переводов по составным индексам (BitmapOr)
+        self.assertUsesIndexes(
+            {'account': self.card.pk, 'date_from': date(2022, 1, 1), 'date_to': date(2022, 3, 31)},
+            'transaction_user_account_idx', 'transaction_user_dest_idx', limit=None
+        )
+
+    def test_category_filter(self):
+        self.assertUsesIndexes({'category': self.cafe.pk}, 'transaction_user_category_idx')
+
+    def test_amount_range_and_ordering(self):
+        self.assertUsesIndexes({'amount_min': 900, 'amount_max': 950}, 'transaction_user_amount_idx', limit=None)
+        self.assertUsesIndexes({'ordering': '-amount', 'amount_min': 990}, 'transaction_user_amount_idx')
+
+    def test_search(self):
+        self.assertUsesIndexes({'search': 'аэропорт'}, 'transaction_comment_search_idx')
+        if trigram_search_available():
+            self.assertUsesIndexes({'search': 'аэропорт'}, 'transaction_comment_trgm_idx')
+
+
+class TransactionListSerializerTests(WalletTestCase):
+    """Быстрое представление списка дает тот же JSON, что и TransactionSerializer"""
+
+    def test_same_output_as_model_serializer(self):
+        self.create_transaction(Transaction.INCOME, '1234.50', date(2024, 3, 1), category=self.salary, comment='Аванс')
+        self.create_transaction(Transaction.EXPENSE, '0.05', date(2024, 3, 2), category=self.cafe, comment='')
+        self.create_transaction(Transaction.EXPENSE, '99999.99', date(2024, 3, 3), account=self.card)
+        self.create_transaction(
+            Transaction.TRANSFER, '100.00', date(2024, 3, 4), destination_account=self.card, comment=None
+        )
+        queryset = Transaction.objects.filter(user=self.user).order_by('-date', '-id')
+        renderer = JSONRenderer()
+
+        for zone in ('UTC', 'Asia/Almaty'):
+            with self.subTest(zone=zone), override_timezone(zone):
+                expected = TransactionSerializer(queryset, many=True).data
+                rows = TransactionListSerializer(TransactionListSerializer.prepare(queryset)).data
+                self.assertEqual(renderer.render(rows), renderer.render(expected))
+                self.assertNotIn('category_name', rows[0])
+                self.assertEqual((rows[0]['destination_account_name'], rows[1]['destination_account']), ('Карта', None))
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    # Данные, из которых состоят ответы API: суммы, даты, строки, вложенные списки и словари
+    payload = {
+        'results': [
+            {
+                'id': 9007199254740991, 'type': 'expense', 'amount': '1234.50', 'date': date(2024, 2, 29),
+                'created_at': datetime(2024, 3, 1, 12, 30, 5, 123456, tzinfo=timezone.utc),
+                'comment': 'Кофе "у дома"\n\u2028\u2029 \\ \t', 'category': None, 'is_transfer': False,
+            },
+        ],
+        'income_total': Decimal('9999999999.99'), 'expense_total': Decimal('0.00'),
+        'income_categories': [{'category': 'Зарплата', 'total': 123456789012.34}, {'category': '', 'total': 0.01}],
+        'percent': -12.5, 'uuid': uuid.UUID(int=1), 'empty': [], 'nested': {'next': None, 1: 'ключ-число'},
+    }
+
+    def test_same_bytes_as_json_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_same_values_for_other_floats(self):
+        # Запись отличается (0.00001 и 1e-05), разобранные значения - нет
+        payload = {'values': [0.00001, 1e-7, 1e16, -2.5e22]}
+        rendered = ORJSONRenderer().render(payload)
+        self.assertNotEqual(rendered, JSONRenderer().render(payload))
+        self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render(payload)))
+
+    def test_falls_back_for_big_integers(self):
+        payload = {'value': 2 ** 70}
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+
+class SeriesTests(WalletTestCase):
+    """Временной ряд аналитики: периоды без пропусков, границы периодов и один запрос"""
+
+    def setUp(self):
+        super().setUp()
+        # Пары транзакций по обе стороны границ дня, недели ISO, месяца, квартала и года
+        for type, amount, day in (
+            (Transaction.EXPENSE, '10.00', date(2023, 12, 31)),
+            (Transaction.INCOME, '100.00', date(2024, 1, 1)),
+            (Transaction.EXPENSE, '20.00', date(2024, 2, 29)),
+            (Transaction.EXPENSE, '30.00', date(2024, 3, 1)),
+            (Transaction.INCOME, '200.00', date(2024, 3, 31)),
+            (Transaction.EXPENSE, '40.00', date(2024, 4, 1)),
+        ):
+            self.create_transaction(type, amount, day)
+
+    def series(self, granularity, start, end):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('analytics-series'), {'granularity': granularity, 'start': start, 'end': end}
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        data = response.json()
+        return data['start_date'], data['end_date'], [
+            (point['period'], point['key'], point['income'], point['expense'], point['net']) for point in data['points']
+        ]
+
+    def test_days_without_transactions_are_zero(self):
+        self.assertEqual(self.series('day', '2024-02-27', '2024-03-02'), ('2024-02-27', '2024-03-02', [
+            ('2024-02-27', '2024-02-27', 0.0, 0.0, 0.0),
+            ('2024-02-28', '2024-02-28', 0.0, 0.0, 0.0),
+            ('2024-02-29', '2024-02-29', 0.0, 20.0, -20.0),
+            ('2024-03-01', '2024-03-01', 0.0, 30.0, -30.0),
+            ('2024-03-02', '2024-03-02', 0.0, 0.0, 0.0),
+        ]))
+
+    def test_iso_weeks_across_new_year(self):
+        # 2023-12-31 - воскресенье 52-й недели, 2024-01-01 - понедельник 1-й
+        self.assertEqual(self.series('week', '2023-12-27', '2024-01-09'), ('2023-12-25', '2024-01-14', [
+            ('2023-12-25', '2023-W52', 0.0, 10.0, -10.0),
+            ('2024-01-01', '2024-W01', 100.0, 0.0, 100.0),
+            ('2024-01-08', '2024-W02', 0.0, 0.0, 0.0),
+        ]))
+
+    def test_months(self):
+        self.assertEqual(self.series('month', '2024-01-15', '2024-04-10'), ('2024-01-01', '2024-04-30', [
+            ('2024-01-01', '2024-01', 100.0, 0.0, 100.0),
+            ('2024-02-01', '2024-02', 0.0, 20.0, -20.0),
+            ('2024-03-01', '2024-03', 200.0, 30.0, 170.0),
+            ('2024-04-01', '2024-04', 0.0, 40.0, -40.0),
+        ]))
+
+    def test_quarters(self):
+        self.assertEqual(self.series('quarter', '2023-08-01', '2024-04-01'), ('2023-07-01', '2024-06-30', [
+            ('2023-07-01', '2023-Q3', 0.0, 0.0, 0.0),
+            ('2023-10-01', '2023-Q4', 0.0, 10.0, -10.0),
+            ('2024-01-01', '2024-Q1', 300.0, 50.0, 250.0),
+            ('2024-04-01', '2024-Q2', 0.0, 40.0, -40.0),
+        ]))
+
+    def test_years(self):
+        self.assertEqual(self.series('year', '2022-06-01', '2024-01-01'), ('2022-01-01', '2024-12-31', [
+            ('2022-01-01', '2022', 0.0, 0.0, 0.0),
+            ('2023-01-01', '2023', 0.0, 10.0, -10.0),
+            ('2024-01-01', '2024', 300.0, 90.0, 210.0),
+        ]))
+
+
+    @override_settings(WALLET_SERIES_MAX_POINTS=4)
+    def test_point_limit(self):
+        for granularity, end, status_code in (('day', '2024-03-04', 200), ('day', '2024-03-05', 400), ('week', '2024-03-05', 200)):
+            params = {'granularity': granularity, 'start': '2024-03-01', 'end': end}
+            self.assertEqual(self.client.get(reverse('analytics-series'), params).status_code, status_code)
+
+class ComparisonTests(WalletTestCase):
+    def test_totals_and_categories(self):
+        self.create_transaction(Transaction.INCOME, '1000.00', date(2024, 3, 5), category=self.salary)
+        self.create_transaction(Transaction.EXPENSE, '40.00', date(2024, 3, 6), category=self.food)
+        self.create_transaction(Transaction.EXPENSE, '10.00', date(2024, 3, 7), category=self.cafe)
+        self.create_transaction(Transaction.EXPENSE, '5.00', date(2024, 3, 8))
+        self.create_transaction(Transaction.EXPENSE, '20.00', date(2024, 2, 10), category=self.food)
+
+        response = self.client.get(reverse('analytics-comparison'), {'start': '2024-03-01', 'end': '2024-03-31'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['previous'], {'start_date': '2024-01-30', 'end_date': '2024-02-29'})
+        # Общие итоги включают транзакции без категории
+        self.assertEqual(data['total']['income'], {'current': 1000.0, 'previous': 0.0, 'delta': 1000.0, 'percent': None})
+        self.assertEqual(data['total']['expense'], {'current': 55.0, 'previous': 20.0, 'delta': 35.0, 'percent': 175.0})
+        self.assertEqual(
+            [(item['category'], item['current'], item['previous']) for item in data['categories']],
+            [(self.salary.pk, 1000.0, 0.0), (self.food.pk, 40.0, 20.0), (self.cafe.pk, 10.0, 0.0)]
+        )
+
+    def test_query_count(self):
+        self.create_transaction(Transaction.EXPENSE, '40.00', date(2024, 3, 6), category=self.food)
+
+        # Общие итоги и итоги по категориям, независимо от длины диапазонов
+        for current, previous in (
+            ((date(2024, 3, 1), date(2024, 3, 31)), (date(2024, 1, 30), date(2024, 2, 29))),
+            ((date(2020, 1, 15), date(2024, 4, 10)), (date(2015, 10, 20), date(2020, 1, 14))),
+        ):
+            with self.subTest(current=current), self.assertNumQueries(2):
+                get_comparison(self.user, current, previous)
+
+
+class BudgetStatusTests(WalletTestCase):
+    def setUp(self):
+        super().setUp()
+        # Без категории, на краях диапазона 2024-01-15..2024-04-10 и за ними
+        for amount, day, category in (
+            ('1.00', date(2024, 1, 14), self.food),
+            ('2.00', date(2024, 1, 15), self.food),
+            ('4.00', date(2024, 2, 20), self.food),
+            ('8.00', date(2024, 3, 11), self.cafe),
+            ('16.00', date(2024, 3, 12), None),
+            ('32.00', date(2024, 4, 10), self.food),
+            ('64.00', date(2024, 4, 11), self.food),
+        ):
+            self.create_transaction(Transaction.EXPENSE, amount, day, category=category)
+        self.create_transaction(Transaction.INCOME, '500.00', date(2024, 3, 11), category=self.salary)
+
+    def create_budget(self, period_type, amount, category=None, **kwargs):
+        return Budget.objects.create(
+            user=self.user, category=category, period_type=period_type, amount=Decimal(amount), **kwargs
+        )
+
+    def test_spent_per_budget(self):
+        custom_range = {'start_date': date(2024, 1, 15), 'end_date': date(2024, 4, 10)}
+        self.create_budget(Budget.CUSTOM, '100.00', **custom_range)
+        self.create_budget(Budget.CUSTOM, '30.00', category=self.food, **custom_range)
+        self.create_budget(Budget.WEEKLY, '20.00')
+        self.create_budget(Budget.MONTHLY, '10.00', category=self.cafe)
+
+        with self.assertNumQueries(2):
+            status = budgets.get_budget_status(self.user, today=date(2024, 3, 13))
+
+        self.assertEqual(
+            [(item['period_type'], item['start_date'], item['end_date'], item['spent'], item['exceeded'])
+             for item in status],
+            [
+                (Budget.CUSTOM, date(2024, 1, 15), date(2024, 4, 10), 62.0, False),
+                (Budget.CUSTOM, date(2024, 1, 15), date(2024, 4, 10), 38.0, True),
+                (Budget.WEEKLY, date(2024, 3, 11), date(2024, 3, 17), 24.0, True),
+                (Budget.MONTHLY, date(2024, 3, 1), date(2024, 3, 31), 8.0, False),
+            ]
+        )
+        self.assertEqual(status[0]['category_name'], None)
+        self.assertEqual(status[1]['category_name'], self.food.name)
+        self.assertEqual((status[0]['remaining'], status[0]['percent']), (38.0, 62.0))
+
+    def test_custom_range_reads_coarser_rollups(self):
+        self.create_budget(Budget.CUSTOM, '100.00', start_date=date(2024, 1, 15), end_date=date(2024, 4, 10))
+        # Дневные итоги целых месяцев и недель не читаются: их заменяют месячные и недельные
+        PeriodSummary.objects.filter(
+            user=self.user, period_type=PeriodSummary.DAILY, period_key__in=['2024-02-20', '2024-03-11', '2024-03-12']
+        ).delete()
+
+        self.assertEqual(budgets.get_budget_status(self.user)[0]['spent'], 62.0)
+
+    def test_no_budgets(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(budgets.get_budget_status(self.user), [])
+
+
+class TransactionSearchTests(WalletTestCase):
+    """Поиск по комментарию: вектор search_vector поддерживает триггер БД"""
+
+    def setUp(self):
+        super().setUp()
+        self.coffee = self.create_transaction(
+            Transaction.EXPENSE, '5.00', date(2024, 3, 1), category=self.cafe, comment='Кофе с коллегами'
+        )
+        self.groceries = self.create_transaction(
+            Transaction.EXPENSE, '40.00', date(2024, 3, 2), category=self.food, comment='Продукты в магазине'
+        )
+        self.create_transaction(Transaction.EXPENSE, '1.00', date(2024, 3, 3), category=self.food)
+
+    def search(self, query):
+        response = self.client.get(reverse('transaction-list'), {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_search_by_word_forms(self):
+        self.assertEqual(self.search('продукт'), [self.groceries.pk])
+        self.assertEqual(self.search('коллега'), [self.coffee.pk])
+        self.assertCountEqual(self.search('кофе or продукты'), [self.coffee.pk, self.groceries.pk])
+
+    def test_comment_changes_update_vector(self):
+        self.coffee.comment = 'Такси до аэропорта'
+        self.coffee.save()
+        Transaction.objects.filter(pk=self.groceries.pk).update(comment='Airport lounge')
+
+        self.assertEqual(self.search('кофе'), [])
+        self.assertEqual(self.search('аэропорт'), [self.coffee.pk])
+        self.assertEqual(self.search('airports'), [self.groceries.pk])
+
+    def test_ledger_updates_keep_vector(self):
+        ledger.move_transactions(Transaction.objects.filter(user=self.user), self.card)
+        ledger.recategorize_transactions(Transaction.objects.filter(user=self.user), self.food)
+        self.coffee.refresh_from_db()
+        self.coffee.amount = Decimal('6.00')
+        self.coffee.save()
+
+        self.assertEqual(self.search('кофе'), [self.coffee.pk])
+        self.assertEqual(self.search('магазин'), [self.groceries.pk])
+
+    def test_trigram_search_finds_typos(self):
+        if not trigram_search_available():
+            self.skipTest("В базе нет расширения pg_trgm")
+        self.assertEqual(self.search('магазен'), [self.groceries.pk])
@@ -7,6 +7,8 @@ router.register(r'categories', views.CategoryViewSet, basename='category')
 router.register(r'accounts', views.AccountViewSet, basename='account')
 router.register(r'transactions', views.TransactionViewSet, basename='transaction')
 router.register(r'period-summaries', views.PeriodSummaryViewSet, basename='period-summary')
+router.register(r'analytics', views.AnalyticsViewSet, basename='analytics')
+router.register(r'budgets', views.BudgetViewSet, basename='budget')
 
 urlpatterns = [
     path('', include(router.urls)),
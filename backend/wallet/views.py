@@ -2,17 +2,27 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
-from django.db.models import Sum, Q
-from django.utils import timezone
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
 from datetime import timedelta, datetime, date
+from decimal import Decimal
 from dateutil.relativedelta import relativedelta
-from calendar import monthrange
-from .models import Category, Account, Transaction, PeriodSummary
+from .models import Category, Account, AccountBalanceSnapshot, Transaction, PeriodSummary, CategoryPeriodSummary, Budget
+from . import budgets, exporters, importers, ledger
+from .cache import cached_response, conditional_response
+from .filters import TransactionFilterBackend, filter_transactions
+from .pagination import TransactionCursorPagination
 from .serializers import (
-    CategorySerializer, AccountSerializer, 
-    TransactionSerializer, TransactionCreateSerializer,
-    PeriodSummarySerializer, DashboardSerializer
+    CategorySerializer, AccountSerializer, AccountBalanceSnapshotSerializer,
+    TransactionSerializer, TransactionListSerializer, TransactionCreateSerializer,
+    TransactionBulkSerializer, TransactionBulkUpdateSerializer,
+    PeriodSummarySerializer, DashboardSerializer, SeriesParamsSerializer, ComparisonParamsSerializer,
+    BudgetSerializer
 )
 
 # Create your views here.
@@ -21,6 +31,10 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_response('categories')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def get_queryset(self):
         return Category.objects.filter(user=self.request.user)
 
@@ -31,50 +45,91 @@ class AccountViewSet(viewsets.ModelViewSet):
     serializer_class = AccountSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_response('accounts')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def get_queryset(self):
         return Account.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """
+        История баланса счета по балансам на конец дня
+
+        ?date=YYYY-MM-DD - баланс на конец указанной даты.
+        Иначе - баланс на конец первого дня диапазона и все его изменения
+        в диапазоне: start_date и end_date или period, как у дашборда
+        (по умолчанию текущий месяц).
+        """
+        account = self.get_object()
+
+        try:
+            dates = {
+                name: datetime.strptime(request.query_params[name], '%Y-%m-%d').date()
+                for name in ('date', 'start_date', 'end_date')
+                if request.query_params.get(name)
+            }
+        except ValueError:
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if 'date' in dates:
+            snapshot = AccountBalanceSnapshot(date=dates['date'], balance=get_balance_on(account, dates['date']))
+            return Response({'account': account.pk, **AccountBalanceSnapshotSerializer(snapshot).data})
+
+        start_date, end_date = get_date_range(request.query_params.get('period', 'month'))
+        start_date = dates.get('start_date', start_date)
+        end_date = dates.get('end_date', end_date)
+        if start_date > end_date:
+            return Response(
+                {"error": "start_date must not be later than end_date."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Баланс на начало диапазона, затем только дни, в которые он менялся
+        history = [AccountBalanceSnapshot(date=start_date, balance=get_balance_on(account, start_date))]
+        history.extend(account.balance_snapshots.filter(date__gt=start_date, date__lte=end_date).order_by('date'))
+        if history[-1].date < end_date:
+            history.append(AccountBalanceSnapshot(date=end_date, balance=history[-1].balance))
+
+        return Response({
+            'account': account.pk,
+            'start_date': start_date,
+            'end_date': end_date,
+            'history': AccountBalanceSnapshotSerializer(history, many=True).data
+        })
+
 class TransactionViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionCursorPagination
+    filter_backends = [TransactionFilterBackend]
 
     def get_serializer_class(self):
         if self.action == 'create':
             return TransactionCreateSerializer
         return TransactionSerializer
 
-    def get_queryset(self):
-        queryset = Transaction.objects.filter(user=self.request.user)
-        
-        # Фильтрация по дате
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        if start_date:
-            queryset = queryset.filter(date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(date__lte=end_date)
-        
-        # Фильтрация по типу
-        transaction_type = self.request.query_params.get('type')
-        if transaction_type:
-            queryset = queryset.filter(type=transaction_type)
-        
-        # Фильтрация по категории
-        category_id = self.request.query_params.get('category')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
-        
-        # Фильтрация по счету (учитываем как исходящие, так и входящие переводы)
-        account_id = self.request.query_params.get('account')
-        if account_id:
-            queryset = queryset.filter(
-                Q(account_id=account_id) | 
-                Q(destination_account_id=account_id)
-            )
+    @conditional_response('transactions')
+    def list(self, request, *args, **kwargs):
+        # Только чтение: строки из values() без создания моделей и сериализатора на каждую
+        queryset = TransactionListSerializer.prepare(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(TransactionListSerializer(page).data)
+        return Response(TransactionListSerializer(queryset).data)
 
-        return queryset.order_by('-date', '-created_at')
+    def get_queryset(self):
+        # Названия категории и счетов для TransactionSerializer берутся тем же запросом.
+        # Фильтры, поиск и сортировка - TransactionFilterBackend
+        return Transaction.objects.filter(user=self.request.user).select_related(
+            'category', 'account', 'destination_account'
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -103,41 +158,108 @@ class TransactionViewSet(viewsets.ModelViewSet):
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_transactions(self, request):
+        """
+        Массовый импорт транзакций из файла (CSV, OFX, JSON/NDJSON)
+
+        Параметры формы:
+            file: Файл с транзакциями
+            file_format: csv | ofx | json (по умолчанию определяется по расширению)
+            account: Счет по умолчанию для строк без счета (обязателен для OFX)
+            mode: atomic - все или ничего (по умолчанию), partial - пропустить ошибочные строки
+        """
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response(
+                {"error": "Необходимо передать файл в поле file"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        mode = request.data.get('mode', 'atomic')
+        if mode not in ('atomic', 'partial'):
+            return Response(
+                {"error": "mode должен быть atomic или partial"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        file_format = request.data.get('file_format') or importers.detect_format(upload.name)
+        try:
+            rows = importers.read_rows(upload, file_format, default_account=request.data.get('account'))
+            result = importers.import_rows(request.user, rows, partial=mode == 'partial')
+        except importers.ImportFormatError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        result['mode'] = mode
+        response_status = status.HTTP_201_CREATED if result['created'] or not result['failed'] else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=response_status)
+
     @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Потоковая выгрузка транзакций с теми же фильтрами, что и у списка
+
+        Параметры запроса:
+            file_format: csv (по умолчанию) | ndjson
+            gzip: true - сжать выгрузку (файл .gz)
+        """
+        file_format = request.query_params.get('file_format', exporters.CSV)
+        compress = request.query_params.get('gzip', '').lower() in ('true', '1', 't')
+        try:
+            chunks = exporters.stream_transactions(self.filter_queryset(self.get_queryset()), file_format, compress)
+        except exporters.ExportFormatError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(chunks, content_type=exporters.content_type(file_format, compress))
+        response['Content-Disposition'] = (
+            f'attachment; filename="{exporters.export_filename(file_format, compress)}"'
+        )
+        return response
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """
+        Массовое удаление транзакций по списку id или по фильтру
+        с пересчетом балансов и итогов по периодам
+        """
+        serializer = TransactionBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deleted = ledger.delete_transactions(self._bulk_queryset(serializer.validated_data))
+        return Response({'deleted': deleted})
+
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """
+        Массовое изменение транзакций по списку id или по фильтру:
+        смена категории (category) или перенос на другой счет (account)
+        """
+        serializer = TransactionBulkUpdateSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        queryset = self._bulk_queryset(serializer.validated_data)
+
+        if 'category' in serializer.validated_data:
+            updated = ledger.recategorize_transactions(queryset, serializer.validated_data['category'])
+        else:
+            updated = ledger.move_transactions(queryset, serializer.validated_data['account'])
+        return Response({'updated': updated})
+
+    def _bulk_queryset(self, validated_data):
+        """Транзакции пользователя, выбранные для массовой операции"""
+        queryset = Transaction.objects.filter(user=self.request.user)
+        if 'ids' in validated_data:
+            return queryset.filter(pk__in=validated_data['ids'])
+        return filter_transactions(queryset, validated_data['filter'])
+
+    @action(detail=False, methods=['get'])
+    @cached_response('statistics')
     def statistics(self, request):
         # Получаем период для статистики
         period = request.query_params.get('period', 'month')
         start_date, end_date = get_date_range(period)
         
-        # Получаем статистику по категориям
-        categories_stats = Transaction.objects.filter(
-            user=request.user,
-            date__gte=start_date,
-            date__lte=end_date
-        ).values(
-            'category__name',
-            'type'
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('type', '-total')
-
-        # Форматируем статистику
-        income_stats = []
-        expense_stats = []
-        for stat in categories_stats:
-            if not stat['category__name']:
-                continue  # Пропускаем транзакции без категории
-                
-            if stat['type'] == 'income':
-                income_stats.append({
-                    'category': stat['category__name'],
-                    'total': float(stat['total'])
-                })
-            else:
-                expense_stats.append({
-                    'category': stat['category__name'],
-                    'total': float(stat['total'])
-                })
+        # Получаем статистику по категориям из итогов по категориям
+        flush_pending_summaries_if_requested(request)
+        income_stats, expense_stats = get_category_totals(request.user, start_date, end_date)
 
         return Response({
             'period': period,
@@ -148,6 +270,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @conditional_response('dashboard')
+    @cached_response('dashboard')
     def dashboard(self, request):
         """
         API для дашборда, возвращает итоговые суммы доходов и расходов за период,
@@ -181,10 +305,12 @@ class TransactionViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        # Получаем суммы из таблицы PeriodSummary
-        income_amount, expense_amount = get_period_totals(request.user, start_date, end_date)
+        flush_pending_summaries_if_requested(request)
         
         if format_type == 'simple':
+            # Получаем суммы из таблицы PeriodSummary
+            income_amount, expense_amount = get_period_totals(request.user, start_date, end_date)
+            
             # Возвращаем только общие суммы (для обратной совместимости)
             response_data = {
                 'period': period,
@@ -194,49 +320,11 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 'end_date': end_date
             }
         else:
-            # Получаем статистику по категориям
-            transactions = Transaction.objects.filter(
-                user=request.user,
-                date__gte=start_date,
-                date__lte=end_date
+            # Общие суммы и статистика по категориям одним запросом
+            income_amount, expense_amount, income_categories, expense_categories = get_dashboard_totals(
+                request.user, start_date, end_date
             )
             
-            # Группируем по категориям и типу
-            income_categories = []
-            expense_categories = []
-            
-            # Группировка по категориям для доходов
-            income_by_category = transactions.filter(
-                type=Transaction.INCOME
-            ).values(
-                'category__name'
-            ).annotate(
-                total=Sum('amount')
-            ).order_by('-total')
-            
-            for category in income_by_category:
-                if category['category__name']:
-                    income_categories.append({
-                        'category': category['category__name'],
-                        'total': float(category['total'])
-                    })
-            
-            # Группировка по категориям для расходов
-            expense_by_category = transactions.filter(
-                type=Transaction.EXPENSE
-            ).values(
-                'category__name'
-            ).annotate(
-                total=Sum('amount')
-            ).order_by('-total')
-            
-            for category in expense_by_category:
-                if category['category__name']:
-                    expense_categories.append({
-                        'category': category['category__name'],
-                        'total': float(category['total'])
-                    })
-            
             # Формируем полный ответ с детализацией
             response_data = {
                 'period': period,
@@ -255,7 +343,12 @@ class PeriodSummaryViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = PeriodSummarySerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @cached_response('period-summaries')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def get_queryset(self):
+        flush_pending_summaries_if_requested(self.request)
         queryset = PeriodSummary.objects.filter(user=self.request.user)
         
         # Фильтрация по типу периода
@@ -270,6 +363,129 @@ class PeriodSummaryViewSet(viewsets.ReadOnlyModelViewSet):
         
         return queryset.order_by('-period_key')
 
+class BudgetViewSet(viewsets.ModelViewSet):
+    """API для управления бюджетами"""
+    serializer_class = BudgetSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Budget.objects.filter(user=self.request.user).select_related('category').order_by('id')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    @cached_response('budget-status')
+    def status(self, request):
+        """
+        Потрачено из лимита в текущем периоде для всех бюджетов пользователя
+        (два запроса: бюджеты и расходы всех бюджетов по итогам за периоды,
+        см. wallet.budgets)
+        """
+        flush_pending_summaries_if_requested(request)
+        return Response(budgets.get_budget_status(request.user))
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """API аналитики для графиков: данные только из итогов по периодам"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    @cached_response('analytics-series')
+    def series(self, request):
+        """
+        Временной ряд доходов, расходов и их разницы без пропусков
+
+        ?granularity=day|week|month|quarter|year - шаг ряда (по умолчанию month),
+        ?start=YYYY-MM-DD&end=YYYY-MM-DD или ?period= как у дашборда (по умолчанию year).
+        Первая и последняя точки - целые периоды, в которые попадают start и end.
+        """
+        params = SeriesParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start_date, end_date = resolve_date_range(params.validated_data)
+        if start_date > end_date:
+            return Response(
+                {"error": "start must not be later than end."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        period_type = SeriesParamsSerializer.GRANULARITIES[params.validated_data['granularity']]
+        first = PeriodSummary.get_period_bounds(start_date, period_type)[0]
+        last = PeriodSummary.get_period_bounds(end_date, period_type)[0]
+        if count_periods(first, last, period_type) > settings.WALLET_SERIES_MAX_POINTS:
+            return Response(
+                {"error": f"Too many points, the limit is {settings.WALLET_SERIES_MAX_POINTS}. Use a larger granularity."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        flush_pending_summaries_if_requested(request)
+        return Response({
+            'granularity': params.validated_data['granularity'],
+            'start_date': first,
+            'end_date': PeriodSummary.get_period_bounds(end_date, period_type)[1],
+            'points': get_series(request.user, period_type, first, last),
+        })
+
+    @action(detail=False, methods=['get'])
+    @cached_response('analytics-comparison')
+    def comparison(self, request):
+        """
+        Сравнение с предыдущим периодом в целом и по категориям
+
+        ?period=today|week|month|quarter|year (по умолчанию month) - текущий
+        период до сегодняшнего дня против такого же отрезка предыдущего
+        (1-18 октября против 1-18 сентября). ?start=&end= - произвольный
+        диапазон против непосредственно предшествующего диапазона той же длины.
+        """
+        params = ComparisonParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        current = resolve_date_range(params.validated_data)
+        if current[0] > current[1]:
+            return Response(
+                {"error": "start must not be later than end."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if 'start' in params.validated_data or 'end' in params.validated_data:
+            length = current[1] - current[0] + timedelta(days=1)
+            previous = (current[0] - length, current[0] - timedelta(days=1))
+        else:
+            shift = COMPARISON_SHIFTS[params.validated_data['period']]
+            previous = (current[0] - shift, current[1] - shift)
+
+        flush_pending_summaries_if_requested(request)
+        total, categories = get_comparison(request.user, current, previous)
+        return Response({
+            'period': params.validated_data['period'],
+            'current': {'start_date': current[0], 'end_date': current[1]},
+            'previous': {'start_date': previous[0], 'end_date': previous[1]},
+            'total': total,
+            'categories': categories,
+        })
+
+def resolve_date_range(params):
+    """Диапазон дат отчета из проверенных PeriodParamsSerializer параметров"""
+    start_date, end_date = get_date_range(params['period'])
+    return params.get('start', start_date), params.get('end', end_date)
+
+def flush_pending_summaries_if_requested(request):
+    """
+    Чтение собственных записей: в асинхронном режиме итогов (WALLET_ASYNC_SUMMARIES)
+    при параметре consistent=true перед чтением применяет очередь изменений пользователя
+    """
+    if not settings.WALLET_ASYNC_SUMMARIES:
+        return
+    if request.query_params.get('consistent', '').lower() in ('true', '1', 't'):
+        ledger.flush_pending_summaries(request.user.pk)
+
+def get_balance_on(account, on_date):
+    """
+    Баланс счета на конец указанной даты: последний баланс на конец дня
+    не позже даты (один поиск по индексу), а если его нет - начальный баланс
+    """
+    balance = account.balance_snapshots.filter(
+        date__lte=on_date
+    ).order_by('-date').values_list('balance', flat=True).first()
+    return account.opening_balance if balance is None else balance
+
 def get_date_range(period_type):
     """
     Получает диапазон дат для указанного типа периода
@@ -319,6 +535,10 @@ def get_period_totals(user, start_date, end_date):
     """
     Получает суммы доходов и расходов за указанный период
     
+    Диапазон разбивается на целые годы, кварталы, месяцы, недели и оставшиеся
+    дни, и все нужные строки PeriodSummary суммируются одним запросом. Число
+    строк не зависит от количества транзакций и длины истории.
+    
     Args:
         user: Пользователь
         start_date: Начальная дата периода
@@ -327,65 +547,274 @@ def get_period_totals(user, start_date, end_date):
     Returns:
         tuple: (income_amount, expense_amount)
     """
-    # Для оптимизации мы попробуем использовать предварительно рассчитанные суммы из PeriodSummary
-    # Но нужно учесть, что период может не совпадать с предопределенными периодами
-    
-    # Проверяем, совпадает ли период с месяцем
-    income_amount = 0
-    expense_amount = 0
-    
-    # Пытаемся использовать суммы по месяцам
-    if start_date.day == 1 and end_date.day == monthrange(end_date.year, end_date.month)[1] and start_date.month == end_date.month:
-        # Это полный месяц
-        period_key = PeriodSummary.get_period_key(start_date, PeriodSummary.MONTHLY)
-        summary = PeriodSummary.objects.filter(
-            user=user,
-            period_type=PeriodSummary.MONTHLY,
-            period_key=period_key
-        ).first()
-        
-        if summary:
-            return summary.income_amount, summary.expense_amount
-    
-    # Если не удалось использовать предварительно рассчитанные суммы, считаем из транзакций
-    # Получаем все дневные итоги за указанный период
-    daily_summaries = PeriodSummary.objects.filter(
-        user=user,
-        period_type=PeriodSummary.DAILY,
-        period_key__gte=start_date.strftime('%Y-%m-%d'),
-        period_key__lte=end_date.strftime('%Y-%m-%d')
+    conditions = get_period_conditions(start_date, end_date)
+    if conditions is None:
+        return 0, 0
+
+    conditions_sql, params = conditions
+    table = connection.ops.quote_name(PeriodSummary._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT SUM(income_amount), SUM(expense_amount)
+            FROM {table}
+            WHERE user_id = %s AND {conditions_sql}
+        """, [user.pk, *params])
+        income_amount, expense_amount = cursor.fetchone()
+    return income_amount or 0, expense_amount or 0
+
+# Шаг generate_series для типа итогов
+SERIES_STEPS = {
+    PeriodSummary.DAILY: '1 day',
+    PeriodSummary.WEEKLY: '1 week',
+    PeriodSummary.MONTHLY: '1 month',
+    PeriodSummary.QUARTERLY: '3 months',
+    PeriodSummary.YEARLY: '1 year',
+}
+
+def get_series(user, period_type, first, last):
+    """
+    Временной ряд итогов без пропусков одним запросом
+
+    Периоды генерируются в базе (generate_series), итоги присоединяются
+    по ключу периода через уникальный индекс (user, period_type, period_key),
+    периоды без итогов получают нули. Транзакции не читаются.
+
+    Args:
+        user: Пользователь
+        period_type: Тип итогов (PeriodSummary.DAILY, WEEKLY, ...)
+        first: Первый день первого периода
+        last: Первый день последнего периода
+
+    Returns:
+        list: {'period': начало периода, 'key': ключ периода,
+               'income': доход, 'expense': расход, 'net': доход минус расход}
+    """
+    table = connection.ops.quote_name(PeriodSummary._meta.db_table)
+    key_format = PeriodSummary.SQL_KEY_FORMATS[period_type]
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT period.start::date, to_char(period.start, %s),
+                   COALESCE(summary.income_amount, 0), COALESCE(summary.expense_amount, 0)
+            FROM generate_series(%s::date, %s::date, %s::interval) AS period(start)
+            LEFT JOIN {table} AS summary
+                ON summary.user_id = %s AND summary.period_type = %s
+                AND summary.period_key BETWEEN %s AND %s
+                AND summary.period_key = to_char(period.start, %s)
+            ORDER BY period.start
+        """, [
+            key_format, first, last, SERIES_STEPS[period_type],
+            user.pk, period_type,
+            PeriodSummary.get_period_key(first, period_type), PeriodSummary.get_period_key(last, period_type),
+            key_format,
+        ])
+        return [
+            {
+                'period': start, 'key': key,
+                'income': float(income), 'expense': float(expense), 'net': float(income - expense),
+            }
+            for start, key, income, expense in cursor.fetchall()
+        ]
+
+# Сдвиг текущего периода к предыдущему для сравнения
+COMPARISON_SHIFTS = {
+    'today': relativedelta(days=1),
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+    'quarter': relativedelta(months=3),
+    'year': relativedelta(years=1),
+}
+
+def get_comparison(user, current, previous):
+    """
+    Доходы и расходы за два диапазона дат в целом и по категориям
+
+    Строки итогов для обоих диапазонов выбираются так же, как в
+    get_period_totals, и суммируются условной агрегацией
+    (Sum(..., filter=Q(...))): два запроса - общие итоги из PeriodSummary
+    (в них входят и транзакции без категории) и группировка по категориям.
+
+    Args:
+        user: Пользователь
+        current: (start_date, end_date) текущего диапазона
+        previous: (start_date, end_date) предыдущего диапазона
+
+    Returns:
+        tuple: (total, categories) - общие итоги {'income', 'expense', 'net'}
+               и список категорий с суммой по типу категории; каждое значение -
+               {'current', 'previous', 'delta', 'percent'}
+    """
+    current_q = get_period_q(*current)
+    previous_q = get_period_q(*previous)
+    amounts = {
+        'income': Coalesce(Sum('income_amount', filter=current_q), Decimal('0')),
+        'expense': Coalesce(Sum('expense_amount', filter=current_q), Decimal('0')),
+        'previous_income': Coalesce(Sum('income_amount', filter=previous_q), Decimal('0')),
+        'previous_expense': Coalesce(Sum('expense_amount', filter=previous_q), Decimal('0')),
+    }
+
+    totals = PeriodSummary.objects.filter(current_q | previous_q, user=user).aggregate(**amounts)
+    total = {
+        'income': compare_amounts(totals['income'], totals['previous_income']),
+        'expense': compare_amounts(totals['expense'], totals['previous_expense']),
+        'net': compare_amounts(
+            totals['income'] - totals['expense'], totals['previous_income'] - totals['previous_expense']
+        ),
+    }
+
+    rows = (
+        CategoryPeriodSummary.objects
+        .filter(current_q | previous_q, user=user)
+        .values('category', 'category__name', 'category__type')
+        .annotate(**amounts)
+        .order_by()
     )
-    
-    if daily_summaries.exists():
-        # Суммируем итоги из дневных записей
-        income_totals = daily_summaries.aggregate(total=Sum('income_amount'))
-        expense_totals = daily_summaries.aggregate(total=Sum('expense_amount'))
-        
-        income_amount = income_totals['total'] or 0
-        expense_amount = expense_totals['total'] or 0
-    else:
-        # Если нет дневных итогов, считаем напрямую из транзакций
-        income_transactions = Transaction.objects.filter(
-            user=user,
-            type=Transaction.INCOME,
-            date__gte=start_date,
-            date__lte=end_date
-        )
-        
-        expense_transactions = Transaction.objects.filter(
-            user=user,
-            type=Transaction.EXPENSE,
-            date__gte=start_date,
-            date__lte=end_date
-        )
-        expense_transactions = Transaction.objects.filter(
-            user=user
-        )
-        
-        income_amount = income_transactions.aggregate(total=Sum('amount'))['total'] or 0
-        expense_amount = expense_transactions.aggregate(total=Sum('amount'))['total'] or 0
-    
-    return income_amount, expense_amount
+    categories = []
+    for row in rows:
+        if row['category__type'] == Category.INCOME:
+            category_amounts = compare_amounts(row['income'], row['previous_income'])
+        else:
+            category_amounts = compare_amounts(row['expense'], row['previous_expense'])
+        if category_amounts['current'] or category_amounts['previous']:
+            categories.append({
+                'category': row['category'], 'name': row['category__name'], 'type': row['category__type'],
+                **category_amounts,
+            })
+    categories.sort(key=lambda item: (-item['current'], -item['previous'], item['name']))
+    return total, categories
+
+def compare_amounts(current, previous):
+    """Суммы за два периода, разница и изменение в процентах (None, если в предыдущем 0)"""
+    delta = current - previous
+    return {
+        'current': float(current),
+        'previous': float(previous),
+        'delta': float(delta),
+        'percent': round(float(delta / abs(previous) * 100), 2) if previous else None,
+    }
+
+def count_periods(first, last, period_type):
+    """Число периодов ряда от first до last (первые дни периодов) включительно"""
+    if period_type == PeriodSummary.DAILY:
+        return (last - first).days + 1
+    if period_type == PeriodSummary.WEEKLY:
+        return (last - first).days // 7 + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    if period_type == PeriodSummary.MONTHLY:
+        return months + 1
+    if period_type == PeriodSummary.QUARTERLY:
+        return months // 3 + 1
+    return last.year - first.year + 1
+
+def get_period_conditions(start_date, end_date):
+    """
+    SQL-условие на строки итогов (PeriodSummary, CategoryPeriodSummary), которые
+    в сумме покрывают диапазон дат ровно один раз
+
+    Условие собирается строкой, а не через Q: на десятке диапазонов сборка
+    запроса ORM обходится дороже, чем сам запрос.
+
+    Returns:
+        tuple: (sql, params) или None для пустого диапазона
+    """
+    ranges = PeriodSummary.split_range(start_date, end_date)
+    if not ranges:
+        return None
+
+    sql = ' OR '.join(['(period_type = %s AND period_key BETWEEN %s AND %s)'] * len(ranges))
+    return f'({sql})', [value for period_range in ranges for value in period_range]
+
+def get_period_q(start_date, end_date):
+    """
+    Условие Q на строки итогов, которые в сумме покрывают диапазон дат ровно
+    один раз (то же, что get_period_conditions, для запросов через ORM)
+    """
+    q = Q(pk__in=[])
+    for period_type, first_key, last_key in PeriodSummary.split_range(start_date, end_date):
+        q |= Q(period_type=period_type, period_key__range=(first_key, last_key))
+    return q
+
+def get_category_totals(user, start_date, end_date):
+    """
+    Получает суммы доходов и расходов по категориям за указанный период
+
+    Строки итогов выбираются так же, как в get_period_totals, поэтому читается
+    не больше нескольких десятков строк на категорию независимо от количества
+    транзакций. Транзакции без категории не учитываются.
+
+    Returns:
+        tuple: (income_categories, expense_categories) - списки
+               {'category': название, 'total': сумма} по убыванию суммы
+    """
+    conditions = get_period_conditions(start_date, end_date)
+    if conditions is None:
+        return [], []
+
+    conditions_sql, params = conditions
+    summary_table = connection.ops.quote_name(CategoryPeriodSummary._meta.db_table)
+    category_table = connection.ops.quote_name(Category._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT category.name, SUM(summary.income_amount), SUM(summary.expense_amount)
+            FROM {summary_table} AS summary
+            JOIN {category_table} AS category ON category.id = summary.category_id
+            WHERE summary.user_id = %s AND {conditions_sql}
+            GROUP BY category.name
+        """, [user.pk, *params])
+        return split_category_totals(cursor.fetchall())
+
+def get_dashboard_totals(user, start_date, end_date):
+    """
+    Получает общие суммы и суммы по категориям за период одним запросом:
+    строка общих итогов (PeriodSummary) и строки категорий (CategoryPeriodSummary)
+    объединяются через UNION ALL
+
+    Returns:
+        tuple: (income_amount, expense_amount, income_categories, expense_categories)
+    """
+    conditions = get_period_conditions(start_date, end_date)
+    if conditions is None:
+        return 0, 0, [], []
+
+    conditions_sql, params = conditions
+    period_table = connection.ops.quote_name(PeriodSummary._meta.db_table)
+    summary_table = connection.ops.quote_name(CategoryPeriodSummary._meta.db_table)
+    category_table = connection.ops.quote_name(Category._meta.db_table)
+    with connection.cursor() as cursor:
+        # Строка общих итогов - с пустым названием категории (название категории не бывает NULL)
+        cursor.execute(f"""
+            SELECT NULL, SUM(income_amount), SUM(expense_amount)
+            FROM {period_table}
+            WHERE user_id = %s AND {conditions_sql}
+            UNION ALL
+            SELECT category.name, SUM(summary.income_amount), SUM(summary.expense_amount)
+            FROM {summary_table} AS summary
+            JOIN {category_table} AS category ON category.id = summary.category_id
+            WHERE summary.user_id = %s AND {conditions_sql}
+            GROUP BY category.name
+        """, [user.pk, *params, user.pk, *params])
+        rows = cursor.fetchall()
+
+    # Агрегат без GROUP BY всегда возвращает ровно одну строку
+    _, income_amount, expense_amount = next(row for row in rows if row[0] is None)
+    income_categories, expense_categories = split_category_totals(row for row in rows if row[0] is not None)
+    return income_amount or 0, expense_amount or 0, income_categories, expense_categories
+
+def split_category_totals(totals):
+    """
+    Раскладывает строки (название категории, доход, расход) на списки
+    доходов и расходов по категориям в порядке убывания суммы
+    """
+    income_categories = []
+    expense_categories = []
+    for name, income, expense in totals:
+        if income:
+            income_categories.append({'category': name, 'total': float(income)})
+        if expense:
+            expense_categories.append({'category': name, 'total': float(expense)})
+
+    income_categories.sort(key=lambda item: -item['total'])
+    expense_categories.sort(key=lambda item: -item['total'])
+    return income_categories, expense_categories
 
 
 class HealthCheckView(APIView):
@@ -0,0 +1,49 @@
+import axiosInstance from './axios';
+
+// API для работы с бюджетами
+const budgetsApi = {
+  /**
+   * Получить все бюджеты пользователя
+   * @returns {Promise} - Промис со списком бюджетов
+   */
+  getAll: () => {
+    return axiosInstance.get('/budgets/');
+  },
+
+  /**
+   * Получить прогресс всех бюджетов в текущем периоде
+   * @returns {Promise} - Промис со списком {id, category_name, amount, spent, remaining, percent, exceeded}
+   */
+  getStatus: () => {
+    return axiosInstance.get('/budgets/status/');
+  },
+
+  /**
+   * Создать бюджет
+   * @param {Object} budget - {category, amount, period_type ('weekly', 'monthly', 'custom'), start_date, end_date}
+   * @returns {Promise} - Промис с созданным бюджетом
+   */
+  add: (budget) => {
+    return axiosInstance.post('/budgets/', budget);
+  },
+
+  /**
+   * Изменить бюджет
+   * @param {Object} budget - Бюджет с id и изменяемыми полями
+   * @returns {Promise} - Промис с обновленным бюджетом
+   */
+  update: (budget) => {
+    return axiosInstance.patch(`/budgets/${budget.id}/`, budget);
+  },
+
+  /**
+   * Удалить бюджет
+   * @param {Number} id - Идентификатор бюджета
+   * @returns {Promise} - Промис ответа сервера
+   */
+  delete: (id) => {
+    return axiosInstance.delete(`/budgets/${id}/`);
+  }
+};
+
+export default budgetsApi;
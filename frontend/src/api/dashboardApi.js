@@ -253,6 +253,30 @@ const dashboardApi = {
     
     console.log(`🔄 [dashboardApi] Запрос итогов по периоду: ${periodValue} -> ${periodType}`);
     return axiosInstance.get(url, { params: { period_type: periodType } });
+  },
+
+  /**
+   * Получить ряд доходов и расходов для графиков (без пропусков)
+   * @param {String} granularity - Шаг ряда ('day', 'week', 'month', 'quarter', 'year')
+   * @param {String} start - Начальная дата (YYYY-MM-DD), по умолчанию начало года
+   * @param {String} end - Конечная дата (YYYY-MM-DD), по умолчанию сегодня
+   * @returns {Promise} - Промис с точками {period, key, income, expense, net}
+   */
+  getSeries: (granularity = 'month', start = null, end = null) => {
+    const params = { granularity };
+    if (start) params.start = start;
+    if (end) params.end = end;
+
+    return axiosInstance.get('/analytics/series/', { params });
+  },
+
+  /**
+   * Сравнить текущий период с предыдущим в целом и по категориям
+   * @param {String} period - Период ('today', 'week', 'month', 'quarter', 'year')
+   * @returns {Promise} - Промис с итогами total и categories: {current, previous, delta, percent}
+   */
+  getComparison: (period = 'month') => {
+    return axiosInstance.get('/analytics/comparison/', { params: { period } });
   }
 };
 
@@ -50,11 +50,10 @@ const transactionsApi = {
     if (params.date_to) queryParams.append('date_to', params.date_to);
     if (params.amount_min) queryParams.append('amount_min', params.amount_min);
     if (params.amount_max) queryParams.append('amount_max', params.amount_max);
+    // Список без пагинации: экран транзакций пока ожидает массив
+    queryParams.append('paginate', 'false');
     
-    const queryString = queryParams.toString();
-    if (queryString) {
-      url += `?${queryString}`;
-    }
+    url += `?${queryParams.toString()}`;
     
     try {
       const response = await api.get(url);